@@ -0,0 +1,312 @@
+"""
+Benchmarks for the preprocessing, training and inference stages.
+
+    python Benchmark.py                                  # all stages, all designs
+    python Benchmark.py --stages read_dot_file toggles --designs PRESENT
+    python Benchmark.py --save-baseline                  # record out/benchmark_baseline.json
+    python Benchmark.py --threshold 0.2                  # fail on >20% throughput drop
+    python Benchmark.py --stages import                  # import time of every entry point
+
+Preprocessing stages run on every design under data/, graph/GNN stages on every
+<name>_features.csv + <name>_edges.csv pair under test/. For each (stage, design)
+the best of `--repeat` timed runs is reported as throughput (items/s, where the
+item is the stage's natural unit: nodes, value changes or edges) together with the
+peak Python heap allocation of an extra traced run (TensorFlow's native buffers
+are not included). Inputs are copied to a scratch directory first, so
+benchmarking never rewrites files under data/ or test/.
+
+The "import" stage times importing each entry point in a fresh interpreter, plus
+`python SCAR.py --help`, and fails the run when a preprocessing entry point takes
+longer than `--import-budget` or loads one of SCAR.heavy_modules.
+"""
+import argparse
+import glob
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from Build_Datasets import discover_designs, key_registers
+from Project_Paths import DATA_DIR, OUT_DIR, SRC_DIR, TEST_DIR
+
+WEIGHTS_FILE = os.path.join(OUT_DIR, "gnn_weights.weights.h5")
+
+preprocessing_stages = ["read_dot_file", "extract_dot_features", "toggles", "extract_vcd_features"]
+graph_stages = ["graph_information", "train_step", "inference"]
+import_stages = ["import"]
+
+# Entry points timed by the "import" stage. SCAR_GNN and test run on import, so
+# they are left out; GNN is TensorFlow by definition.
+import_modules = ["Feature_Extract", "Build_Datasets", "Synthetic_Design", "Node_Index", "Dot_Preprocess",
+                  "Vcd_Preprocessing", "Leakage_Analysis", "V_Preprocessing", "Label_Preprocessing",
+                  "GraphInformation", "Evaluate_LODO", "Scoring_Service", "Model_Export", "Partitioned_Inference"]
+
+
+def _measure(fn, repeat):
+    """
+    Run `fn` once under tracemalloc for its peak heap, then `repeat` times for the
+    best wall time. `fn` returns the number of items it processed.
+    """
+    tracemalloc.start()
+    items = fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return {
+        "seconds": round(best, 6),
+        "items": items,
+        "throughput": round(items / best, 2) if best > 0 else None,
+        "peak_mb": round(peak / (1 << 20), 2),
+    }
+
+
+def _preprocessing_benchmarks(design, scratch, stages):
+    import Dot_Preprocess
+    import Vcd_Index
+    import Vcd_Preprocessing
+
+    design_dir = os.path.join(scratch, "data", design)
+    shutil.copytree(os.path.join(DATA_DIR, design), design_dir)
+    dot_file = os.path.join(design_dir, f"{design}.dot")
+    key_register = key_registers.get(design, "key")
+
+    parsed = Dot_Preprocess.read_dot_file(dot_file, key_register, design)
+    graph, roots, nodes, node_attrs, indegree, outdegree, key_nodes, edges = parsed
+
+    def read_dot():
+        Dot_Preprocess.read_dot_file(dot_file, key_register, design)
+        return len(nodes) + len(edges)
+
+    def dot_features():
+        Dot_Preprocess.extract_dot_features(graph, nodes, indegree, outdegree, node_attrs, key_nodes)
+        return len(nodes)
+
+    benches = {"read_dot_file": (read_dot, "nodes+edges/s"),
+               "extract_dot_features": (dot_features, "nodes/s")}
+
+    vcd_path = Vcd_Index.resolve_vcd_path(os.path.join(design_dir, f"{design}.vcd"))
+    if os.path.exists(vcd_path):
+        vcd = Vcd_Index.VcdIndex(Vcd_Index.build_vcd_index(vcd_path))
+        value_changes = sum(len(vcd.signal_by_id(i)) for i in set(vcd.references_to_ids.values()))
+
+        def toggles():
+            Vcd_Preprocessing.compute_bit_toggles(vcd)
+            return value_changes
+        benches["toggles"] = (toggles, "value changes/s")
+
+    if os.path.exists(Vcd_Preprocessing.node_match_path_for(design)):
+        Features = Dot_Preprocess.extract_dot_features(graph, nodes, indegree, outdegree, node_attrs, key_nodes)
+
+        def vcd_features():
+            Vcd_Preprocessing.extract_vcd_features(Features, node_attrs, None, design)
+            return len(Features)
+        benches["extract_vcd_features"] = (vcd_features, "nodes/s")
+
+    return {name: benches[name] for name in stages if name in benches}
+
+
+def _graph_benchmarks(name, scratch, stages):
+    import numpy as np
+    import tensorflow as tf
+    from GNN import GNNNodeClassifier, hidden_units, dropout_rate, learning_rate, batch_size
+    from GraphInformation import graph_information
+
+    feature_file = shutil.copy(os.path.join(TEST_DIR, f"{name}_features.csv"), scratch)
+    edge_file = shutil.copy(os.path.join(TEST_DIR, f"{name}_edges.csv"), scratch)
+    graph_info, _, _, num_classes, nodeset = graph_information(feature_file, edge_file)
+    num_edges = graph_info[1].shape[1]
+    all_idx = nodeset.node_number.to_numpy(dtype="int32")
+    labels = nodeset["label"].to_numpy().astype("float32")
+
+    def graph_info_stage():
+        graph_information(feature_file, edge_file)
+        return num_edges
+
+    benches = {"graph_information": (graph_info_stage, "edges/s")}
+
+    if "train_step" in stages:
+        train_model = GNNNodeClassifier(graph_info=graph_info, num_classes=num_classes,
+                                        hidden_units=hidden_units, dropout_rate=dropout_rate, name="gnn_model")
+        train_model.compile(optimizer=tf.keras.optimizers.Adam(learning_rate),
+                            loss=tf.keras.losses.BinaryCrossentropy(from_logits=False))
+        batch = np.resize(all_idx, batch_size)
+        batch_labels = np.resize(labels, batch_size)
+        train_model.train_on_batch(batch, batch_labels)
+
+        def train_step():
+            train_model.train_on_batch(batch, batch_labels)
+            return num_edges
+        benches["train_step"] = (train_step, "edges/s")
+
+    if "inference" in stages and os.path.exists(WEIGHTS_FILE):
+        model = GNNNodeClassifier(graph_info=graph_info, num_classes=num_classes,
+                                  hidden_units=hidden_units, dropout_rate=dropout_rate, name="gnn_model")
+        _ = model.predict(tf.convert_to_tensor([0], dtype=tf.int32), verbose=0)
+        model.load_weights(WEIGHTS_FILE)
+
+        def inference():
+            model.predict(all_idx, verbose=0)
+            return len(all_idx)
+        benches["inference"] = (inference, "nodes/s")
+
+    return {stage: benches[stage] for stage in stages if stage in benches}
+
+
+def _import_time(module):
+    """
+    (seconds, heavy modules loaded) of importing `module` in a fresh interpreter;
+    module "SCAR --help" times the whole `python SCAR.py --help` process instead.
+    """
+    import subprocess
+    import SCAR
+    if module == "SCAR --help":
+        start = time.perf_counter()
+        subprocess.run([sys.executable, os.path.join(SRC_DIR, "SCAR.py"), "--help"], cwd=SRC_DIR,
+                       check=True, stdout=subprocess.DEVNULL)
+        return time.perf_counter() - start, []
+    code = (f"import json, sys, time\nstart = time.perf_counter()\nimport {module}\n"
+            f"print(json.dumps([time.perf_counter() - start, "
+            f"sorted(m for m in {SCAR.heavy_modules!r} if m in sys.modules)]))")
+    out = subprocess.run([sys.executable, "-c", code], cwd=SRC_DIR, check=True, capture_output=True, text=True)
+    seconds, heavy = json.loads(out.stdout.strip().splitlines()[-1])
+    return seconds, heavy
+
+
+def import_benchmarks(repeat=3, modules=None):
+    """
+    Best-of-`repeat` import time of every entry point, each in a new process.
+    """
+    results = []
+    for module in (modules or import_modules) + ["SCAR --help"]:
+        timings = [_import_time(module) for _ in range(repeat)]
+        best = min(seconds for seconds, _ in timings)
+        heavy = timings[0][1]
+        result = {"stage": "import", "design": module, "unit": "imports/s", "seconds": round(best, 6), "items": 1,
+                  "throughput": round(1 / best, 2), "peak_mb": None, "heavy_modules": heavy}
+        print(f"{'import':<22} {module:<22} {best * 1000:>10.1f} ms  {' '.join(heavy)}")
+        results.append(result)
+    return results
+
+
+def check_import_budget(results, budget):
+    """
+    Problems with the preprocessing entry points (and SCAR --help): heavy modules
+    loaded or an import slower than `budget` seconds.
+    """
+    import SCAR
+    light = {SCAR.commands[c][0] for c in SCAR.preprocessing_commands} | {"SCAR --help"}
+    problems = []
+    for r in results:
+        if r["stage"] != "import" or r["design"] not in light:
+            continue
+        if r["heavy_modules"]:
+            problems.append(f"{r['design']} imports {', '.join(r['heavy_modules'])}")
+        if r["seconds"] > budget:
+            problems.append(f"{r['design']} takes {r['seconds']:.3f} s to import (budget {budget} s)")
+    return problems
+
+
+def _test_designs():
+    names = []
+    for fpath in sorted(glob.glob(os.path.join(TEST_DIR, "*_features.csv"))):
+        base = os.path.basename(fpath).replace("_features.csv", "")
+        if os.path.exists(os.path.join(TEST_DIR, f"{base}_edges.csv")):
+            names.append(base)
+    return names
+
+
+def run_benchmarks(stages=None, designs=None, repeat=3):
+    stages = stages or preprocessing_stages + graph_stages + import_stages
+    results = import_benchmarks(repeat) if "import" in stages else []
+    scratch_root = tempfile.mkdtemp(prefix="scar_bench_")
+    cwd = os.getcwd()
+    try:
+        # The pipeline resolves ../data relative to the working directory.
+        scratch_src = os.path.join(scratch_root, "src")
+        os.makedirs(scratch_src)
+        os.chdir(scratch_src)
+
+        groups = []
+        pre = [s for s in stages if s in preprocessing_stages]
+        if pre:
+            groups += [(d, _preprocessing_benchmarks, pre) for d in designs or discover_designs()]
+        post = [s for s in stages if s in graph_stages]
+        if post:
+            groups += [(d, _graph_benchmarks, post) for d in designs or _test_designs()
+                       if os.path.exists(os.path.join(TEST_DIR, f"{d}_features.csv"))]
+
+        for design, make, group_stages in groups:
+            try:
+                benches = make(design, scratch_root, group_stages)
+            except Exception as e:
+                print(f"[skip] {design}: {type(e).__name__}: {e}")
+                continue
+            for stage, (fn, unit) in benches.items():
+                result = {"stage": stage, "design": design, "unit": unit, **_measure(fn, repeat)}
+                print(f"{stage:<22} {design:<18} {result['throughput']:>14} {unit:<16} "
+                      f"{result['seconds']:>10.4f} s {result['peak_mb']:>8} MB")
+                results.append(result)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(scratch_root, ignore_errors=True)
+    return results
+
+
+def compare_to_baseline(results, baseline, threshold):
+    """
+    List of (stage, design, baseline throughput, current throughput) pairs whose
+    throughput dropped by more than `threshold` (a fraction).
+    """
+    reference = {(r["stage"], r["design"]): r["throughput"] for r in baseline["results"]}
+    regressions = []
+    for r in results:
+        before = reference.get((r["stage"], r["design"]))
+        if before and r["throughput"] is not None and r["throughput"] < before * (1 - threshold):
+            regressions.append((r["stage"], r["design"], before, r["throughput"]))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark SCAR pipeline stages on the bundled designs.")
+    parser.add_argument("--stages", nargs="*", choices=preprocessing_stages + graph_stages + import_stages)
+    parser.add_argument("--designs", nargs="*")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default=os.path.join(OUT_DIR, "benchmark.json"))
+    parser.add_argument("--baseline", default=os.path.join(OUT_DIR, "benchmark_baseline.json"))
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="allowed throughput drop vs. the baseline, as a fraction (default 0.2)")
+    parser.add_argument("--import-budget", type=float, default=0.5,
+                        help="max import seconds of a preprocessing entry point (default 0.5)")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.stages, args.designs, args.repeat)
+    problems = check_import_budget(results, args.import_budget)
+    for problem in problems:
+        print(f"[REGRESSION] {problem}")
+    report = {"python": sys.version.split()[0], "repeat": args.repeat, "results": results}
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"[INFO] Benchmark results written to {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"[INFO] Baseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare_to_baseline(results, json.load(f), args.threshold)
+        for stage, design, before, now in regressions:
+            print(f"[REGRESSION] {stage} on {design}: {before} -> {now} ({now / before - 1:+.1%})")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold:.0%} against {args.baseline}")
+    if problems:
+        sys.exit(1)
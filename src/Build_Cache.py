@@ -0,0 +1,182 @@
+"""
+Content-addressed cache for the preprocessing stages.
+
+Every stage result is stored under <root>/<stage>/<key>, where the key is a hash of
+the stage's inputs: content digests of the files it reads, its parameters, the keys
+of the stages it depends on, and the digest of the code implementing it (the module
+and every repo-local module it imports, transitively). A stage
+reruns only when one of those changes, e.g. editing data/label_rules.json
+invalidates labeling and export but not DOT parsing or toggle counting.
+
+File digests are memoized by (size, mtime) in <root>/file_digests.json so large
+traces are hashed once, not on every run.
+"""
+import ast
+import functools
+import hashlib
+import json
+import os
+import pickle
+
+import Profiling
+
+_CHUNK = 1 << 20
+
+
+@functools.lru_cache(maxsize=None)
+def _local_imports(path):
+    """
+    Source files of the module at `path` and of the sibling modules it imports,
+    transitively, in sorted order.
+    """
+    seen, todo = set(), [os.path.abspath(path)]
+    while todo:
+        current = todo.pop()
+        if current in seen:
+            continue
+        seen.add(current)
+        with open(current, "r", encoding="utf-8") as f:
+            tree = ast.parse(f.read(), current)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+                names = [node.module]
+            else:
+                continue
+            for name in names:
+                dep = os.path.join(os.path.dirname(current), name.split(".")[0] + ".py")
+                if os.path.exists(dep):
+                    todo.append(dep)
+    return tuple(sorted(seen))
+
+
+class BuildCache:
+    def __init__(self, root="../out/cache", enabled=True):
+        self.root = root
+        self.enabled = enabled
+        self._digest_file = os.path.join(root, "file_digests.json")
+        self._digests = None
+
+    def _load_digests(self):
+        if self._digests is None:
+            self._digests = {}
+            if os.path.exists(self._digest_file):
+                try:
+                    with open(self._digest_file, "r") as f:
+                        self._digests = json.load(f)
+                except (OSError, ValueError):
+                    self._digests = {}
+        return self._digests
+
+    def _save_digests(self):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = self._digest_file + f".{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._digests, f)
+        os.replace(tmp_path, self._digest_file)
+
+    def file_digest(self, path):
+        """
+        sha256 of a file's content, or None if it does not exist.
+        """
+        if not os.path.exists(path):
+            return None
+        st = os.stat(path)
+        abspath = os.path.abspath(path)
+        digests = self._load_digests()
+        entry = digests.get(abspath)
+        if entry and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+            return entry[2]
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(_CHUNK), b""):
+                h.update(chunk)
+        digests[abspath] = [st.st_size, st.st_mtime_ns, h.hexdigest()]
+        if self.enabled:
+            self._save_digests()
+        return h.hexdigest()
+
+    def module_digest(self, module):
+        """
+        Digest of a module's source and of every repo-local module it imports, directly
+        or not, so a stage is invalidated when any code it runs changes.
+        """
+        return self.key(*[(os.path.basename(p), self.file_digest(p)) for p in _local_imports(module.__file__)])
+
+    @staticmethod
+    def key(*parts):
+        """
+        Stage key from digests, parameters and upstream keys.
+        """
+        raw = json.dumps(parts, sort_keys=True, default=str).encode("utf-8")
+        return hashlib.sha256(raw).hexdigest()
+
+    def path(self, stage, key, suffix=".pkl"):
+        return os.path.join(self.root, stage, key + suffix)
+
+    def get_or_compute(self, stage, key, compute):
+        """
+        Return the cached result of `stage` for `key`, computing and storing it on a miss.
+        """
+        with Profiling.span(f"stage:{stage}") as sp:
+            if not self.enabled:
+                sp.count(miss=1)
+                return compute()
+            path = self.path(stage, key)
+            if os.path.exists(path):
+                try:
+                    with open(path, "rb") as f:
+                        value = pickle.load(f)
+                    print(f"[cache] {stage}: hit")
+                    sp.count(hit=1)
+                    return value
+                except Exception as e:
+                    print(f"[cache] {stage}: unreadable entry, recomputing ({e})")
+            print(f"[cache] {stage}: miss")
+            sp.count(miss=1)
+            value = compute()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = path + f".{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+            return value
+
+    def cached_file(self, stage, key, suffix, build):
+        """
+        Path of a file artifact of `stage` for `key`, calling build(path) on a miss.
+        """
+        with Profiling.span(f"stage:{stage}") as sp:
+            path = self.path(stage, key, suffix)
+            if self.enabled and os.path.exists(path):
+                print(f"[cache] {stage}: hit")
+                sp.count(hit=1)
+                return path
+            print(f"[cache] {stage}: miss")
+            sp.count(miss=1)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            build(path)
+            return path
+
+    def output_is_fresh(self, stage, key, out_path):
+        """
+        True if `out_path` was last written by `stage` for `key` and has not been modified since.
+        """
+        if not self.enabled:
+            return False
+        marker = self.path(stage, key, ".json")
+        if not os.path.exists(marker) or not os.path.exists(out_path):
+            return False
+        with open(marker, "r") as f:
+            recorded = json.load(f)
+        return (recorded.get("path") == os.path.abspath(out_path)
+                and recorded.get("digest") == self.file_digest(out_path))
+
+    def record_output(self, stage, key, out_path):
+        if not self.enabled:
+            return
+        marker = self.path(stage, key, ".json")
+        os.makedirs(os.path.dirname(marker), exist_ok=True)
+        with open(marker, "w") as f:
+            json.dump({"path": os.path.abspath(out_path), "digest": self.file_digest(out_path)}, f)
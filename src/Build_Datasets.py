@@ -0,0 +1,141 @@
+"""
+Build the feature/edge datasets of many designs in parallel.
+
+    python Build_Datasets.py                      # every design under data/
+    python Build_Datasets.py PRESENT AES_TBL -j 2
+
+Each design runs `Feature_Extract.extract_design` in its own worker process, with
+its output captured in out/logs/<design>.log. Workers never read stdin, so a
+missing input file fails that design instead of blocking the run. A per-design
+status/timing summary is printed and written to out/build_summary.json.
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import Profiling
+from Project_Paths import DATA_DIR, OUT_DIR, SRC_DIR
+
+# Key register searched for in node labels, per design.
+key_registers = {
+    "aes128_table_ecb": "key_in",
+    "AES_PPRM1": "Kin",
+    "AES_PPRM3": "Kin",
+    "AES_TBL": "Kin",
+    "RSA": "Kin",
+    "SABER": "pol_64bit_in",
+    "PRESENT": "kreg",
+}
+
+# Designs written as the training dataset (out/) instead of a test dataset (test/).
+train_designs = {"aes128_table_ecb"}
+
+
+def discover_designs(data_dir=DATA_DIR):
+    """
+    Every directory under data/ that contains <name>/<name>.dot.
+    """
+    return sorted(
+        name for name in os.listdir(data_dir)
+        if os.path.isfile(os.path.join(data_dir, name, f"{name}.dot"))
+    )
+
+
+def _build_design(design_name, key_register_name, test_name, use_cache):
+    # The pipeline resolves ../data, ../out and ../test relative to src/.
+    os.chdir(SRC_DIR)
+    sys.stdin = open(os.devnull)
+    import Build_Cache
+    import Feature_Extract
+    Profiling.reset()
+
+    log_dir = os.path.join(OUT_DIR, "logs")
+    os.makedirs(log_dir, exist_ok=True)
+    log_path = os.path.join(log_dir, f"{design_name}.log")
+
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    status, error, outputs = "ok", None, []
+    with open(log_path, "w") as log, contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        try:
+            outputs = Feature_Extract.extract_design(
+                design_name, key_register_name, test_name,
+                cache=Build_Cache.BuildCache(enabled=use_cache),
+            )
+        except Exception as e:
+            status, error = "failed", f"{type(e).__name__}: {e}"
+            traceback.print_exc()
+    return {
+        "design": design_name,
+        "status": status,
+        "error": error,
+        "wall_seconds": round(time.perf_counter() - start, 3),
+        "cpu_seconds": round(time.process_time() - cpu_start, 3),
+        "outputs": [os.path.normpath(os.path.join(SRC_DIR, p)) for p in outputs],
+        "log": log_path,
+        "profile": Profiling.records(),
+    }
+
+
+def build_datasets(designs=None, max_workers=None, use_cache=True, summary_path=None, default_key_register=None):
+    """
+    Run the preprocessing pipeline for `designs` (default: all discovered) in a
+    process pool and return the per-design summary. Designs missing from
+    `key_registers` use `default_key_register`, or are skipped without one.
+    """
+    designs = designs or discover_designs()
+    summary = []
+    jobs = {}
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        for design in designs:
+            key_register = key_registers.get(design, default_key_register)
+            if key_register is None:
+                summary.append({"design": design, "status": "skipped",
+                                "error": "no key register configured in Build_Datasets.key_registers"})
+                continue
+            test_name = None if design in train_designs else design
+            jobs[pool.submit(_build_design, design, key_register, test_name, use_cache)] = design
+        for future in as_completed(jobs):
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"design": jobs[future], "status": "failed", "error": f"{type(e).__name__}: {e}"}
+            Profiling.extend(result.pop("profile", []))
+            print(f"[{result['status']}] {result['design']} ({result.get('wall_seconds', '-')} s)")
+            summary.append(result)
+
+    summary.sort(key=lambda r: designs.index(r["design"]))
+    report = {"total_wall_seconds": round(time.perf_counter() - start, 3), "designs": summary}
+    summary_path = summary_path or os.path.join(OUT_DIR, "build_summary.json")
+    with open(summary_path, "w") as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+def _print_summary(report):
+    print(f"\n{'design':<20} {'status':<8} {'wall s':>8} {'cpu s':>8}  error")
+    for r in report["designs"]:
+        print(f"{r['design']:<20} {r['status']:<8} {r.get('wall_seconds', '-'):>8} "
+              f"{r.get('cpu_seconds', '-'):>8}  {r.get('error') or ''}")
+    print(f"Total: {report['total_wall_seconds']} s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build feature/edge datasets for many designs in parallel.")
+    parser.add_argument("designs", nargs="*", help="designs under data/ (default: all)")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--no-cache", action="store_true", help="rerun every stage")
+    parser.add_argument("--key-register", default=None,
+                        help="key register for designs not in key_registers (e.g. synthetic ones)")
+    parser.add_argument("--summary", default=None, help="summary JSON path (default: out/build_summary.json)")
+    args = parser.parse_args()
+
+    report = build_datasets(args.designs, args.workers, not args.no_cache, args.summary, args.key_register)
+    _print_summary(report)
+    sys.exit(0 if all(r["status"] == "ok" for r in report["designs"]) else 1)
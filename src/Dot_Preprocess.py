@@ -1,3 +1,4 @@
+import csv
 import glob
 import os
 import random
@@ -5,27 +6,38 @@ import re
 from collections import defaultdict
 import pydot
 
+import Node_Index
+import Profiling
 
-def read_dot_file(dot_file, key_register_name, design_name):
-    graphs = pydot.graph_from_dot_file(dot_file)
-    g = graphs[0]
 
+def _node_attrs(g):
     node_attrs = {}
-    node_files = f"../data/{design_name}/{design_name}_nodes.txt"
     for node in g.get_nodes():
         name = node.get_name().strip('"')
         if name.lower() == "node":
             continue
         attrs = {k: v.strip('"') for k, v in node.get_attributes().items()}
         node_attrs[name] = attrs
+    return node_attrs
+
+
+def read_node_attrs(dot_file):
+    return _node_attrs(pydot.graph_from_dot_file(dot_file)[0])
 
-    key_nodes = set()
-    with open(node_files, "w") as f:
-        for node, attrs in node_attrs.items():
-            label = attrs.get("label", "")
-            f.write("@@" + label + "@@\n")
-            if label and key_register_name in label:
-                key_nodes.add(node)
+
+@Profiling.profiled("read_dot_file")
+def read_dot_file(dot_file, key_register_name, design_name):
+    graphs = pydot.graph_from_dot_file(dot_file)
+    g = graphs[0]
+
+    node_attrs = _node_attrs(g)
+    node_files = f"../data/{design_name}/{design_name}_nodes.txt"
+    index = Node_Index.load_or_build(dot_file, node_attrs)
+    if index.rebuilt or not os.path.exists(node_files):
+        with open(node_files, "w") as f:
+            for label in index.labels:
+                f.write("@@" + label + "@@\n")
+    key_nodes = index.nodes_referencing(key_register_name)
 
     indegree = defaultdict(int)
     outdegree = defaultdict(int)
@@ -56,6 +68,7 @@ def read_dot_file(dot_file, key_register_name, design_name):
     if roots is None:
         roots = [g.get_nodes()[0]]
     # print(f"{len(nodes)}, {len(g.get_edges())}, {len(g.get_nodes())}")
+    Profiling.current().count(nodes=len(nodes), edges=len(edges), key_nodes=len(key_nodes))
     return graph, roots, nodes, node_attrs, indegree, outdegree, key_nodes, edges
 
 def find_paths(graph, root):
@@ -75,87 +88,124 @@ def find_paths(graph, root):
     dfs(root, [], set())
     return paths
 
-def extract_dot_features(graph, nodes, indegree, outdegree, node_attrs, key_nodes):
-    def count_ops_in_label(label: str):
-        counts = {"and": 0, "or": 0, "mux": 0, "xor": 0}
-
-        # and: "and", "&", "&&"
-        counts["and"] += len(re.findall(r"\band\b", label, flags=re.IGNORECASE))
-        counts["and"] += len(re.findall(r"(?<!~)&{1,2}", label))
-
-        # or: "or", "|", "||"
-        counts["or"] += len(re.findall(r"\bor\b", label, flags=re.IGNORECASE))
-        counts["or"] += len(re.findall(r"(?<!~)\|{1,2}", label))
-
-        # xor: "xor", "^", "~^", "^~"
-        counts["xor"] += len(re.findall(r"\bxor\b", label, flags=re.IGNORECASE))
-        counts["xor"] += len(re.findall(r"\^~|~\^|\^", label))
-
-        # mux: "mux", "?:", "[:]", "case"
-        counts["mux"] += len(re.findall(r"\bmux\b", label, flags=re.IGNORECASE))
-        counts["mux"] += len(re.findall(r"\?.*?:", label))
-        counts["mux"] += len(re.findall(r"\[\s*\d+\s*:\s*\d+\s*\]", label))
-        counts["mux"] += len(re.findall(r"\bcase\b.*?\bendcase\b", label,
-                                    flags=re.IGNORECASE | re.DOTALL))
-
-        for k in counts:
-            counts[k] = int(counts[k] > 0)
-        return counts
-
-    def count_all_paths_from_starts(graph, key_nodes, nodes):
-        """
-        Calculates the number of simple paths from a list of key_nodes to every other node
-        in the graph using dynamic programming and memoization.
-
-        Args:
-            graph (dict): The graph represented as an adjacency list.
-                          Example: {'A': ['B', 'C'], 'B': ['D']}
-            key_nodes (list or set): A list of starting nodes.
-
-        Returns:
-            dict: A dictionary mapping each node to the number of simple paths
-                  originating from any of the key_nodes.
-        """
-        memo = {}  # Cache for storing results of computed nodes
-        visiting = set()  # For detecting cycles in the current DFS path
-        starts = set(key_nodes)  # Use a set for O(1) lookups
-
-        def _count_paths_to(u):
-            # If result is already cached, return it
-            if u in memo:
-                return memo[u]
-            # If we are currently visiting this node in this path, we've found a cycle
-            if u in visiting:
-                return 0  # This path is invalid
-
-            visiting.add(u)
-
-            # A start node has one path to itself (of length 0)
-            count = 1 if u in starts else 0
-
-            # Sum the paths from all its predecessors
-            for predecessor in graph.get(u, []):
-                count += _count_paths_to(predecessor)
-
-            visiting.remove(u)
-
-            # Cache the result before returning
-            memo[u] = count
-            return count
-
-        # Trigger the calculation for every node in the graph
-        # The memoization ensures each node is only computed once
-        path_counts = {node: _count_paths_to(node) for node in nodes}
-
-        return path_counts
-
-    all_path_counts = count_all_paths_from_starts(graph, key_nodes, nodes)
+def node_id_path_for(design_name):
+    return f"../data/{design_name}/{design_name}_node_ids.csv"
+
+
+def assign_node_ids(nodes, id_map_file=None):
+    """
+    Deterministic node -> node_number map, in node_number order.
+
+    Without a map file nodes are numbered 0..len(nodes)-1 in lexicographic order.
+    With one, the map is append-only: nodes already in it keep their number, new
+    nodes are numbered from max(number) + 1 in lexicographic order, and the
+    numbers of nodes that left the graph stay in the map, retired, so removing a
+    node shifts no other number. node_numbers can therefore have gaps. The map
+    file is only written when it gains nodes.
+    """
+    known = {}
+    if id_map_file and os.path.exists(id_map_file):
+        with open(id_map_file, newline="") as f:
+            known = {r["node"]: int(r["node_number"]) for r in csv.DictReader(f)}
+    added = sorted(n for n in nodes if n not in known)
+    start = max(known.values(), default=-1) + 1
+    numbers = {**known, **{node: start + i for i, node in enumerate(added)}}
+
+    if id_map_file and (added or not os.path.exists(id_map_file)):
+        with open(id_map_file, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["node", "node_number"])
+            writer.writerows(sorted(numbers.items(), key=lambda item: item[1]))
+    return {node: numbers[node] for node in sorted(nodes, key=numbers.get)}
+
+
+def count_ops_in_label(label: str):
+    counts = {"and": 0, "or": 0, "mux": 0, "xor": 0}
+
+    # and: "and", "&", "&&"
+    counts["and"] += len(re.findall(r"\band\b", label, flags=re.IGNORECASE))
+    counts["and"] += len(re.findall(r"(?<!~)&{1,2}", label))
+
+    # or: "or", "|", "||"
+    counts["or"] += len(re.findall(r"\bor\b", label, flags=re.IGNORECASE))
+    counts["or"] += len(re.findall(r"(?<!~)\|{1,2}", label))
+
+    # xor: "xor", "^", "~^", "^~"
+    counts["xor"] += len(re.findall(r"\bxor\b", label, flags=re.IGNORECASE))
+    counts["xor"] += len(re.findall(r"\^~|~\^|\^", label))
+
+    # mux: "mux", "?:", "[:]", "case"
+    counts["mux"] += len(re.findall(r"\bmux\b", label, flags=re.IGNORECASE))
+    counts["mux"] += len(re.findall(r"\?.*?:", label))
+    counts["mux"] += len(re.findall(r"\[\s*\d+\s*:\s*\d+\s*\]", label))
+    counts["mux"] += len(re.findall(r"\bcase\b.*?\bendcase\b", label,
+                                flags=re.IGNORECASE | re.DOTALL))
+
+    for k in counts:
+        counts[k] = int(counts[k] > 0)
+    return counts
+
+
+def count_all_paths_from_starts(graph, key_nodes, nodes, memo=None):
+    """
+    Calculates the number of simple paths from a list of key_nodes to every other node
+    in the graph using dynamic programming and memoization.
+
+    Args:
+        graph (dict): The graph represented as an adjacency list.
+                      Example: {'A': ['B', 'C'], 'B': ['D']}
+        key_nodes (list or set): A list of starting nodes.
+        nodes: The nodes to count, in traversal order.
+        memo (dict, optional): Known counts of other nodes; they are not revisited.
+
+    Returns:
+        dict: A dictionary mapping each node to the number of simple paths
+              originating from any of the key_nodes.
+    """
+    memo = {} if memo is None else dict(memo)  # Cache for storing results of computed nodes
+    visiting = set()  # For detecting cycles in the current DFS path
+    starts = set(key_nodes)  # Use a set for O(1) lookups
+
+    def _count_paths_to(u):
+        # If result is already cached, return it
+        if u in memo:
+            return memo[u]
+        # If we are currently visiting this node in this path, we've found a cycle
+        if u in visiting:
+            return 0  # This path is invalid
+
+        visiting.add(u)
+
+        # A start node has one path to itself (of length 0)
+        count = 1 if u in starts else 0
+
+        # Sum the paths from all its predecessors
+        for predecessor in graph.get(u, []):
+            count += _count_paths_to(predecessor)
+
+        visiting.remove(u)
+
+        # Cache the result before returning
+        memo[u] = count
+        return count
+
+    # Trigger the calculation for every node in the graph
+    # The memoization ensures each node is only computed once
+    path_counts = {node: _count_paths_to(node) for node in nodes}
+
+    return path_counts
+
+
+@Profiling.profiled("extract_dot_features")
+def extract_dot_features(graph, nodes, indegree, outdegree, node_attrs, key_nodes, id_map_file=None):
+    node_ids = assign_node_ids(nodes, id_map_file)
+    # Walk nodes in ID order so the cycle cuts of the path count are reproducible.
+    all_path_counts = count_all_paths_from_starts(graph, key_nodes, node_ids)
     # for node, count in all_path_counts.items():
     #     print(f"node: {node}, count: {count}")
 
     Features = {}
-    cnt = 0
-    for node in nodes:
+    for node, cnt in node_ids.items():
         label = node_attrs.get(node, {}).get("label", "")
         # print(f"Node {cnt}: {label}")
         Features[node] = {
@@ -165,6 +215,6 @@ def extract_dot_features(graph, nodes, indegree, outdegree, node_attrs, key_node
             **count_ops_in_label(label),
             "Paths": all_path_counts[node],
         }
-        cnt += 1
 
+    Profiling.current().count(nodes=len(Features))
     return Features
\ No newline at end of file
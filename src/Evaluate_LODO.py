@@ -0,0 +1,184 @@
+"""
+Leave-one-design-out evaluation.
+
+    python Evaluate_LODO.py                        # every design under test/
+    python Evaluate_LODO.py PRESENT AES_TBL RSA -j 3 --threads 2
+    python Evaluate_LODO.py --with-train           # ../out is always in the training set
+
+For each held-out design a fresh GNNNodeClassifier is trained on all the other
+designs (GNN.train_multi_design, one design's graph per mini-batch) and evaluated
+on the held-out one. Folds run in parallel worker processes, each with its own
+TensorFlow intra/inter-op thread count, so folds do not oversubscribe the CPU.
+Graphs are loaded once in the parent and cached in out/cache/graph/ keyed by the
+content of their CSVs; workers never touch the CSV files. The Acc/F1/AUC and
+train/inference time of every fold are printed and written to out/lodo_results.json.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import Build_Cache
+import Profiling
+from GraphInformation import compact_edges, default_feature_names
+from Project_Paths import OUT_DIR, SRC_DIR, TEST_DIR
+
+
+def test_designs():
+    names = []
+    for fpath in sorted(glob.glob(os.path.join(TEST_DIR, "*_features.csv"))):
+        base = os.path.basename(fpath).replace("_features.csv", "")
+        if os.path.exists(os.path.join(TEST_DIR, f"{base}_edges.csv")):
+            names.append(base)
+    return names
+
+
+def load_design_graph(node_file, edge_file, cache):
+    """
+    (node_features, edges, labels) of one dataset as numpy arrays, cached by the
+    content of both CSVs. Rows are ordered by node_number and edges refer to rows.
+    """
+    def compute():
+        import pandas as pd
+        nodeset = pd.read_csv(node_file).sort_values("node_number")
+        edges = pd.read_csv(edge_file)[["source", "target"]].to_numpy().T
+        edges = compact_edges(nodeset["node_number"].to_numpy(), edges)
+        return (nodeset[default_feature_names].to_numpy().astype("float32"), edges,
+                nodeset["label"].to_numpy().astype("float32"))
+
+    key = cache.key("graph", cache.file_digest(node_file), cache.file_digest(edge_file), default_feature_names)
+    return cache.get_or_compute("graph", key, compute)
+
+
+def _init_worker(threads):
+    # Must run before TensorFlow is imported in the worker.
+    os.environ["TF_NUM_INTRAOP_THREADS"] = str(threads)
+    os.environ["TF_NUM_INTEROP_THREADS"] = "1"
+    os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+
+def _run_fold(held_out, graphs, epochs, seed):
+    # Runs in a worker: TensorFlow is only ever imported here.
+    os.chdir(SRC_DIR)
+    import contextlib
+    import numpy as np
+    import tensorflow as tf
+    from sklearn.metrics import accuracy_score, f1_score, roc_auc_score
+    import GNN
+    Profiling.reset()
+    tf.keras.utils.set_random_seed(seed)
+
+    def graph_info(design):
+        x, edges, _ = graphs[design]
+        return tf.constant(x), edges, tf.ones(shape=edges.shape[1])
+
+    train_names = [d for d in graphs if d != held_out]
+    blocks = [(d, graph_info(d), np.arange(len(graphs[d][2])), graphs[d][2]) for d in train_names]
+    model = GNN.GNNNodeClassifier(graph_info=blocks[0][1], num_classes=2, hidden_units=GNN.hidden_units,
+                                  dropout_rate=GNN.dropout_rate, name="gnn_model")
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        epochs = epochs or GNN.num_epochs
+        GNN.train_multi_design(model, blocks, epochs=epochs, seed=seed)
+        train_seconds = time.perf_counter() - start
+
+        x, edges, y_true = graphs[held_out]
+        model.set_graph(graph_info(held_out))
+        all_idx = np.arange(len(y_true), dtype="int32")
+        start = time.perf_counter()
+        with Profiling.span("inference", nodes=len(all_idx), edges=edges.shape[1]):
+            probs = model.predict(all_idx, verbose=0).squeeze(-1)
+        inference_seconds = time.perf_counter() - start
+
+    y_pred = (probs >= 0.5).astype(int)
+    try:
+        auc = roc_auc_score(y_true, probs)
+    except ValueError:
+        auc = float("nan")
+    return {
+        "held_out": held_out,
+        "train_designs": train_names,
+        "epochs": epochs,
+        "acc": float(accuracy_score(y_true, y_pred)),
+        "f1": float(f1_score(y_true, y_pred, zero_division=0)),
+        "auc": float(auc),
+        "train_seconds": round(train_seconds, 3),
+        "inference_seconds": round(inference_seconds, 3),
+        "profile": Profiling.records(),
+    }
+
+
+def evaluate_lodo(designs=None, max_workers=None, threads=None, epochs=None, with_train=False,
+                  use_cache=True, seed=0, output=None):
+    designs = designs or test_designs()
+    cache = Build_Cache.BuildCache(enabled=use_cache)
+    pairs = [(d, os.path.join(TEST_DIR, f"{d}_features.csv"), os.path.join(TEST_DIR, f"{d}_edges.csv"))
+             for d in designs]
+    if with_train:
+        pairs.append(("train", os.path.join(OUT_DIR, "features.csv"), os.path.join(OUT_DIR, "edges.csv")))
+    graphs = {name: load_design_graph(node_file, edge_file, cache) for name, node_file, edge_file in pairs}
+
+    max_workers = max_workers or min(len(designs), os.cpu_count() or 1)
+    threads = threads or max(1, (os.cpu_count() or 1) // max_workers)
+    folds = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(threads,)) as pool:
+        jobs = {pool.submit(_run_fold, d, graphs, epochs, seed): d for d in designs}
+        for future in as_completed(jobs):
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"held_out": jobs[future], "error": f"{type(e).__name__}: {e}"}
+            Profiling.extend(result.pop("profile", []))
+            print(f"[fold] {result['held_out']} done")
+            folds.append(result)
+
+    folds.sort(key=lambda r: designs.index(r["held_out"]))
+    report = {"workers": max_workers, "threads_per_worker": threads,
+              "total_wall_seconds": round(time.perf_counter() - start, 3), "folds": folds}
+    output = output or os.path.join(OUT_DIR, "lodo_results.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"[INFO] Results written to {output}")
+    return report
+
+
+def _print_table(report):
+    print(f"\n{'held out':<18} {'Acc':>7} {'F1':>7} {'AUC':>7} {'train s':>9} {'infer s':>9}")
+    for r in report["folds"]:
+        if "error" in r:
+            print(f"{r['held_out']:<18} failed: {r['error']}")
+            continue
+        print(f"{r['held_out']:<18} {r['acc']:>7.4f} {r['f1']:>7.4f} {r['auc']:>7.4f} "
+              f"{r['train_seconds']:>9.2f} {r['inference_seconds']:>9.3f}")
+    print(f"Total: {report['total_wall_seconds']} s ({report['workers']} workers x "
+          f"{report['threads_per_worker']} threads)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Leave-one-design-out training and evaluation.")
+    parser.add_argument("designs", nargs="*", help="designs under test/ (default: all)")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="parallel folds (default: CPU count)")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="TensorFlow threads per worker (default: CPU count / workers)")
+    parser.add_argument("--epochs", type=int, default=None, help="default: GNN.num_epochs")
+    parser.add_argument("--with-train", action="store_true", help="also train every fold on ../out")
+    parser.add_argument("--no-cache", action="store_true", help="reload every graph from its CSVs")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="results JSON (default: out/lodo_results.json)")
+    args = parser.parse_args()
+
+    designs = args.designs or test_designs()
+    if len(designs) + args.with_train < 2:
+        print("Need at least two designs to hold one out")
+        sys.exit(1)
+    report = evaluate_lodo(designs, args.workers, args.threads, args.epochs, args.with_train,
+                           not args.no_cache, args.seed, args.output)
+    _print_table(report)
+    sys.exit(0 if all("error" not in r for r in report["folds"]) else 1)
@@ -1,91 +1,294 @@
-import pickle
 import sys
 import csv
+import functools
 import glob
 import os
 
-from vcdvcd import VCDVCD
-
+import Build_Cache
 import Dot_Preprocess
+import Graph_Analytics
+import Incremental_Features
+import Vcd_Index
 import Vcd_Preprocessing
 import V_Preprocessing
 import Label_Preprocessing
+import Leakage_Analysis
+import Profiling
+import String_Table
 
 
-if __name__ == "__main__":
-    if len(sys.argv) < 3:
-        print("python tree_paths.py <dep_file> <key_register_name>")
-        sys.exit(1)
+feature_names = ['Degree', 'Hamming distance', 'Paths', 'and', 'mux', 'or', 'xor']
 
-    dot_file = f"../data/{sys.argv[1]}/{sys.argv[1]}.dot"
-    vcd_file = f"../data/{sys.argv[1]}/{sys.argv[1]}.vcd"
-    vcd_pkl_file = f"../data/{sys.argv[1]}/{sys.argv[1]}_vcd.pkl"
-    v_files = glob.glob(os.path.join("../data/" + sys.argv[1], "*.v"))
-    graph, roots, nodes, node_attrs, indegree, outdegree, key_nodes, edges = Dot_Preprocess.read_dot_file(dot_file, sys.argv[2], sys.argv[1])
-    # signal_keys = V_Preprocessing.extract_signals_with_pyverilog(v_files, vcd_file, sys.argv[1])
 
-    # for k, w, full in signal_keys:
-    #     print(f"{k:<24} width={w:<4}  ->  {full}")
+def dump_features_to_csv(Feature, out_csv="../out/features.csv"):
+    """
+    Write Feature dict to CSV.
+    Feature: dict[node] -> dict of features
+    The CSV keeps the numeric columns; the node name and the String_Table.text_columns
+    go to the string table next to it (String_Table.text_path_for(out_csv)).
+    """
+    fieldnames = set()
+    for feat in Feature.values():
+        fieldnames.update(feat.keys())
+    text = [c for c in String_Table.text_columns if c == "node" or c in fieldnames]
+    fieldnames = sorted(fieldnames - set(text))
 
-    Features = Dot_Preprocess.extract_dot_features(graph, nodes, indegree, outdegree, node_attrs, key_nodes)
+    with open(out_csv, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction="ignore")
+        writer.writeheader()
+        for node, feats in Feature.items():
+            # if str(node).__contains__("IN"):
+            #     continue
+            writer.writerow(feats)
+
+    # One row per node_number; retired numbers (Dot_Preprocess.assign_node_ids) stay empty.
+    rows = max((feats["node_number"] for feats in Feature.values()), default=-1) + 1
+    columns = {c: [""] * rows for c in text}
+    for node, feats in Feature.items():
+        for c in text:
+            columns[c][feats["node_number"]] = node if c == "node" else feats.get(c, "")
+    String_Table.write_table(String_Table.text_path_for(out_csv), columns)
+    print(f"[INFO] Features written to {out_csv}")
 
-    sig_key_str = ''
-    if os.path.exists(vcd_pkl_file):
-        print(f"Loading cached VCD object from: {vcd_pkl_file}")
-        with open(vcd_pkl_file, 'rb') as f_cache:
-            vcd = pickle.load(f_cache)
-    else:
-        print(f"Parsing VCD file: {vcd_file} (this may take a while)...")
-        vcd = VCDVCD(vcd_file, store_tvs=True)
-        with open(f"../data/{sys.argv[1]}/{sys.argv[1]}_vcd_signals.txt", "w") as f:
-            for sig_key in vcd.signals:
-                f.write(f"{sig_key}\n")
-                sig_key_str += f"{sig_key}\n"
-        with open(vcd_pkl_file, 'wb') as f_cache:
-            pickle.dump(vcd, f_cache)
-        print(f"Saving parsed VCD object to cache: {vcd_pkl_file}")
-
-    if len(sys.argv) == 4:
-        Vcd_Preprocessing.extract_vcd_features(Features, node_attrs, vcd, sys.argv[1])
-    else:
-        Vcd_Preprocessing.extract_vcd_features(Features, node_attrs, vcd, sys.argv[1], mode="train")
-
-    def dump_features_to_csv(Feature, out_csv="../out/features.csv"):
-        """
-        Write Feature dict to CSV.
-        Feature: dict[node] -> dict of features
-        """
-        fieldnames = set()
-        for feat in Feature.values():
-            fieldnames.update(feat.keys())
-        fieldnames = ["node"] + sorted(fieldnames)
-
-        with open(out_csv, "w", newline="") as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            for node, feats in Feature.items():
-                # if str(node).__contains__("IN"):
-                #     continue
-                row = {"node": node}
-                row.update(feats)
-                writer.writerow(row)
-
-        print(f"[INFO] Features written to {out_csv}")
-
-    feature_names = ['Degree', 'Hamming distance', 'Paths', 'and', 'mux', 'or', 'xor']
-
-    if len(sys.argv) == 4:
-        Label_Preprocessing.label(Features, sys.argv[3])
-        dump_features_to_csv(Features, f"../test/{sys.argv[3]}_features.csv")
-        edge_file = f"../test/{sys.argv[3]}_edges.csv"
-    else:
-        Label_Preprocessing.label(Features,"train")
-        dump_features_to_csv(Features)
-        edge_file = f"../out/edges.csv"
 
+def dump_edges_to_csv(Features, edges, edge_file="../out/edges.csv"):
     with open(edge_file, "w", newline="") as f:
         writer = csv.DictWriter(f, fieldnames=["source", "target"])
         writer.writeheader()
-        for src, dst in edges:
-            writer.writerow({"source": Features[src]["node_number"], "target": Features[dst]["node_number"]})
-        print(f"[INFO] Edges written to {edge_file}")
\ No newline at end of file
+        rows = sorted((Features[src]["node_number"], Features[dst]["node_number"]) for src, dst in edges)
+        for source, target in rows:
+            writer.writerow({"source": source, "target": target})
+        print(f"[INFO] Edges written to {edge_file}")
+
+
+@Profiling.profiled("extract_design")
+def extract_design(design_name, key_register_name, test_name=None, traces=None, cache=None, incremental=False,
+                   trace_meta=None):
+    """
+    Run the dot/VCD/feature/edge pipeline for one design.
+
+    Without `test_name` the training dataset is written to ../out/features.csv and
+    ../out/edges.csv, otherwise ../test/<test_name>_features.csv and _edges.csv.
+
+    Every stage (DOT parsing, DOT features, VCD indexing, toggle counting, node-match
+    loading, feature assembly, labeling and edge export) is keyed in `cache` by the
+    digests of its inputs, so only stages whose inputs changed are rerun.
+
+    With `incremental`, a changed design is patched from the state of the previous
+    incremental run instead (see Incremental_Features): only the features of nodes
+    affected by the DOT/toggle/mapping differences are recomputed.
+
+    With `traces` and a trace metadata file (`trace_meta`, default
+    ../data/<design>/<design>_traces.csv) the nodes also get the
+    Leakage_Analysis.leakage_feature_names columns (TVLA t / CPA rho).
+    """
+    cache = cache or Build_Cache.BuildCache()
+    mode = "train" if test_name is None else "test"
+    label_design = "train" if test_name is None else test_name
+
+    dot_file = f"../data/{design_name}/{design_name}.dot"
+    vcd_file = Vcd_Index.resolve_vcd_path(f"../data/{design_name}/{design_name}.vcd")
+    v_files = glob.glob(os.path.join("../data/" + design_name, "*.v"))
+    if test_name is None:
+        out_csv, edge_file = "../out/features.csv", "../out/edges.csv"
+    else:
+        out_csv, edge_file = f"../test/{test_name}_features.csv", f"../test/{test_name}_edges.csv"
+
+    # Stage keys only need file digests, so a hit never loads upstream results.
+    dot_key = cache.key("dot", cache.file_digest(dot_file), key_register_name,
+                        cache.module_digest(Dot_Preprocess))
+    @functools.lru_cache(maxsize=None)
+    def parse_dot():
+        return cache.get_or_compute(
+            "dot", dot_key, lambda: Dot_Preprocess.read_dot_file(dot_file, key_register_name, design_name)
+        )
+
+    # node_numbers come from the persisted ID map, so it is an input of the DOT
+    # features. The map is brought up to date with this DOT first, and only its
+    # digest afterwards goes into the key; while it is unchanged since it was last
+    # updated for dot_key, the DOT is not even loaded.
+    id_map_file = Dot_Preprocess.node_id_path_for(design_name)
+    if not cache.output_is_fresh("node_ids", dot_key, id_map_file):
+        with Profiling.span("stage:node_ids"):
+            Dot_Preprocess.assign_node_ids(parse_dot()[2], id_map_file)
+        cache.record_output("node_ids", dot_key, id_map_file)
+    dot_features_key = cache.key("dot_features", dot_key, cache.module_digest(Graph_Analytics),
+                                 cache.file_digest(id_map_file))
+
+    trace_paths = None
+    vcd_digest = None
+    if traces is not None:
+        trace_paths = Vcd_Preprocessing.expand_traces(traces)
+        toggle_inputs = [cache.file_digest(p) for p in trace_paths]
+    elif os.path.exists(vcd_file):
+        vcd_digest = cache.file_digest(vcd_file)
+        toggle_inputs = vcd_digest
+    else:
+        # No trace on disk: the committed toggle counts are the only source.
+        toggle_inputs = cache.file_digest(Vcd_Preprocessing.toggle_cache_path_for(design_name, mode))
+    toggle_key = cache.key("toggles", toggle_inputs, mode, cache.module_digest(Vcd_Preprocessing))
+    matches_key = cache.key("node_matches", cache.file_digest(Vcd_Preprocessing.node_match_path_for(design_name)),
+                            cache.module_digest(Vcd_Preprocessing))
+    if trace_meta is not None and not os.path.exists(trace_meta):
+        raise FileNotFoundError(f"Trace metadata not found: {trace_meta}")
+    trace_meta = trace_meta or Leakage_Analysis.trace_meta_path_for(design_name)
+    leakage_key = None
+    if trace_paths is not None and os.path.exists(trace_meta):
+        leakage_key = cache.key("leakage", toggle_inputs, cache.file_digest(trace_meta), matches_key,
+                                cache.module_digest(Leakage_Analysis))
+    # The stage closures below live in this file, so its own source is part of every
+    # key past the per-module stages; the exported text columns also depend on String_Table.
+    own_digest = cache.file_digest(__file__)
+    features_key = cache.key("features", dot_features_key, toggle_key, matches_key, leakage_key, own_digest)
+    label_key = cache.key("label", features_key, label_design, cache.module_digest(Label_Preprocessing),
+                          cache.module_digest(String_Table),
+                          cache.file_digest(Label_Preprocessing.rules_path), out_csv)
+    edges_key = cache.key("edges", dot_features_key, edge_file, own_digest)
+
+    @functools.lru_cache(maxsize=None)
+    def dot_features():
+        def compute():
+            graph, roots, nodes, node_attrs, indegree, outdegree, key_nodes, edges = parse_dot()
+            # signal_keys = V_Preprocessing.extract_signals_with_pyverilog(v_files, vcd_file, design_name)
+
+            # for k, w, full in signal_keys:
+            #     print(f"{k:<24} width={w:<4}  ->  {full}")
+            Features = Dot_Preprocess.extract_dot_features(graph, nodes, indegree, outdegree, node_attrs, key_nodes,
+                                                           id_map_file)
+            return Graph_Analytics.add_graph_features(Features, edges, key_nodes)
+        return cache.get_or_compute("dot_features", dot_features_key, compute)
+
+    def open_vcd():
+        def build(vcd_idx_file):
+            print(f"Indexing VCD file: {vcd_file} (this may take a while)...")
+            Vcd_Index.build_vcd_index(vcd_file, vcd_idx_file)
+            print(f"Saved VCD index to: {vcd_idx_file}")
+            with Vcd_Index.VcdIndex(vcd_idx_file) as vcd:
+                with open(f"../data/{design_name}/{design_name}_vcd_signals.txt", "w") as f:
+                    for sig_key in vcd.signals:
+                        f.write(f"{sig_key}\n")
+        index_key = cache.key("vcd_index", vcd_digest, cache.module_digest(Vcd_Index))
+        return Vcd_Index.VcdIndex(cache.cached_file("vcd_index", index_key, ".idx", build))
+
+    @functools.lru_cache(maxsize=None)
+    def toggles():
+        def compute():
+            vcd = open_vcd() if vcd_digest is not None else None
+            return Vcd_Preprocessing.load_bit_toggles(
+                vcd, design_name, mode, trace_paths, refresh=vcd is not None or trace_paths is not None
+            )
+        return cache.get_or_compute("toggles", toggle_key, compute)
+
+    def matches():
+        return cache.get_or_compute(
+            "node_matches", matches_key, lambda: Vcd_Preprocessing.load_node_matches(design_name)
+        )
+
+    @functools.lru_cache(maxsize=None)
+    def leakage():
+        return cache.get_or_compute("leakage", leakage_key, lambda: Leakage_Analysis.analyze_design(
+            design_name, trace_paths, trace_meta, matches_dict=matches())[0])
+
+    @functools.lru_cache(maxsize=None)
+    def features():
+        def compute():
+            Features = dot_features()
+            node_attrs = parse_dot()[3]
+            per_bit_toggles, widths, toggle_variances, signal_stats = toggles()
+            Vcd_Preprocessing.assign_hamming_distance(
+                Features, node_attrs, per_bit_toggles, widths, matches(), toggle_variances
+            )
+            Vcd_Preprocessing.assign_signal_features(Features, node_attrs, signal_stats, widths, matches())
+            if leakage_key is not None:
+                Leakage_Analysis.assign_leakage_features(Features, node_attrs, leakage())
+            return Features
+        return cache.get_or_compute("features", features_key, compute)
+
+    text_file = String_Table.text_path_for(out_csv)
+    if incremental:
+        state_file = Incremental_Features.state_path_for(cache.root, design_name, label_design)
+        state = Incremental_Features.load_state(state_file)
+        output_key = cache.key("incremental", label_key, edges_key, cache.module_digest(Incremental_Features))
+        if (state is not None and state["output_key"] == output_key and cache.output_is_fresh("label", label_key, out_csv)
+                and cache.output_is_fresh("label_text", label_key, text_file)
+                and cache.output_is_fresh("edges", edges_key, edge_file)):
+            print(f"[cache] incremental: {out_csv} is up to date")
+            return out_csv, edge_file
+        parsed = parse_dot()
+        toggle_data = toggles()
+        matches_dict = matches()
+        label_inputs = (label_design, cache.module_digest(Label_Preprocessing),
+                        cache.file_digest(Label_Preprocessing.rules_path))
+        if state is None:
+            print("[INFO] No incremental state yet: extracting the whole design")
+            Features = features()
+            Label_Preprocessing.label(Features, label_design)
+        else:
+            Features = Incremental_Features.update(state, parsed, toggle_data, matches_dict, id_map_file,
+                                                   label_design, label_inputs)
+            if leakage_key is not None:
+                Leakage_Analysis.assign_leakage_features(Features, parsed[3], leakage())
+        with Profiling.span("stage:export", nodes=len(Features)):
+            dump_features_to_csv(Features, out_csv)
+            dump_edges_to_csv(Features, parsed[7], edge_file)
+        Incremental_Features.save_state(state_file, Incremental_Features.make_state(
+            Features, parsed, toggle_data, matches_dict, label_inputs, output_key))
+        cache.record_output("label", label_key, out_csv)
+        cache.record_output("label_text", label_key, text_file)
+        cache.record_output("edges", edges_key, edge_file)
+        return out_csv, edge_file
+
+    if cache.output_is_fresh("label", label_key, out_csv) and cache.output_is_fresh("label_text", label_key, text_file):
+        print(f"[cache] label: {out_csv} is up to date")
+    else:
+        Features = features()
+        with Profiling.span("stage:label", nodes=len(Features)):
+            Label_Preprocessing.label(Features, label_design)
+            dump_features_to_csv(Features, out_csv)
+        cache.record_output("label", label_key, out_csv)
+        cache.record_output("label_text", label_key, text_file)
+
+    if cache.output_is_fresh("edges", edges_key, edge_file):
+        print(f"[cache] edges: {edge_file} is up to date")
+    else:
+        edges = parse_dot()[7]
+        with Profiling.span("stage:edges", edges=len(edges)):
+            dump_edges_to_csv(dot_features(), edges, edge_file)
+        cache.record_output("edges", edges_key, edge_file)
+
+    return out_csv, edge_file
+
+
+if __name__ == "__main__":
+    # Optional multi-trace mode: --traces=<directory or glob of VCD traces>
+    traces = None
+    use_cache = True
+    incremental = False
+    trace_meta = None
+    for arg in list(sys.argv[1:]):
+        if arg.startswith("--traces="):
+            traces = arg.split("=", 1)[1]
+            sys.argv.remove(arg)
+        elif arg.startswith("--trace-meta="):
+            trace_meta = arg.split("=", 1)[1]
+            sys.argv.remove(arg)
+        elif arg == "--no-cache":
+            use_cache = False
+            sys.argv.remove(arg)
+        elif arg == "--incremental":
+            incremental = True
+            sys.argv.remove(arg)
+
+    if len(sys.argv) < 3:
+        print("python Feature_Extract.py <design> <key_register_name> [<test_design>] [--traces=<dir or glob>] [--trace-meta=<csv>] [--no-cache] [--incremental]")
+        sys.exit(1)
+
+    extract_design(
+        sys.argv[1],
+        sys.argv[2],
+        sys.argv[3] if len(sys.argv) == 4 else None,
+        traces=traces,
+        cache=Build_Cache.BuildCache(enabled=use_cache),
+        incremental=incremental,
+        trace_meta=trace_meta,
+    )
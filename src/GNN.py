@@ -1,14 +1,17 @@
+import hashlib
+import os
+
+import numpy as np
+import scipy.sparse as sp
 from tensorflow import keras
-import matplotlib.pyplot as plt
 from tensorflow.keras import layers
 import tensorflow as tf
 
-hidden_units = [32, 32]
-learning_rate = 0.0001
-dropout_rate = 0.3
-num_epochs = 32
-batch_size = 20
+import Profiling
+from GNN_Defaults import (hidden_units, learning_rate, sgc_hops, dropout_rate, num_epochs, batch_size,
+                          aggregation_type, combination_type, normalize)
 
+@Profiling.profiled("run_experiment")
 def run_experiment(model, x_train, y_train):
     # Compile the model.
     model.compile(
@@ -30,10 +33,63 @@ def run_experiment(model, x_train, y_train):
         validation_split=0.10,
         callbacks=[early_stopping],
     )
+    Profiling.current().count(samples=len(x_train), epochs=len(history.history["loss"]))
+
+    return history
+
+@Profiling.profiled("train_multi_design")
+def train_multi_design(model, blocks, epochs=num_epochs, batch_size=batch_size, seed=0):
+    """
+    Train one GNNNodeClassifier on several designs.
+
+    blocks: [(design, graph_info, node_indices, labels), ...], e.g. cut out of
+    GraphInformation.pack_designs with design_block. Every mini-batch is drawn
+    from a single design and the forward pass only sees that design's graph, so
+    memory is bounded by the largest design rather than the union.
+    """
+    optimizer = keras.optimizers.Adam(learning_rate)
+    loss_fn = keras.losses.BinaryCrossentropy(from_logits=False)
+    rng = np.random.default_rng(seed)
+
+    # Build the weights and optimizer slots eagerly, then trace one step per
+    # design: each trace captures that design's graph.
+    model.set_graph(blocks[0][1])
+    model(tf.constant(blocks[0][2][:1], dtype=tf.int32))
+    optimizer.build(model.trainable_variables)
+    steps = {}
 
+    def make_step():
+        @tf.function(input_signature=[tf.TensorSpec([None], tf.int32), tf.TensorSpec([None], tf.float32)])
+        def step(node_indices, labels):
+            with tf.GradientTape() as tape:
+                probs = tf.squeeze(model(node_indices, training=True), -1)
+                loss = loss_fn(labels, probs)
+            grads = tape.gradient(loss, model.trainable_variables)
+            optimizer.apply_gradients(zip(grads, model.trainable_variables))
+            return loss
+        return step
+
+    history = {"loss": []}
+    for epoch in range(epochs):
+        losses = []
+        for b in rng.permutation(len(blocks)):
+            design, graph_info, node_indices, labels = blocks[b]
+            if design not in steps:
+                model.set_graph(graph_info)
+                steps[design] = make_step()
+            order = rng.permutation(len(node_indices))
+            for start in range(0, len(order), batch_size):
+                batch = order[start:start + batch_size]
+                losses.append(float(steps[design](
+                    tf.constant(node_indices[batch], dtype=tf.int32), tf.constant(labels[batch], dtype=tf.float32)
+                )))
+        history["loss"].append(float(np.mean(losses)))
+        print(f"Epoch {epoch + 1}/{epochs} - loss: {history['loss'][-1]:.4f}")
+    Profiling.current().count(samples=sum(len(b[2]) for b in blocks), epochs=epochs, designs=len(blocks))
     return history
 
 def display_learning_curves(history):
+    import matplotlib.pyplot as plt
     fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 5))
 
     ax1.plot(history.history["loss"])
@@ -72,6 +128,58 @@ def create_baseline_model(hidden_units, num_classes, dropout_rate=0.2, num_featu
     # Create the model.
     return keras.Model(inputs=inputs, outputs=logits, name="baseline")
 
+def propagate_features(node_features, edges, num_hops=sgc_hops):
+    """
+    SGC/SIGN-style precomputed propagation: [X, AX, A^2X, ...] concatenated,
+    where A is the row-normalized adjacency with self loops, so each hop
+    averages over the same neighbours a GraphConvLayer aggregates
+    (edges[0] receives from edges[1]).
+    """
+    x = np.asarray(node_features, dtype=np.float32)
+    n = x.shape[0]
+    edges = np.asarray(edges)
+    adj = sp.csr_matrix((np.ones(edges.shape[1], dtype=np.float32), (edges[0], edges[1])), shape=(n, n))
+    adj = adj + sp.identity(n, dtype=np.float32, format="csr")
+    adj = sp.diags(1.0 / np.asarray(adj.sum(axis=1)).ravel()) @ adj
+    hops = [x]
+    for _ in range(num_hops):
+        hops.append(adj @ hops[-1])
+    return np.concatenate(hops, axis=1).astype(np.float32)
+
+
+def load_propagated_features(node_file, edge_file, graph_info, feature_names, num_hops=sgc_hops):
+    """
+    propagate_features for a dataset, cached as <node_file>_sgc<num_hops>.npz next to
+    it and recomputed when the content of either CSV or the feature list changes.
+    """
+    h = hashlib.sha256()
+    for path in (node_file, edge_file):
+        with open(path, "rb") as f:
+            h.update(hashlib.sha256(f.read()).digest())
+    h.update(repr((list(feature_names), num_hops)).encode())
+    key = h.hexdigest()
+
+    cache_file = f"{os.path.splitext(node_file)[0]}_sgc{num_hops}.npz"
+    if os.path.exists(cache_file):
+        cached = np.load(cache_file)
+        if str(cached["key"]) == key:
+            return cached["features"]
+    node_features, edges, _ = graph_info
+    features = propagate_features(np.asarray(node_features), np.asarray(edges), num_hops)
+    np.savez(cache_file, key=key, features=features)
+    print(f"[INFO] Propagated features written to {cache_file}")
+    return features
+
+
+def create_sgc_model(hidden_units, num_features, num_hops=sgc_hops, dropout_rate=0.2):
+    """
+    MLP over the propagate_features columns of a node.
+    """
+    inputs = layers.Input(shape=(num_features * (num_hops + 1),), name="propagated_features")
+    x = create_ffn(hidden_units, dropout_rate, name="sgc_ffn")(inputs)
+    outputs = layers.Dense(1, activation="sigmoid", name="logits")(x)
+    return keras.Model(inputs=inputs, outputs=outputs, name="sgc")
+
 class GraphConvLayer(layers.Layer):
     def __init__(
         self,
@@ -112,6 +220,9 @@ class GraphConvLayer(layers.Layer):
     def aggregate(self, node_indices, neighbour_messages, node_repesentations):
 
         num_nodes = node_repesentations.shape[0]
+        if num_nodes is None:
+            # Graph-as-input (exported) models only know the node count at run time.
+            num_nodes = tf.shape(node_repesentations)[0]
         if self.aggregation_type == "sum":
             aggregated_message = tf.math.unsorted_segment_sum(
                 neighbour_messages, node_indices, num_segments=num_nodes
@@ -171,25 +282,16 @@ class GNNNodeClassifier(tf.keras.Model):
         graph_info,
         num_classes,
         hidden_units,
-        aggregation_type="sum",
-        combination_type="concat",
-        dropout_rate=0.3,
-        normalize=True,
+        aggregation_type=aggregation_type,
+        combination_type=combination_type,
+        dropout_rate=dropout_rate,
+        normalize=normalize,
         *args,
         **kwargs,
     ):
         super().__init__(*args, **kwargs)
 
-        # Unpack graph_info to three elements: node_features, edges, and edge_weight.
-        node_features, edges, edge_weights = graph_info
-        self.node_features = node_features
-        self.edges = edges
-        self.edge_weights = edge_weights
-        # Set edge_weights to ones if not provided.
-        if self.edge_weights is None:
-            self.edge_weights = tf.ones(shape=edges.shape[1])
-        # Scale edge_weights to sum to 1.
-        self.edge_weights = self.edge_weights / tf.math.reduce_sum(self.edge_weights)
+        self.set_graph(graph_info)
 
         # Create a process layer.
         self.preprocess = create_ffn(hidden_units, dropout_rate, name="preprocess")
@@ -216,6 +318,26 @@ class GNNNodeClassifier(tf.keras.Model):
         # Create a compute logits layer.
         self.compute_logits = layers.Dense(1, activation="sigmoid", name="logits")
 
+    def set_graph(self, graph_info, normalize_weights=True):
+        """
+        Run the model on another graph; the weights do not depend on its size.
+        With normalize_weights=False the edge weights are used as given, e.g. for
+        several graphs packed together that must each keep their own scaling.
+        """
+        # Unpack graph_info to three elements: node_features, edges, and edge_weight.
+        node_features, edges, edge_weights = graph_info
+        self.node_features = node_features
+        self.edges = edges
+        self.edge_weights = edge_weights
+        # Set edge_weights to ones if not provided.
+        if self.edge_weights is None:
+            self.edge_weights = tf.ones(shape=edges.shape[1])
+        # Scale edge_weights to sum to 1.
+        if normalize_weights:
+            self.edge_weights = self.edge_weights / tf.math.reduce_sum(self.edge_weights)
+        # Compiled fit/evaluate/predict functions captured the previous graph.
+        self.train_function = self.test_function = self.predict_function = None
+
     def call(self, input_node_indices):
         # Preprocess the node_features to produce node representations.
         x = self.preprocess(self.node_features)
@@ -233,4 +355,119 @@ class GNNNodeClassifier(tf.keras.Model):
         node_embeddings = tf.gather(x, input_node_indices)
         print(node_embeddings)
         # Compute logits
-        return self.compute_logits(node_embeddings)
\ No newline at end of file
+        return self.compute_logits(node_embeddings)
+
+    def cache_embeddings(self):
+        """
+        Full inference forward over the current graph, keeping the node
+        representations after preprocess, conv1 and conv2 (with their skip
+        connections) for rescore(). Returns the probability of every node.
+        """
+        x0 = self.preprocess(self.node_features, training=False)
+        x1 = self.conv1((x0, self.edges, self.edge_weights), training=False) + x0
+        x2 = self.conv2((x1, self.edges, self.edge_weights), training=False) + x1
+        probs = self.compute_logits(self.postprocess(x2, training=False))
+        self.embedding_cache = {
+            "node_features": self.node_features, "edges": np.asarray(self.edges),
+            "edge_weights": np.asarray(self.edge_weights),
+            "preprocess": x0, "conv1": x1, "conv2": x2, "probs": probs,
+        }
+        return tf.squeeze(probs, -1).numpy()
+
+    def _conv_rows(self, conv, x, rows, edges, edge_weights):
+        # conv(x) restricted to `rows`: only edges received by those rows are used.
+        mask = np.isin(edges[0], rows)
+        local = np.searchsorted(rows, edges[0][mask])
+        messages = conv.prepare(tf.gather(x, edges[1][mask]), tf.constant(edge_weights[mask]))
+        x_rows = tf.gather(x, rows)
+        aggregated = conv.aggregate(local, messages, x_rows)
+        return conv.update(x_rows, aggregated)
+
+    def rescore(self, graph_info, changed_nodes=None, verify=False, tolerance=1e-5):
+        """
+        Switch to an edited graph (same or more nodes) and update the cached
+        representations incrementally. A node's output can only change if its
+        features changed (or it is new), or within two hops of such a node or of
+        an added or removed edge; only that frontier is recomputed. changed_nodes
+        adds nodes to the seed set; feature changes are also found by diffing.
+
+        Edge weights are normalized by their global sum (set_graph), so adding or
+        removing an edge rescales the weight of every other edge and so every
+        node's output. Such structural edits are handled explicitly with a full
+        cache_embeddings() pass (stats["full"] is True); feature edits and edits
+        that keep every surviving edge's weight stay incremental.
+
+        With verify=True the result is compared to a full recomputation.
+        Returns (probabilities, stats).
+        """
+        cache = getattr(self, "embedding_cache", None)
+        if cache is None:
+            self.set_graph(graph_info)
+            probs = self.cache_embeddings()
+            return probs, {"recomputed": len(probs), "nodes": len(probs), "full": True}
+
+        self.set_graph(graph_info)
+        features = np.asarray(self.node_features)
+        edges = np.asarray(self.edges)
+        weights = np.asarray(self.edge_weights)
+        n, n_old = features.shape[0], cache["node_features"].shape[0]
+        if n < n_old:
+            raise ValueError("rescore cannot remove nodes; rebuild with cache_embeddings()")
+
+        old_features = np.asarray(cache["node_features"])
+        seeds = set(np.flatnonzero((features[:n_old] != old_features).any(axis=1)).tolist())
+        seeds.update(range(n_old, n))
+        seeds.update(int(i) for i in (changed_nodes or ()))
+
+        # Receivers (edges[0]) of every edge added, removed or reweighted.
+        def weight_map(e, w):
+            return dict(zip((e[0].astype(np.int64) * n + e[1]).tolist(), w.tolist()))
+        old_w, new_w = weight_map(cache["edges"], cache["edge_weights"]), weight_map(edges, weights)
+        if any(old_w[k] != new_w[k] for k in old_w.keys() & new_w.keys()):
+            # Renormalized weights: every receiver changes, so recompute everything.
+            probs = self.cache_embeddings()
+            return probs, {"recomputed": n, "nodes": n, "full": True}
+        touched = {k // n for k in old_w.keys() ^ new_w.keys()}
+
+        def expand(nodes):
+            # nodes plus every node that receives a message from one of them
+            senders = np.fromiter(nodes, dtype=np.int64)
+            return set(nodes) | set(edges[0][np.isin(edges[1], senders)].tolist()) | touched
+
+        def pad(x):
+            return tf.concat([x, tf.zeros((n - n_old, x.shape[1]), dtype=x.dtype)], axis=0) if n > n_old else x
+
+        rows0 = np.array(sorted(seeds), dtype=np.int64)
+        rows1 = np.array(sorted(expand(seeds)), dtype=np.int64)
+        rows2 = np.array(sorted(expand(set(rows1.tolist()))), dtype=np.int64)
+
+        x0 = pad(cache["preprocess"])
+        if len(rows0):
+            x0 = tf.tensor_scatter_nd_update(
+                x0, rows0[:, None], self.preprocess(tf.gather(self.node_features, rows0), training=False))
+        x1 = pad(cache["conv1"])
+        if len(rows1):
+            new1 = self._conv_rows(self.conv1, x0, rows1, edges, weights) + tf.gather(x0, rows1)
+            x1 = tf.tensor_scatter_nd_update(x1, rows1[:, None], new1)
+        x2 = pad(cache["conv2"])
+        probs = pad(cache["probs"])
+        if len(rows2):
+            new2 = self._conv_rows(self.conv2, x1, rows2, edges, weights) + tf.gather(x1, rows2)
+            x2 = tf.tensor_scatter_nd_update(x2, rows2[:, None], new2)
+            probs = tf.tensor_scatter_nd_update(
+                probs, rows2[:, None], self.compute_logits(self.postprocess(new2, training=False)))
+
+        self.embedding_cache = {
+            "node_features": self.node_features, "edges": edges, "edge_weights": weights,
+            "preprocess": x0, "conv1": x1, "conv2": x2, "probs": probs,
+        }
+        result = tf.squeeze(probs, -1).numpy()
+        stats = {"recomputed": len(rows2), "nodes": n, "full": False}
+        if verify:
+            incremental = self.embedding_cache
+            full = self.cache_embeddings()
+            self.embedding_cache = incremental
+            stats["max_abs_error"] = float(np.abs(full - result).max()) if n else 0.0
+            if stats["max_abs_error"] > tolerance:
+                raise RuntimeError(f"incremental rescore differs from full recomputation by {stats['max_abs_error']}")
+        return result, stats
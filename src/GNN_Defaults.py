@@ -0,0 +1,14 @@
+"""
+Default hyperparameters of the GNN. GNN.py reads them from here; this module
+does not import TensorFlow, so tools that only need the values (e.g. the parent
+process of Hyperparameter_Sweep) can load it cheaply.
+"""
+hidden_units = [32, 32]
+learning_rate = 0.0001
+sgc_hops = 2
+dropout_rate = 0.3
+num_epochs = 32
+batch_size = 20
+aggregation_type = "sum"
+combination_type = "concat"
+normalize = True
@@ -1,24 +1,106 @@
+import numpy as np
 import pandas as pd
-import tensorflow as tf
 
-def graph_information(node_file, edge_file):
+import Profiling
+import String_Table
+
+default_feature_names = ['Degree', 'Hamming distance', 'Paths', 'and', 'mux', 'or', 'xor']
+
+
+def feature_rows(nodeset, feature_names):
+    """
+    Feature matrix whose row i is node_number i. Numbers retired by
+    Dot_Preprocess.assign_node_ids leave all-zero rows that no edge or nodeset
+    row refers to.
+    """
+    numbers = nodeset["node_number"].to_numpy()
+    x = np.zeros((numbers.max() + 1 if len(numbers) else 0, len(feature_names)), dtype=np.float32)
+    x[numbers] = nodeset[feature_names].to_numpy(dtype=np.float32)
+    return x
+
+
+def compact_edges(node_numbers, edges):
+    """
+    `edges` renumbered to the rank of each node_number, for arrays whose rows are
+    the nodes sorted by node_number; unchanged when the numbers have no gaps.
+    """
+    node_numbers = np.sort(node_numbers)
+    if not len(node_numbers) or node_numbers[-1] == len(node_numbers) - 1:
+        return edges
+    return np.searchsorted(node_numbers, edges)
+
+
+@Profiling.profiled("graph_information")
+def graph_information(node_file, edge_file, feature_names=None):
+    """
+    feature_names defaults to default_feature_names; extra columns of the node
+    file (e.g. Graph_Analytics.graph_feature_names) are kept after the standard
+    ones and can be selected here. The returned nodeset has no text columns.
+    """
+    import tensorflow as tf
     nodeset = pd.read_csv(node_file)
-    # if "node" in nodeset.columns:
-    #     nodeset.drop(["node", "Node"], axis=1)
-    nodeset = nodeset.reindex(columns=['node_number', 'Node', 'Degree', 'Hamming distance', 'Paths', 'and', 'mux', 'or', 'xor', 'label'])
-    nodeset.to_csv(node_file, index=False)
+    # Files written before the string table still carry the text columns: drop
+    # them here (String_Table.attach_text brings them back for reports). The
+    # node file itself is only read.
+    nodeset = String_Table.split_text_columns(nodeset, node_file)
+    columns = ['node_number', 'Degree', 'Hamming distance', 'Paths', 'and', 'mux', 'or', 'xor', 'label']
+    extra = [c for c in nodeset.columns if c not in columns]
+    nodeset = nodeset.reindex(columns=columns + extra)
     df = pd.read_csv(edge_file)
 
     class_values = sorted(nodeset["label"].unique())
     class_idx = {name: id for id, name in enumerate(class_values)}
 
-    feature_names = ['Degree', 'Hamming distance', 'Paths', 'and', 'mux', 'or', 'xor']
+    feature_names = list(feature_names or default_feature_names)
     num_features = len(feature_names)
     num_classes = len(class_idx)
-    node_features = tf.cast(
-        nodeset[feature_names].to_numpy(), dtype=tf.dtypes.float32
-    )
+    node_features = tf.cast(feature_rows(nodeset, feature_names), dtype=tf.dtypes.float32)
     edges = df[["source", "target"]].to_numpy().T
     edge_weights = tf.ones(shape=edges.shape[1])
+    Profiling.current().count(nodes=len(nodeset), edges=edges.shape[1])
+
+    return (node_features, edges, edge_weights), feature_names, num_features, num_classes, nodeset
+
+def pack_designs(pairs, feature_names=None):
+    """
+    Pack several designs into one block-diagonal graph.
+
+    pairs: [(design, node_file, edge_file), ...]. Node numbers of each design are
+    offset by the feature rows before it and its edges are shifted to match, so the blocks
+    stay disconnected. Returns (graph_info, feature_names, num_features,
+    num_classes, nodeset, blocks): nodeset has a "design" column and the original
+    number in "local_node_number"; blocks[design] = (node_start, num_nodes,
+    edge_start, num_edges) and masks are `nodeset["design"] == design`.
+    """
+    import tensorflow as tf
+    node_features, edges, nodesets, blocks = [], [], [], {}
+    node_start = edge_start = 0
+    for design, node_file, edge_file in pairs:
+        (x, e, _), feature_names, num_features, _, nodeset = graph_information(node_file, edge_file, feature_names)
+        nodeset = nodeset.assign(design=design, local_node_number=nodeset["node_number"])
+        nodeset["node_number"] += node_start
+        blocks[design] = (node_start, x.shape[0], edge_start, e.shape[1])
+        node_features.append(x)
+        edges.append(e + node_start)
+        nodesets.append(nodeset)
+        node_start += x.shape[0]
+        edge_start += e.shape[1]
 
-    return (node_features, edges, edge_weights), feature_names, num_features, num_classes, nodeset
\ No newline at end of file
+    nodeset = pd.concat(nodesets, ignore_index=True)
+    edges = np.concatenate(edges, axis=1)
+    graph_info = (tf.concat(node_features, axis=0), edges, tf.ones(shape=edges.shape[1]))
+    num_classes = len(nodeset["label"].unique())
+    return graph_info, feature_names, num_features, num_classes, nodeset, blocks
+
+
+def design_block(graph_info, blocks, design):
+    """
+    The graph of one design cut out of a packed graph, with local node numbers.
+    """
+    node_features, edges, edge_weights = graph_info
+    node_start, num_nodes, edge_start, num_edges = blocks[design]
+    return (
+        node_features[node_start:node_start + num_nodes],
+        edges[:, edge_start:edge_start + num_edges] - node_start,
+        edge_weights[edge_start:edge_start + num_edges],
+    )
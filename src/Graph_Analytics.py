@@ -0,0 +1,153 @@
+"""
+Key-dependence graph features computed on a CSR adjacency.
+
+    Graph_Analytics.add_graph_features(Features, edges, key_nodes)
+
+adds, per node:
+    Key distance     hop distance from the nearest key node along edge direction
+                     (-1 if no key node reaches it)
+    Key ancestors    number of key nodes with a path to the node
+    Key descendants  number of key nodes reachable from the node
+    PageRank         PageRank score (damping 0.85, dangling mass spread uniformly)
+    <k>-hop size     number of distinct nodes within k outgoing hops (k in `hops`)
+
+BFS levels only touch the out-edges of the current frontier, and reachability
+propagates 64 key nodes per uint64 bitset, so each is linear in edges per level.
+"""
+import numpy as np
+
+import Profiling
+
+graph_feature_names = ['Key distance', 'Key ancestors', 'Key descendants', 'PageRank', '1-hop size', '2-hop size']
+
+
+def build_csr(Features, edges):
+    """
+    (A, A transposed) as n x n CSR matrices indexed by the position of each node
+    in Features (node_numbers can have gaps, see Dot_Preprocess.assign_node_ids).
+    """
+    import scipy.sparse as sp
+    n = len(Features)
+    index = {node: i for i, node in enumerate(Features)}
+    src = np.fromiter((index[s] for s, _ in edges), dtype=np.int64, count=len(edges))
+    dst = np.fromiter((index[d] for _, d in edges), dtype=np.int64, count=len(edges))
+    A = sp.csr_matrix((np.ones(len(src), dtype=np.int8), (src, dst)), shape=(n, n))
+    A.data[:] = 1
+    return A, A.T.tocsr()
+
+
+def _neighbors(csr, frontier):
+    """
+    Concatenated column indices of the rows in `frontier` (and the row each came from).
+    """
+    starts = csr.indptr[frontier]
+    counts = csr.indptr[frontier + 1] - starts
+    total = int(counts.sum())
+    if total == 0:
+        return np.empty(0, dtype=csr.indices.dtype), np.empty(0, dtype=frontier.dtype)
+    offsets = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(total)
+    return csr.indices[offsets], np.repeat(frontier, counts)
+
+
+def bfs_distance(csr, sources):
+    """
+    Multi-source BFS hop distance from `sources`; -1 where unreachable.
+    """
+    dist = np.full(csr.shape[0], -1, dtype=np.int64)
+    frontier = np.unique(np.asarray(sources, dtype=np.int64))
+    dist[frontier] = 0
+    level = 0
+    while len(frontier):
+        level += 1
+        nxt, _ = _neighbors(csr, frontier)
+        nxt = np.unique(nxt)
+        nxt = nxt[dist[nxt] < 0]
+        dist[nxt] = level
+        frontier = nxt.astype(np.int64)
+    return dist
+
+
+def reachability_counts(csr, sources):
+    """
+    For every node, how many of `sources` reach it along the edges of `csr`.
+    """
+    n = csr.shape[0]
+    sources = np.unique(np.asarray(sources, dtype=np.int64))
+    counts = np.zeros(n, dtype=np.int64)
+    for chunk in range(0, len(sources), 64):
+        bits = np.zeros(n, dtype=np.uint64)
+        block = sources[chunk:chunk + 64]
+        np.bitwise_or.at(bits, block, np.left_shift(np.uint64(1), np.arange(len(block), dtype=np.uint64)))
+        changed = block
+        while len(changed):
+            dst, src = _neighbors(csr, changed)
+            if not len(dst):
+                break
+            order = np.argsort(dst, kind="stable")
+            dst, incoming = dst[order], bits[src[order]]
+            heads = np.flatnonzero(np.r_[True, dst[1:] != dst[:-1]])
+            targets = dst[heads]
+            merged = np.bitwise_or.reduceat(incoming, heads) | bits[targets]
+            grew = merged != bits[targets]
+            bits[targets[grew]] = merged[grew]
+            changed = targets[grew].astype(np.int64)
+        counts += np.unpackbits(bits.view(np.uint8).reshape(n, 8), axis=1).sum(axis=1, dtype=np.int64)
+    return counts
+
+
+def pagerank(A, damping=0.85, tol=1e-10, max_iter=100):
+    n = A.shape[0]
+    if n == 0:
+        return np.zeros(0)
+    out_degree = np.asarray(A.sum(axis=1)).ravel().astype(np.float64)
+    dangling = out_degree == 0
+    inv_degree = np.divide(1.0, out_degree, out=np.zeros(n), where=~dangling)
+    AT = A.T.tocsr().astype(np.float64)
+    rank = np.full(n, 1.0 / n)
+    for _ in range(max_iter):
+        new = damping * (AT @ (rank * inv_degree) + rank[dangling].sum() / n) + (1 - damping) / n
+        if np.abs(new - rank).sum() < tol:
+            return new
+        rank = new
+    return rank
+
+
+def khop_sizes(A, hops=(1, 2)):
+    """
+    {k: number of distinct nodes within k outgoing hops, excluding the node itself}.
+    """
+    import scipy.sparse as sp
+    n = A.shape[0]
+    step = (A + sp.identity(n, dtype=np.int8, format="csr")).astype(bool).tocsr()
+    reach = sp.identity(n, dtype=bool, format="csr")
+    sizes = {}
+    for k in range(1, max(hops) + 1):
+        reach = (reach @ step).astype(bool).tocsr()
+        if k in hops:
+            sizes[k] = np.diff(reach.indptr) - 1
+    return sizes
+
+
+@Profiling.profiled("graph_analytics")
+def add_graph_features(Features, edges, key_nodes, hops=(1, 2)):
+    """
+    Add the graph_feature_names columns to every Features[node].
+    """
+    A, AT = build_csr(Features, edges)
+    index = {node: i for i, node in enumerate(Features)}
+    keys = [index[k] for k in key_nodes if k in index]
+    Profiling.current().count(nodes=A.shape[0], edges=A.nnz, key_nodes=len(keys))
+
+    columns = {
+        "Key distance": bfs_distance(A, keys),
+        "Key ancestors": reachability_counts(A, keys),
+        "Key descendants": reachability_counts(AT, keys),
+        "PageRank": pagerank(A),
+    }
+    for k, size in khop_sizes(A, hops).items():
+        columns[f"{k}-hop size"] = size
+
+    for i, feats in enumerate(Features.values()):
+        for name, values in columns.items():
+            feats[name] = values[i].item()
+    return Features
@@ -0,0 +1,276 @@
+"""
+Parallel hyperparameter sweep for GNNNodeClassifier.
+
+    python Hyperparameter_Sweep.py                          # 8 random trials of default_space
+    python Hyperparameter_Sweep.py --space space.json --trials 0 -j 2 --threads 1
+    python Hyperparameter_Sweep.py --design PRESENT --epochs 50 --metric f1
+
+The search space maps a hyperparameter to its candidate values, e.g.
+    {"learning_rate": [0.0001, 0.001], "aggregation_type": ["sum", "mean"],
+     "hidden_units": [[32, 32], [64, 64]]}
+and trials are drawn from its grid (all of it with --trials 0). Keys not given
+keep the GNN.py defaults.
+
+The graph (out/features.csv + edges.csv by default) is loaded once in the parent
+and placed in shared memory; worker processes map it without copying and build
+its tensors once per worker, not per trial. Each worker pins its TensorFlow
+thread counts. Nodes are split into stratified train/validation sets, and every
+trial reports its validation score after each epoch into a shared table: past
+`--warmup` epochs a trial whose best score is below the median of the other
+trials at the same epoch is pruned (median pruning). Results are printed as one
+ranked table and written to out/sweep_results.json.
+"""
+import argparse
+import itertools
+import multiprocessing
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import Build_Cache
+import GNN_Defaults
+from Project_Paths import OUT_DIR, SRC_DIR, TEST_DIR
+from Evaluate_LODO import load_design_graph
+
+default_space = {
+    "hidden_units": [[32, 32], [64, 64]],
+    "learning_rate": [0.0001, 0.001, 0.01],
+    "dropout_rate": [0.1, 0.3],
+    "aggregation_type": ["sum", "mean", "max"],
+    "combination_type": ["concat", "add"],
+}
+# The GNN.py defaults, read from its TensorFlow-free GNN_Defaults module.
+default_params = {name: getattr(GNN_Defaults, name)
+                  for name in ("hidden_units", "learning_rate", "dropout_rate", "batch_size", "aggregation_type",
+                               "combination_type", "normalize")}
+
+
+def sample_trials(space, num_trials, seed=0):
+    """
+    Parameter dicts from the grid of `space`: all of it when num_trials is 0,
+    otherwise num_trials distinct points drawn at random.
+    """
+    unknown = set(space) - set(default_params)
+    if unknown:
+        raise ValueError(f"Unknown hyperparameters {sorted(unknown)}; expected some of {sorted(default_params)}")
+    keys = list(space)
+    grid = [dict(zip(keys, values)) for values in itertools.product(*(space[k] for k in keys))]
+    if num_trials and num_trials < len(grid):
+        grid = random.Random(seed).sample(grid, num_trials)
+    return [{**default_params, **point} for point in grid]
+
+
+def _share(arrays):
+    # Copy arrays into shared memory blocks; returns (blocks, specs for workers).
+    blocks, specs = [], {}
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+        blocks.append(block)
+        specs[name] = (block.name, array.shape, array.dtype.str)
+    return blocks, specs
+
+
+# Worker state: shared arrays, the graph tensors built from them and the pruning table.
+_worker = {}
+
+
+def _init_worker(threads, specs, lock):
+    os.environ["TF_NUM_INTRAOP_THREADS"] = str(threads)
+    os.environ["TF_NUM_INTEROP_THREADS"] = "1"
+    os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+    _worker["lock"] = lock
+    _worker["blocks"] = []
+    for name, (block_name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        _worker["blocks"].append(block)
+        _worker[name] = np.ndarray(shape, np.dtype(dtype), buffer=block.buf)
+
+
+def _graph_info():
+    import tensorflow as tf
+    if "graph_info" not in _worker:
+        edges = _worker["edges"]
+        _worker["graph_info"] = (tf.constant(_worker["node_features"]), edges, tf.ones(shape=edges.shape[1]))
+    return _worker["graph_info"]
+
+
+def _score(metric, y_true, probs):
+    from sklearn.metrics import f1_score, roc_auc_score
+    if metric == "f1":
+        return float(f1_score(y_true, (probs >= 0.5).astype(int), zero_division=0))
+    try:
+        return float(roc_auc_score(y_true, probs))
+    except ValueError:
+        return float("nan")
+
+
+def _should_prune(reports, trial, epoch, warmup, min_trials):
+    if epoch < warmup:
+        return False
+    # Best score up to this epoch of every trial that has reached it.
+    best_so_far = np.nan_to_num(reports[:, :epoch + 1], nan=-np.inf).max(axis=1)
+    reached = ~np.isnan(reports[:, epoch])
+    reached[trial] = False
+    others = best_so_far[reached]
+    return len(others) >= min_trials and best_so_far[trial] < np.median(others)
+
+
+def _run_trial(trial, params, epochs, seed, metric, warmup, min_trials):
+    # Runs in a worker: TensorFlow is only ever imported here.
+    os.chdir(SRC_DIR)
+    import contextlib
+    import tensorflow as tf
+    import GNN
+
+    tf.keras.utils.set_random_seed(seed + trial)
+    labels = _worker["labels"]
+    train_idx, val_idx = _worker["train_idx"], _worker["val_idx"]
+    reports = _worker["reports"]
+    model = GNN.GNNNodeClassifier(graph_info=_graph_info(), num_classes=2, hidden_units=params["hidden_units"],
+                                  aggregation_type=params["aggregation_type"],
+                                  combination_type=params["combination_type"], dropout_rate=params["dropout_rate"],
+                                  normalize=params["normalize"], name="gnn_model")
+    model.compile(optimizer=tf.keras.optimizers.Adam(params["learning_rate"]),
+                  loss=tf.keras.losses.BinaryCrossentropy(from_logits=False))
+
+    state = {"status": "done", "scores": []}
+
+    class Pruning(tf.keras.callbacks.Callback):
+        def on_epoch_end(self, epoch, logs=None):
+            probs = self.model.predict(val_idx, verbose=0).squeeze(-1)
+            score = _score(metric, labels[val_idx], probs)
+            state["scores"].append(score)
+            # A trial only writes its own row; the lock keeps the other rows
+            # from changing while the pruning median is taken over them.
+            with _worker["lock"]:
+                reports[trial, epoch] = score
+                prune = _should_prune(reports, trial, epoch, warmup, min_trials)
+            if prune:
+                state["status"] = "pruned"
+                self.model.stop_training = True
+
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        model.fit(train_idx, labels[train_idx], epochs=epochs, batch_size=params["batch_size"], verbose=0,
+                  callbacks=[Pruning()])
+        probs = model.predict(val_idx, verbose=0).squeeze(-1)
+    scores = np.array(state["scores"], dtype=float)
+    return {
+        "trial": trial,
+        "params": params,
+        "status": state["status"],
+        "score": float(np.nanmax(scores)) if np.isfinite(scores).any() else float("nan"),
+        "final_score": _score(metric, labels[val_idx], probs),
+        "val_f1": _score("f1", labels[val_idx], probs),
+        "epochs": len(scores),
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+def run_sweep(trials, node_file, edge_file, epochs=32, max_workers=None, threads=None, metric="auc",
+              val_fraction=0.2, warmup=4, min_trials=2, seed=0, use_cache=True, output=None):
+    from sklearn.model_selection import train_test_split
+    cache = Build_Cache.BuildCache(enabled=use_cache)
+    node_features, edges, labels = load_design_graph(node_file, edge_file, cache)
+    all_idx = np.arange(len(labels), dtype=np.int32)
+    stratify = labels if len(np.unique(labels)) > 1 else None
+    train_idx, val_idx = train_test_split(all_idx, test_size=val_fraction, random_state=seed, stratify=stratify)
+    reports = np.full((len(trials), epochs), np.nan)
+
+    max_workers = max_workers or min(len(trials), os.cpu_count() or 1)
+    threads = threads or max(1, (os.cpu_count() or 1) // max_workers)
+    blocks, specs = _share({"node_features": node_features, "edges": edges, "labels": labels,
+                            "train_idx": np.sort(train_idx), "val_idx": np.sort(val_idx), "reports": reports})
+    results = []
+    start = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                 initargs=(threads, specs, multiprocessing.Lock())) as pool:
+            jobs = {pool.submit(_run_trial, i, params, epochs, seed, metric, warmup, min_trials): i
+                    for i, params in enumerate(trials)}
+            for future in as_completed(jobs):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    i = jobs[future]
+                    result = {"trial": i, "params": trials[i], "status": "failed",
+                              "error": f"{type(e).__name__}: {e}", "score": float("nan")}
+                print(f"[trial {result['trial']}] {result['status']} {metric}={result['score']:.4f}")
+                results.append(result)
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    results.sort(key=lambda r: (r["status"] != "done", -np.nan_to_num(r["score"], nan=-np.inf)))
+    for rank, r in enumerate(results, 1):
+        r["rank"] = rank
+    report = {"node_file": node_file, "edge_file": edge_file, "metric": metric, "epochs": epochs,
+              "train_nodes": len(train_idx), "val_nodes": len(val_idx), "workers": max_workers,
+              "threads_per_worker": threads, "total_wall_seconds": round(time.perf_counter() - start, 3),
+              "trials": results}
+    output = output or os.path.join(OUT_DIR, "sweep_results.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"[INFO] Results written to {output}")
+    return report
+
+
+def _print_table(report):
+    metric = report["metric"]
+    print(f"\n{'rank':>4} {'trial':>5} {'status':<7} {metric:>7} {'F1':>7} {'epochs':>6} {'seconds':>8}  params")
+    for r in report["trials"]:
+        params = " ".join(f"{k}={v}" for k, v in r["params"].items() if v != default_params[k])
+        if r["status"] == "failed":
+            print(f"{r['rank']:>4} {r['trial']:>5} failed  {r['error']}  {params}")
+            continue
+        print(f"{r['rank']:>4} {r['trial']:>5} {r['status']:<7} {r['score']:>7.4f} {r['val_f1']:>7.4f} "
+              f"{r['epochs']:>6} {r['seconds']:>8.2f}  {params or '(defaults)'}")
+    print(f"Total: {report['total_wall_seconds']} s ({report['workers']} workers x "
+          f"{report['threads_per_worker']} threads)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parallel hyperparameter sweep for the GNN.")
+    parser.add_argument("--space", default=None, help="JSON search space (default: default_space)")
+    parser.add_argument("--trials", type=int, default=8, help="trials drawn from the grid; 0 runs all of it")
+    parser.add_argument("--design", default=None, help="sweep on test/<design> instead of out/")
+    parser.add_argument("--epochs", type=int, default=32)
+    parser.add_argument("--metric", choices=["auc", "f1"], default="auc")
+    parser.add_argument("--val-fraction", type=float, default=0.2)
+    parser.add_argument("--warmup", type=int, default=4, help="epochs before a trial can be pruned")
+    parser.add_argument("--min-trials", type=int, default=2, help="other trials needed to compare against")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="parallel trials (default: CPU count)")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="TensorFlow threads per worker (default: CPU count / workers)")
+    parser.add_argument("--no-cache", action="store_true", help="reload the graph from its CSVs")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="results JSON (default: out/sweep_results.json)")
+    args = parser.parse_args()
+
+    space = default_space
+    if args.space:
+        with open(args.space) as f:
+            space = json.load(f)
+    trials = sample_trials(space, args.trials, args.seed)
+    if args.design:
+        node_file = os.path.join(TEST_DIR, f"{args.design}_features.csv")
+        edge_file = os.path.join(TEST_DIR, f"{args.design}_edges.csv")
+    else:
+        node_file, edge_file = os.path.join(OUT_DIR, "features.csv"), os.path.join(OUT_DIR, "edges.csv")
+    print(f"[INFO] {len(trials)} trials on {node_file}")
+    report = run_sweep(trials, node_file, edge_file, args.epochs, args.workers, args.threads, args.metric,
+                       args.val_fraction, args.warmup, args.min_trials, args.seed, not args.no_cache, args.output)
+    _print_table(report)
+    sys.exit(0 if any(r["status"] == "done" for r in report["trials"]) else 1)
@@ -0,0 +1,231 @@
+"""
+Incremental re-featurization of one design.
+
+    python Feature_Extract.py PRESENT kreg PRESENT --incremental
+
+The first incremental run extracts everything and stores the processed graph and
+its features in out/cache/incremental/<design>__<dataset>.pkl. Later runs still
+parse the new .dot, but then diff it against that state by node name:
+
+    Degree, and/or/xor/mux   only nodes whose label or incident edges changed
+    Paths                    only nodes upstream of a changed adjacency list or
+                             key-node status (Paths counts paths to the key nodes
+                             along out-edges, so a change reaches its ancestors)
+    Hamming distance and     only nodes whose label, signal mappings or mapped
+    signal statistics        signals' toggles or statistics changed
+    label                    only nodes whose label changed (all when the rules change)
+    Graph_Analytics columns  recomputed whole, and only if the structure changed
+
+and rewrite the feature, text and edge files from the patched features.
+
+Paths cuts cycles in DFS order, so on a cycle the count depends on where the DFS
+entered it. The recomputed region is therefore grown to cover every cyclic
+component whose entry could have moved (one reached from the region in the old
+or new graph), together with its ancestors; the result is always identical to
+a full extraction.
+"""
+import os
+import pickle
+
+import numpy as np
+
+import Dot_Preprocess
+import Graph_Analytics
+import Label_Preprocessing
+import Profiling
+import Vcd_Preprocessing
+
+STATE_VERSION = 2
+
+
+def state_path_for(cache_root, design_name, label_design):
+    return os.path.join(cache_root, "incremental", f"{design_name}__{label_design}.pkl")
+
+
+def load_state(path):
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+    return state if state.get("version") == STATE_VERSION else None
+
+
+def save_state(path, state):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + f".{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def _fingerprints(per_bit, widths):
+    if per_bit is None:
+        return None
+    return {sig: hash((widths.get(sig, 1), tuple(values))) for sig, values in per_bit.items()}
+
+
+def _stats_fingerprints(signal_stats, widths):
+    if signal_stats is None:
+        return None
+    return _fingerprints({sig: (*high_time, xz_time, duration)
+                          for sig, (high_time, xz_time, duration) in signal_stats.items()}, widths)
+
+
+def make_state(Features, parsed, toggle_data, matches_dict, label_inputs, output_key=None):
+    graph, roots, nodes, node_attrs, indegree, outdegree, key_nodes, edges = parsed
+    per_bit_toggles, widths, toggle_variances, signal_stats = toggle_data
+    labels = {node: node_attrs.get(node, {}).get("label", "") for node in nodes}
+    return {
+        "version": STATE_VERSION,
+        "Features": Features,
+        "graph": {u: list(children) for u, children in graph.items()},
+        "labels": labels,
+        "key_nodes": set(key_nodes),
+        "matches": {label: matches_dict.get(label) for label in set(labels.values())},
+        "toggles": _fingerprints(per_bit_toggles, widths),
+        "variances": _fingerprints(toggle_variances, widths),
+        "stats": _stats_fingerprints(signal_stats, widths),
+        "label_inputs": label_inputs,
+        "output_key": output_key,
+    }
+
+
+def _csr(graph, index):
+    import scipy.sparse as sp
+    src = [index[u] for u, children in graph.items() if u in index for v in children if v in index]
+    dst = [index[v] for u, children in graph.items() if u in index for v in children if v in index]
+    n = len(index)
+    A = sp.csr_matrix((np.ones(len(src), dtype=np.int8), (src, dst)), shape=(n, n))
+    return A, A.T.tocsr()
+
+
+def _cyclic(A):
+    # Nodes in a strongly connected component of more than one node.
+    from scipy.sparse.csgraph import connected_components
+    _, components = connected_components(A, directed=True, connection="strong")
+    return np.bincount(components)[components] > 1
+
+
+def _reach(csr, sources):
+    if not len(sources):
+        return np.zeros(csr.shape[0], dtype=bool)
+    return Graph_Analytics.bfs_distance(csr, sources) >= 0
+
+
+def paths_region(old_graph, old_nodes, new_graph, new_nodes, change_points):
+    """
+    Nodes of the new graph whose Paths must be recomputed so the result equals a
+    full extraction: the ancestors of `change_points`, grown over cyclic
+    components reachable from the region (see the module docstring).
+    """
+    new_order = list(new_nodes)
+    new_index = {u: i for i, u in enumerate(new_order)}
+    old_order = list(old_nodes)
+    old_index = {u: i for i, u in enumerate(old_order)}
+    A_new, AT_new = _csr(new_graph, new_index)
+    A_old, _ = _csr(old_graph, old_index)
+    cyclic_new, cyclic_old = _cyclic(A_new), _cyclic(A_old)
+
+    region = _reach(AT_new, [new_index[u] for u in change_points if u in new_index])
+    while True:
+        below_new = _reach(A_new, np.flatnonzero(region)) & ~region & cyclic_new
+        region_old = [old_index[new_order[i]] for i in np.flatnonzero(region) if new_order[i] in old_index]
+        below_old = _reach(A_old, region_old) & cyclic_old
+        moved = set(np.flatnonzero(below_new).tolist())
+        moved.update(new_index[old_order[i]] for i in np.flatnonzero(below_old)
+                     if old_order[i] in new_index and not region[new_index[old_order[i]]])
+        if not moved:
+            break
+        region |= _reach(AT_new, sorted(moved))
+    return {new_order[i] for i in np.flatnonzero(region)}
+
+
+@Profiling.profiled("incremental_update")
+def update(state, parsed, toggle_data, matches_dict, id_map_file, label_design, label_inputs):
+    """
+    Features of the new graph, patched from `state` (make_state of the previous
+    run). The returned dict is in node_number order.
+    """
+    graph, roots, nodes, node_attrs, indegree, outdegree, key_nodes, edges = parsed
+    per_bit_toggles, widths, toggle_variances, signal_stats = toggle_data
+    Features = state["Features"]
+    old_graph, old_labels = state["graph"], state["labels"]
+
+    labels = {node: node_attrs.get(node, {}).get("label", "") for node in nodes}
+    added = set(nodes) - set(old_labels)
+    removed = set(old_labels) - set(nodes)
+    relabeled = {u for u in nodes if u not in added and labels[u] != old_labels[u]}
+    rewired = {u for u in set(graph) | set(old_graph) if graph.get(u, []) != old_graph.get(u, [])}
+    rekeyed = set(key_nodes) ^ state["key_nodes"]
+
+    for node in removed:
+        del Features[node]
+    node_ids = Dot_Preprocess.assign_node_ids(nodes, id_map_file)
+    for node in added:
+        Features[node] = {}
+    for node, number in node_ids.items():
+        Features[node]["node_number"] = number
+
+    # Degree and operator counts.
+    endpoints = set(rewired)
+    for u in rewired:
+        endpoints.update(graph.get(u, []))
+        endpoints.update(old_graph.get(u, []))
+    touched = (endpoints | added | relabeled) & set(nodes)
+    for node in touched:
+        Features[node]["Degree"] = indegree[node] + outdegree[node]
+    for node in added | relabeled:
+        Features[node]["Node"] = labels[node]
+        Features[node].update(Dot_Preprocess.count_ops_in_label(labels[node]))
+
+    # Paths, upstream of structural changes only.
+    region = set()
+    if added or removed or rewired or rekeyed:
+        region = paths_region(old_graph, old_labels, graph, node_ids, added | rewired | rekeyed)
+        known = {node: Features[node]["Paths"] for node in node_ids if node not in region}
+        counts = Dot_Preprocess.count_all_paths_from_starts(graph, key_nodes,
+                                                             [n for n in node_ids if n in region], known)
+        for node, count in counts.items():
+            Features[node]["Paths"] = count
+
+    Features = {node: Features[node] for node in node_ids}
+    if added or removed or rewired or rekeyed:
+        Graph_Analytics.add_graph_features(Features, edges, key_nodes)
+
+    # Hamming distance and signal statistics, for nodes whose mapped signals changed.
+    toggles_now = _fingerprints(per_bit_toggles, widths)
+    variances_now = _fingerprints(toggle_variances, widths)
+    stats_now = _stats_fingerprints(signal_stats, widths)
+    if (state["variances"] is None) != (variances_now is None) or (state["stats"] is None) != (stats_now is None):
+        rehash = set(node_ids)
+    else:
+        changed_signals = {sig for sig in set(toggles_now) | set(state["toggles"])
+                           if toggles_now.get(sig) != state["toggles"].get(sig)}
+        if variances_now is not None:
+            changed_signals.update(sig for sig in set(variances_now) | set(state["variances"])
+                                   if variances_now.get(sig) != state["variances"].get(sig))
+        if stats_now is not None:
+            changed_signals.update(sig for sig in set(stats_now) | set(state["stats"])
+                                   if stats_now.get(sig) != state["stats"].get(sig))
+        changed_labels = {label for label in set(labels.values())
+                          if matches_dict.get(label) != state["matches"].get(label)
+                          or any(m[0] in changed_signals for m in matches_dict.get(label) or [])}
+        rehash = added | relabeled | {node for node in node_ids if labels[node] in changed_labels}
+    Vcd_Preprocessing.assign_hamming_distance({node: Features[node] for node in rehash}, node_attrs,
+                                              per_bit_toggles, widths, matches_dict, toggle_variances)
+    Vcd_Preprocessing.assign_signal_features({node: Features[node] for node in rehash}, node_attrs,
+                                             signal_stats, widths, matches_dict)
+
+    relabel = set(node_ids) if label_inputs != state["label_inputs"] else added | relabeled
+    if relabel:
+        Label_Preprocessing.label({node: Features[node] for node in node_ids if node in relabel}, label_design)
+
+    Profiling.current().count(nodes=len(node_ids), touched=len(touched), paths=len(region),
+                              hamming=len(rehash), labeled=len(relabel))
+    print(f"[INFO] Incremental: {len(added)} nodes added, {len(removed)} removed, {len(relabeled)} relabeled, "
+          f"{len(rewired)} adjacency lists changed; recomputed Degree/ops for {len(touched)}, "
+          f"Paths for {len(region)}, Hamming distance for {len(rehash)} of {len(node_ids)} nodes")
+    return Features
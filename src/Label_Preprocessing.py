@@ -1,51 +1,98 @@
-leaky_module = {
-    "train": [
-        ("subbytes", "s_box"),
-        ("invsubbytes", "is_box"),
-        ("subword", "s_box"),
-        ("MixColumn",),
-    ],
-    "AES_PPRM1": [
-        ("SBOX",),
-        ("Mixcolumn",),
-        ("MX",),
-        ("sb",)
-    ],
-    "AES_PPRM3": [
-        ("Sbox",),
-        ("Mixcolumn",),
-        ("MX",),
-    ],
-    "AES_TBL": [
-        ("SBOX",),
-        ("Mixcolumn",),
-        ("MX",),
-        ("EC", "sb",),
-        ("EC", "di",),
-        ("EC", "ki"),
-        ("EC", "so"),
-    ],
-    "RSA": [
-        ("MODEXP_SEQ",),
-        ("MULT_BLK",),
-    ],
-    "SABER": [
-        ("sa",),
-        (":",),
-    ],
-    "PRESENT": [
-        ("SBOX",),
-    ]
-}
-
-def label(Feature, design):
-    def contains_any(value, keyword_tuples):
-        return int(
-            any(all(kw.lower() in str(value).lower() for kw in kws) for kws in keyword_tuples)
-        )
-
-    for node in Feature.keys():
-        Feature[node]["label"] = contains_any(
-            Feature[node]["Node"],
-            leaky_module.get(design, [])
-        )
\ No newline at end of file
+"""
+Rule-based node labeling.
+
+A rule set is a list of rules, each a tuple of keywords: a node is leaky if its
+label contains every keyword of at least one rule (case-insensitive). Rule sets
+per design live in ../data/label_rules.json; designs without one get no labels.
+The "default" set is the fallback SCAR_GNN applies to unlabeled training data.
+
+All keywords of a rule set are compiled into one regex, so each node label is
+scanned once however many rules there are:
+    engine = LabelEngine(leaky_module["AES_TBL"])
+    labels, rules = engine.match(String_Table.for_node_file(node_file).values("Node"))
+"""
+import json
+import os
+import re
+
+import numpy as np
+
+rules_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "label_rules.json")
+
+
+def load_rules(path=rules_path):
+    """
+    {design: [(keyword, ...), ...]} from a JSON rules file.
+    """
+    with open(path) as f:
+        return {design: [tuple(rule) for rule in rules] for design, rules in json.load(f).items()}
+
+
+leaky_module = load_rules()
+
+
+class LabelEngine:
+    def __init__(self, rules):
+        self.rules = [tuple(kw.lower() for kw in rule) for rule in rules]
+        self.rule_names = ["&".join(rule) for rule in rules]
+        keywords = sorted({kw for rule in self.rules for kw in rule}, key=lambda kw: (-len(kw), kw))
+        # Zero-width lookahead finds a match at every position, longest keyword
+        # first; shorter keywords inside a matched one are added back through
+        # `implied`, so the found set equals the set of keywords present.
+        self.pattern = re.compile("(?=(" + "|".join(map(re.escape, keywords)) + "))") if keywords else None
+        self.implied = {kw: frozenset(k for k in keywords if k in kw) for kw in keywords}
+        self._by_found = {}
+
+    def _classify(self, found):
+        rule = self._by_found.get(found)
+        if rule is None:
+            present = set()
+            for kw in found:
+                present |= self.implied[kw]
+            rule = next((i for i, kws in enumerate(self.rules) if all(kw in present for kw in kws)), -1)
+            self._by_found[found] = rule
+        return rule
+
+    def match_one(self, value):
+        """
+        Index of the first rule that fires on `value`, or -1.
+        """
+        if self.pattern is None:
+            return -1
+        return self._classify(frozenset(self.pattern.findall(str(value).lower())))
+
+    def match(self, values):
+        """
+        (labels, rule indices) for an iterable of node labels, as int arrays.
+        """
+        rules = np.fromiter((self.match_one(v) for v in values), dtype=np.int64)
+        return (rules >= 0).astype(np.int64), rules
+
+    def rule_name(self, index):
+        return self.rule_names[index] if index >= 0 else ""
+
+
+def engine_for(design, rules=None):
+    rules = rules if rules is not None else leaky_module
+    return LabelEngine(rules.get(design, []))
+
+
+def label(Feature, design, rules=None):
+    """
+    Set Feature[node]["label"] and the name of the rule that fired in
+    Feature[node]["label_rule"] ("" when none did). Returns the number of
+    nodes each rule labeled.
+    """
+    engine = engine_for(design, rules)
+    nodes = list(Feature.keys())
+    labels, fired = engine.match(Feature[node]["Node"] for node in nodes)
+    counts = {}
+    for node, lab, rule in zip(nodes, labels.tolist(), fired.tolist()):
+        name = engine.rule_name(rule)
+        Feature[node]["label"] = lab
+        Feature[node]["label_rule"] = name
+        if lab:
+            counts[name] = counts.get(name, 0) + 1
+    for name, n in counts.items():
+        print(f"[INFO] Rule {name}: {n} nodes labeled")
+    return counts
@@ -0,0 +1,326 @@
+"""
+Key-dependence evidence from many VCD traces of one design.
+
+    python Leakage_Analysis.py PRESENT --traces=../data/PRESENT/traces
+    python Feature_Extract.py PRESENT kreg PRESENT --traces=../data/PRESENT/traces
+
+The activity of a trace is the per-bit toggle count of every signal, as used for
+"Hamming distance". Each trace is described by one row of the trace metadata
+file (default ../data/<design>/<design>_traces.csv):
+
+    trace,group,hw_sbox0_k00,hw_sbox0_k01,...
+    t0000.vcd,fixed,3,5,...
+    t0001.vcd,random,4,2,...
+
+`trace` is the trace file name. `group` is "fixed"/"random" (or 1/0) for a TVLA
+fixed-vs-random test; traces with another value take part in the correlation
+only. Every other column is a hypothesis vector for CPA, e.g. the predicted
+Hamming weight of an S-box output under one key guess.
+
+For every signal (its bits summed) and every node label (the bits its
+node_matches mapping covers, summed like "Hamming distance") this computes
+    TVLA t     Welch's t statistic, fixed minus random
+    CPA rho    Pearson correlation with each hypothesis
+for all columns at once: the traces x bits activity is projected onto those
+columns with one sparse product per batch of traces and reduced to sums, sums
+of squares and cross products with the hypotheses, so memory is bounded by the
+batch size and the statistics come out of a few array operations at the end.
+
+Nodes get the features "TVLA t" (|t|) and "CPA rho" (largest |rho| over the
+hypotheses); per-signal results go to ../data/<design>/<design>_leakage.csv.
+"""
+import argparse
+import csv
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import Profiling
+import Vcd_Preprocessing
+
+leakage_feature_names = ['TVLA t', 'CPA rho']
+_GROUPS = {"fixed": 1, "1": 1, "random": 0, "0": 0}
+
+
+def trace_meta_path_for(design_name):
+    return os.path.join('../data', design_name, f'{design_name}_traces.csv')
+
+
+def leakage_report_path_for(design_name):
+    return os.path.join('../data', design_name, f'{design_name}_leakage.csv')
+
+
+def load_trace_metadata(meta_path, trace_paths):
+    """
+    (groups, hypotheses, hypothesis_names) in the order of trace_paths. groups is
+    an int array (1 fixed, 0 random, -1 neither) or None without a "group"
+    column; hypotheses is a traces x hypotheses array or None without any.
+    """
+    with open(meta_path, 'r', newline='') as f:
+        reader = csv.DictReader(f)
+        if reader.fieldnames is None or "trace" not in reader.fieldnames:
+            raise ValueError(f"{meta_path} needs a 'trace' column")
+        names = [c for c in reader.fieldnames if c not in ("trace", "group")]
+        rows = {os.path.basename(row["trace"]): row for row in reader}
+    missing = [p for p in trace_paths if os.path.basename(p) not in rows]
+    if missing:
+        raise ValueError(f"{len(missing)} traces have no row in {meta_path}, e.g. {os.path.basename(missing[0])}")
+
+    ordered = [rows[os.path.basename(p)] for p in trace_paths]
+    groups = None
+    if "group" in reader.fieldnames:
+        groups = np.array([_GROUPS.get(row["group"].strip().lower(), -1) for row in ordered], dtype=np.int8)
+    hypotheses = None
+    if names:
+        hypotheses = np.array([[float(row[c]) for c in names] for row in ordered], dtype=np.float64)
+    return groups, hypotheses, names
+
+
+class LeakageStats:
+    """
+    Streaming statistics of a traces x columns activity matrix: per-group sums
+    and sums of squares for the Welch t-test, and cross products with the
+    hypotheses for Pearson correlation. Batches are shifted by the means of the
+    first one so the sums stay well conditioned.
+    """
+
+    def __init__(self, num_columns, num_hypotheses=0):
+        self.count = 0
+        self.sums = np.zeros(num_columns)
+        self.squares = np.zeros(num_columns)
+        self.group_count = np.zeros(2)
+        self.group_sums = np.zeros((2, num_columns))
+        self.group_squares = np.zeros((2, num_columns))
+        self.h_sums = np.zeros(num_hypotheses)
+        self.h_squares = np.zeros(num_hypotheses)
+        self.cross = np.zeros((num_columns, num_hypotheses))
+        self.shift = None
+        self.h_shift = None
+
+    def add(self, activity, groups=None, hypotheses=None):
+        X = np.asarray(activity, dtype=np.float64)
+        if not len(X):
+            return
+        if self.shift is None:
+            self.shift = X.mean(axis=0)
+            self.h_shift = hypotheses.mean(axis=0) if hypotheses is not None else None
+        X = X - self.shift
+        self.count += len(X)
+        self.sums += X.sum(axis=0)
+        self.squares += np.einsum("ij,ij->j", X, X)
+        if groups is not None:
+            for g in (0, 1):
+                rows = X[groups == g]
+                self.group_count[g] += len(rows)
+                self.group_sums[g] += rows.sum(axis=0)
+                self.group_squares[g] += np.einsum("ij,ij->j", rows, rows)
+        if hypotheses is not None:
+            H = hypotheses - self.h_shift
+            self.h_sums += H.sum(axis=0)
+            self.h_squares += np.einsum("ij,ij->j", H, H)
+            self.cross += X.T @ H
+
+    def welch_t(self):
+        """
+        Welch's t of every column, fixed group minus random group (0 where both
+        groups are constant).
+        """
+        n = self.group_count
+        if n.min() < 2:
+            raise ValueError(f"TVLA needs at least two fixed and two random traces, got {int(n[1])} and {int(n[0])}")
+        mean = self.group_sums / n[:, None]
+        var = np.maximum(self.group_squares - n[:, None] * mean * mean, 0.0) / (n[:, None] - 1)
+        denominator = np.sqrt(var[1] / n[1] + var[0] / n[0])
+        diff = mean[1] - mean[0]
+        return np.divide(diff, denominator, out=np.zeros_like(diff), where=denominator > 0)
+
+    def correlation(self):
+        """
+        Pearson correlation, columns x hypotheses (0 where either side is constant).
+        """
+        n = self.count
+        cov = self.cross - np.outer(self.sums, self.h_sums) / n
+        x_var = np.maximum(self.squares - self.sums * self.sums / n, 0.0)
+        h_var = np.maximum(self.h_squares - self.h_sums * self.h_sums / n, 0.0)
+        denominator = np.sqrt(np.outer(x_var, h_var))
+        return np.divide(cov, denominator, out=np.zeros_like(cov), where=denominator > 0)
+
+
+def projection(widths, matches_dict):
+    """
+    Sparse (bits x columns) matrix that sums a per-bit activity row into one
+    column per signal followed by one per node label with a mapping. Bit columns
+    follow the order of `widths`, most significant bit first.
+
+    Returns:
+        (matrix, bit offset of every signal, labels)
+    """
+    import scipy.sparse as sp
+    offsets, num_bits = {}, 0
+    for sig_key, width in widths.items():
+        offsets[sig_key] = num_bits
+        num_bits += width
+    rows = list(range(num_bits))
+    cols = [c for c, width in enumerate(widths.values()) for _ in range(width)]
+    labels = [label for label, mappings in matches_dict.items() if mappings]
+    for c, label in enumerate(labels, start=len(widths)):
+        for sig_key, hi, lo in matches_dict[label]:
+            if sig_key not in offsets:
+                continue
+            width = widths[sig_key]
+            for bit in range(lo, hi + 1):
+                idx = width - 1 - bit
+                if 0 <= idx < width:
+                    rows.append(offsets[sig_key] + idx)
+                    cols.append(c)
+    matrix = sp.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(num_bits, len(widths) + len(labels)))
+    return matrix, offsets, labels
+
+
+@Profiling.profiled("leakage_analysis")
+def analyze_traces(trace_paths, matches_dict, groups=None, hypotheses=None, max_workers=None, batch_size=256):
+    """
+    TVLA t and CPA correlations of every signal and node label over trace_paths.
+    The signals are those of the first trace; a signal missing from a trace
+    counts as zero toggles for it.
+
+    Returns:
+        dict with "signals", "widths", "labels", "traces" and, where groups /
+        hypotheses are given, "signal_t", "label_t", "signal_rho", "label_rho".
+    """
+    if groups is None and hypotheses is None:
+        raise ValueError("Nothing to compute: the trace metadata has neither groups nor hypotheses")
+    n = len(trace_paths)
+    Profiling.current().count(traces=n)
+    stats = matrix = offsets = batch = None
+    filled = start = 0
+
+    def flush():
+        activity = np.asarray(batch[:filled] @ matrix)
+        stats.add(activity, None if groups is None else groups[start:start + filled],
+                  None if hypotheses is None else hypotheses[start:start + filled])
+
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        per_trace = pool.map(Vcd_Preprocessing._trace_bit_toggles, trace_paths,
+                             Vcd_Preprocessing.trace_toggle_keys(trace_paths))
+        for per_bit_toggles, trace_widths in per_trace:
+            if stats is None:
+                widths = trace_widths
+                matrix, offsets, labels = projection(widths, matches_dict)
+                stats = LeakageStats(matrix.shape[1], 0 if hypotheses is None else hypotheses.shape[1])
+                batch = np.zeros((min(batch_size, n), matrix.shape[0]))
+            row = batch[filled]
+            row[:] = 0
+            for sig_key, toggles in per_bit_toggles.items():
+                if sig_key in offsets:
+                    width = widths[sig_key]
+                    row[offsets[sig_key]:offsets[sig_key] + width] = toggles[:width]
+            filled += 1
+            if filled == len(batch):
+                flush()
+                start += filled
+                filled = 0
+    if filled:
+        flush()
+    Profiling.current().count(signals=len(widths), labels=len(labels), bits=matrix.shape[0])
+
+    result = {"signals": list(widths), "widths": widths, "labels": labels, "traces": n}
+    num_signals = len(widths)
+    if groups is not None:
+        t = stats.welch_t()
+        result["signal_t"], result["label_t"] = t[:num_signals], t[num_signals:]
+    if hypotheses is not None:
+        rho = stats.correlation()
+        result["signal_rho"], result["label_rho"] = rho[:num_signals], rho[num_signals:]
+    return result
+
+
+def label_features(result):
+    """
+    Node label -> {"TVLA t": |t|, "CPA rho": max |rho|} from analyze_traces.
+    """
+    features = {label: {} for label in result["labels"]}
+    if "label_t" in result:
+        for label, t in zip(result["labels"], np.abs(result["label_t"]).tolist()):
+            features[label]["TVLA t"] = t
+    if "label_rho" in result and result["label_rho"].shape[1]:
+        for label, rho in zip(result["labels"], np.abs(result["label_rho"]).max(axis=1).tolist()):
+            features[label]["CPA rho"] = rho
+    return features
+
+
+@Profiling.profiled("assign_leakage_features")
+def assign_leakage_features(Feature, node_attrs, features_by_label, names=None):
+    """
+    Set the leakage features of every node from its label's results (0 for nodes
+    whose label has no mapping), the same way assign_hamming_distance does.
+    """
+    names = names or sorted({name for feats in features_by_label.values() for name in feats})
+    for node in Feature.keys():
+        label = node_attrs.get(node, {}).get("label", "") or ""
+        feats = features_by_label.get(label, {})
+        for name in names:
+            Feature[node][name] = feats.get(name, 0)
+    Profiling.current().count(nodes=len(Feature))
+
+
+def write_signal_report(path, result, hypothesis_names=None):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['sig_key', 'width', 'tvla_t', 'cpa_rho', 'cpa_hypothesis'])
+        for i, sig_key in enumerate(result["signals"]):
+            row = [sig_key, result["widths"][sig_key], "", "", ""]
+            if "signal_t" in result:
+                row[2] = f"{result['signal_t'][i]:.6g}"
+            if "signal_rho" in result and result["signal_rho"].shape[1]:
+                best = int(np.abs(result["signal_rho"][i]).argmax())
+                row[3] = f"{result['signal_rho'][i, best]:.6g}"
+                row[4] = hypothesis_names[best] if hypothesis_names else best
+            writer.writerow(row)
+    print(f"[INFO] Leakage report written to {path}")
+
+
+def analyze_design(design_name, traces, meta_path=None, max_workers=None, batch_size=256, matches_dict=None):
+    """
+    Run analyze_traces on the traces of one design, write its per-signal report
+    and return the leakage features by node label.
+    """
+    trace_paths = Vcd_Preprocessing.expand_traces(traces)
+    if not trace_paths:
+        raise FileNotFoundError(f"No VCD traces found for {traces}")
+    meta_path = meta_path or trace_meta_path_for(design_name)
+    groups, hypotheses, names = load_trace_metadata(meta_path, trace_paths)
+    if matches_dict is None:
+        matches_dict = Vcd_Preprocessing.load_node_matches(design_name)
+    print(f"Computing leakage statistics over {len(trace_paths)} traces...")
+    result = analyze_traces(trace_paths, matches_dict, groups, hypotheses, max_workers, batch_size)
+    write_signal_report(leakage_report_path_for(design_name), result, names)
+    return label_features(result), result, names
+
+
+def _print_top(result, names, top):
+    if "signal_t" in result:
+        print(f"\nTop {top} signals by |TVLA t| (|t| > 4.5 is the usual leakage threshold):")
+        for i in np.argsort(-np.abs(result["signal_t"]))[:top]:
+            print(f"  {result['signal_t'][i]:>10.3f}  {result['signals'][i]}")
+    if "signal_rho" in result and result["signal_rho"].shape[1]:
+        best = np.abs(result["signal_rho"]).max(axis=1)
+        print(f"\nTop {top} signals by |CPA rho|:")
+        for i in np.argsort(-best)[:top]:
+            h = int(np.abs(result["signal_rho"][i]).argmax())
+            print(f"  {result['signal_rho'][i, h]:>10.4f}  {result['signals'][i]}  ({names[h]})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="TVLA and CPA statistics of a design's VCD traces.")
+    parser.add_argument("design")
+    parser.add_argument("--traces", required=True, help="directory or glob of VCD traces")
+    parser.add_argument("--meta", default=None, help="trace metadata CSV (default: data/<design>/<design>_traces.csv)")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="trace parsing processes")
+    parser.add_argument("--batch-size", type=int, default=256, help="traces reduced per batch")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    _, result, names = analyze_design(args.design, args.traces, args.meta, args.workers, args.batch_size)
+    _print_top(result, names, args.top)
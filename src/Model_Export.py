@@ -0,0 +1,306 @@
+"""
+Export GNNNodeClassifier for CPU-only scoring.
+
+    python Model_Export.py export [--quantize float16|int8] [--saved-model]
+    python Model_Export.py report                       # every test/ design
+
+`export` writes out/gnn_export.npz (or _float16/_int8): every Dense and
+BatchNormalization parameter plus a JSON spec of the model structure and the
+digest of the weights file it came from; `ensure_export` re-exports whenever
+the weights were retrained since. With
+--quantize the Dense kernels are stored as float16, or as int8 with one float32
+scale per output column (symmetric, max-abs); biases and normalization
+parameters stay float32. --saved-model also writes a frozen TensorFlow SavedModel
+whose serving function takes the graph as input (node_features, edges,
+edge_weights) and returns every node's probability.
+
+`NumpyGNN` executes an export with NumPy alone (dense layers, inference-mode
+batch norm, segment-sum aggregation); importing this module does not import
+TensorFlow. `report` scores every test/ design with the Keras model and with
+each export and prints probability/accuracy deltas and speedups.
+"""
+import argparse
+import glob
+import json
+import os
+import time
+
+import numpy as np
+
+import Build_Cache
+from GraphInformation import compact_edges, default_feature_names
+from Project_Paths import OUT_DIR, TEST_DIR
+
+WEIGHTS_FILE = os.path.join(OUT_DIR, "gnn_weights.weights.h5")
+
+
+def export_path_for(quantize=None):
+    return os.path.join(OUT_DIR, f"gnn_export_{quantize}.npz" if quantize else "gnn_export.npz")
+
+
+def weights_digest(weights_file):
+    return Build_Cache.BuildCache(os.path.join(OUT_DIR, "cache")).file_digest(weights_file)
+
+
+def load_keras_model(weights_file=WEIGHTS_FILE):
+    import tensorflow as tf
+    import GNN
+    dummy = (tf.zeros((1, len(default_feature_names))), np.zeros((2, 1), dtype=np.int64), tf.ones(1))
+    model = GNN.GNNNodeClassifier(graph_info=dummy, num_classes=2, hidden_units=GNN.hidden_units,
+                                  dropout_rate=GNN.dropout_rate, name="gnn_model")
+    _ = model(tf.convert_to_tensor([0], dtype=tf.int32))
+    model.load_weights(weights_file)
+    return model
+
+
+def _quantize(kernel, quantize):
+    if quantize == "float16":
+        return {"kernel": kernel.astype(np.float16)}
+    if quantize == "int8":
+        scale = np.abs(kernel).max(axis=0) / 127.0
+        scale[scale == 0] = 1.0
+        return {"kernel.q": np.round(kernel / scale).astype(np.int8), "kernel.scale": scale.astype(np.float32)}
+    return {"kernel": kernel.astype(np.float32)}
+
+
+def export_model(weights_file=WEIGHTS_FILE, out_path=None, quantize=None, saved_model=None):
+    """
+    Write the weights and structure of a trained GNNNodeClassifier to an .npz.
+    """
+    model = load_keras_model(weights_file)
+    arrays, spec = {}, {"quantize": quantize, "weights_digest": weights_digest(weights_file),
+                        "blocks": {}, "normalize": bool(model.conv1.normalize),
+                        "aggregation_type": model.conv1.aggregation_type,
+                        "combination_type": model.conv1.combination_type}
+    ffns = {"preprocess": model.preprocess, "conv1.prepare": model.conv1.ffn_prepare,
+            "conv1.update": model.conv1.update_fn, "conv2.prepare": model.conv2.ffn_prepare,
+            "conv2.update": model.conv2.update_fn, "postprocess": model.postprocess}
+    for block, ffn in ffns.items():
+        layers = []
+        for i, layer in enumerate(ffn.layers):
+            name = f"{block}/{i}"
+            kind = type(layer).__name__
+            if kind == "BatchNormalization":
+                gamma, beta, mean, var = (w.numpy().astype(np.float32) for w in layer.weights)
+                arrays.update({f"{name}/gamma": gamma, f"{name}/beta": beta, f"{name}/mean": mean, f"{name}/var": var})
+                layers.append({"type": "batch_norm", "name": name, "epsilon": float(layer.epsilon)})
+            elif kind == "Dense":
+                kernel, bias = (w.numpy() for w in layer.weights)
+                for k, v in _quantize(kernel, quantize).items():
+                    arrays[f"{name}/{k}"] = v
+                arrays[f"{name}/bias"] = bias.astype(np.float32)
+                layers.append({"type": "dense", "name": name, "activation": "relu"})
+        spec["blocks"][block] = layers
+    kernel, bias = (w.numpy() for w in model.compute_logits.weights)
+    for k, v in _quantize(kernel, quantize).items():
+        arrays[f"logits/{k}"] = v
+    arrays["logits/bias"] = bias.astype(np.float32)
+
+    out_path = out_path or export_path_for(quantize)
+    np.savez(out_path, spec=json.dumps(spec), **arrays)
+    print(f"[INFO] Exported {'float32' if not quantize else quantize} model to {out_path} "
+          f"({os.path.getsize(out_path) / 1024:.1f} KB)")
+    if saved_model:
+        export_saved_model(model, saved_model)
+    return out_path
+
+
+def ensure_export(weights_file=WEIGHTS_FILE, out_path=None, quantize=None):
+    """
+    Path of an export of weights_file, reusing out_path only if it was exported
+    from the current weights (same digest) and re-exporting otherwise.
+    """
+    out_path = out_path or export_path_for(quantize)
+    if os.path.exists(out_path):
+        with np.load(out_path) as data:
+            spec = json.loads(str(data["spec"]))
+        if spec.get("weights_digest") == weights_digest(weights_file) and spec.get("quantize") == quantize:
+            return out_path
+        print(f"[INFO] {out_path} was exported from other weights; exporting again")
+    return export_model(weights_file, out_path, quantize)
+
+
+def export_saved_model(model, path):
+    """
+    Frozen SavedModel with the graph as input: serve(node_features, edges, edge_weights) -> probabilities.
+    """
+    import tensorflow as tf
+
+    class Exported(tf.Module):
+        def __init__(self, model):
+            super().__init__()
+            # Track the sublayers, not the Keras model, whose own serving
+            # signature takes node indices.
+            self.preprocess, self.conv1, self.conv2 = model.preprocess, model.conv1, model.conv2
+            self.postprocess, self.compute_logits = model.postprocess, model.compute_logits
+
+        @tf.function(input_signature=[
+            tf.TensorSpec([None, len(default_feature_names)], tf.float32, name="node_features"),
+            tf.TensorSpec([2, None], tf.int64, name="edges"),
+            tf.TensorSpec([None], tf.float32, name="edge_weights"),
+        ])
+        def serve(self, node_features, edges, edge_weights):
+            weights = edge_weights / tf.math.reduce_sum(edge_weights)
+            x = self.preprocess(node_features, training=False)
+            x = self.conv1((x, edges, weights), training=False) + x
+            x = self.conv2((x, edges, weights), training=False) + x
+            return tf.squeeze(self.compute_logits(self.postprocess(x, training=False)), -1)
+
+    module = Exported(model)
+    tf.saved_model.save(module, path, signatures={"serving_default": module.serve})
+    print(f"[INFO] SavedModel written to {path}")
+
+
+class NumpyGNN:
+    """
+    Reference executor for an exported GNNNodeClassifier, NumPy only.
+    """
+    def __init__(self, path):
+        with np.load(path) as data:
+            self.spec = json.loads(str(data["spec"]))
+            self.params = {}
+            for name in data.files:
+                if name.endswith(".q"):
+                    base = name[:-2]
+                    self.params[base] = data[name].astype(np.float32) * data[base + ".scale"]
+                elif not name.endswith(".scale") and name != "spec":
+                    self.params[name] = data[name].astype(np.float32)
+        if (self.spec["aggregation_type"], self.spec["combination_type"]) != ("sum", "concat"):
+            raise ValueError(f"NumpyGNN only implements sum aggregation with concat combination, got "
+                             f"{self.spec['aggregation_type']}/{self.spec['combination_type']}")
+
+    def _ffn(self, block, x):
+        for layer in self.spec["blocks"][block]:
+            p = layer["name"]
+            if layer["type"] == "batch_norm":
+                inv = self.params[f"{p}/gamma"] / np.sqrt(self.params[f"{p}/var"] + layer["epsilon"])
+                x = (x - self.params[f"{p}/mean"]) * inv + self.params[f"{p}/beta"]
+            else:
+                x = np.maximum(x @ self.params[f"{p}/kernel"] + self.params[f"{p}/bias"], 0.0)
+        return x
+
+    @staticmethod
+    def _segment_sum(values, segments, num_segments):
+        out = np.zeros((num_segments, values.shape[1]), dtype=values.dtype)
+        if len(segments):
+            order = np.argsort(segments, kind="stable")
+            segments = segments[order]
+            heads = np.flatnonzero(np.r_[True, segments[1:] != segments[:-1]])
+            out[segments[heads]] = np.add.reduceat(values[order], heads, axis=0)
+        return out
+
+    def _conv(self, name, x, edges, weights):
+        messages = self._ffn(f"{name}.prepare", x[edges[1]]) * weights[:, None]
+        aggregated = self._segment_sum(messages, edges[0], x.shape[0])
+        h = self._ffn(f"{name}.update", np.concatenate([x, aggregated], axis=1))
+        if self.spec["normalize"]:
+            h = h / np.maximum(np.linalg.norm(h, axis=1, keepdims=True), 1e-6)
+        return h
+
+    def predict(self, node_features, edges, edge_weights=None, node_indices=None, normalize_weights=True):
+        """
+        Probability of every node (or of node_indices). As in
+        GNNNodeClassifier.set_graph, edge weights are scaled to sum to 1 unless
+        normalize_weights is False.
+        """
+        x = np.asarray(node_features, dtype=np.float32)
+        edges = np.asarray(edges, dtype=np.int64)
+        weights = np.ones(edges.shape[1], dtype=np.float32) if edge_weights is None else \
+            np.asarray(edge_weights, dtype=np.float32)
+        if normalize_weights:
+            weights = weights / weights.sum()
+        x = self._ffn("preprocess", x)
+        x = self._conv("conv1", x, edges, weights) + x
+        x = self._conv("conv2", x, edges, weights) + x
+        x = self._ffn("postprocess", x)
+        if node_indices is not None:
+            x = x[node_indices]
+        logits = x @ self.params["logits/kernel"] + self.params["logits/bias"]
+        return 1.0 / (1.0 + np.exp(-logits[:, 0]))
+
+
+def _read_design(node_file, edge_file):
+    import pandas as pd
+    nodeset = pd.read_csv(node_file).sort_values("node_number")
+    edges = pd.read_csv(edge_file)[["source", "target"]].to_numpy().T
+    edges = compact_edges(nodeset["node_number"].to_numpy(), edges)
+    return (nodeset[default_feature_names].to_numpy(dtype=np.float32), edges,
+            nodeset["label"].to_numpy() if "label" in nodeset else None)
+
+
+def _best_time(fn, repeat=5):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def report(weights_file=WEIGHTS_FILE, quantizations=(None, "float16", "int8"), output=None):
+    """
+    Score every test/ design with the Keras model and with each export; return per-design rows.
+    """
+    import contextlib
+    import tensorflow as tf
+    model = load_keras_model(weights_file)
+    executors = {}
+    for q in quantizations:
+        executors[q or "float32"] = NumpyGNN(ensure_export(weights_file, quantize=q))
+
+    rows = []
+    for node_file in sorted(glob.glob(os.path.join(TEST_DIR, "*_features.csv"))):
+        design = os.path.basename(node_file).replace("_features.csv", "")
+        edge_file = os.path.join(TEST_DIR, f"{design}_edges.csv")
+        if not os.path.exists(edge_file):
+            continue
+        x, edges, labels = _read_design(node_file, edge_file)
+        all_idx = np.arange(len(x), dtype=np.int32)
+        model.set_graph((tf.constant(x), edges, tf.ones(edges.shape[1])))
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            model.predict(all_idx, verbose=0)
+            tf_seconds, tf_probs = _best_time(lambda: model.predict(all_idx, verbose=0).squeeze(-1))
+        for name, executor in executors.items():
+            np_seconds, probs = _best_time(lambda: executor.predict(x, edges))
+            row = {
+                "design": design, "executor": f"numpy-{name}", "nodes": len(x),
+                "max_prob_delta": float(np.abs(probs - tf_probs).max()),
+                "prediction_agreement": float(((probs >= 0.5) == (tf_probs >= 0.5)).mean()),
+                "tf_seconds": round(tf_seconds, 5), "seconds": round(np_seconds, 5),
+                "speedup": round(tf_seconds / np_seconds, 2),
+            }
+            if labels is not None:
+                row["accuracy_delta"] = float(((probs >= 0.5) == labels).mean() - ((tf_probs >= 0.5) == labels).mean())
+            rows.append(row)
+
+    print(f"\n{'design':<12} {'executor':<15} {'max |dp|':>10} {'agree':>7} {'acc delta':>10} "
+          f"{'tf ms':>8} {'ms':>8} {'speedup':>8}")
+    for r in rows:
+        print(f"{r['design']:<12} {r['executor']:<15} {r['max_prob_delta']:>10.2e} {r['prediction_agreement']:>7.4f} "
+              f"{r.get('accuracy_delta', float('nan')):>+10.4f} {r['tf_seconds'] * 1000:>8.2f} "
+              f"{r['seconds'] * 1000:>8.2f} {r['speedup']:>7.1f}x")
+    output = output or os.path.join(OUT_DIR, "export_report.json")
+    with open(output, "w") as f:
+        json.dump(rows, f, indent=2)
+    print(f"[INFO] Report written to {output}")
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export GNNNodeClassifier for TensorFlow-free CPU inference.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("export")
+    p.add_argument("--weights", default=WEIGHTS_FILE)
+    p.add_argument("--quantize", choices=["float16", "int8"], default=None)
+    p.add_argument("--output", default=None, help="default: out/gnn_export[_<quantize>].npz")
+    p.add_argument("--saved-model", nargs="?", const=os.path.join(OUT_DIR, "gnn_saved_model"), default=None,
+                   help="also write a graph-as-input SavedModel (default path: out/gnn_saved_model)")
+    p = sub.add_parser("report")
+    p.add_argument("--weights", default=WEIGHTS_FILE)
+    p.add_argument("--output", default=None, help="default: out/export_report.json")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export_model(args.weights, args.output, args.quantize, args.saved_model)
+    else:
+        report(args.weights, output=args.output)
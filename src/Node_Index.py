@@ -0,0 +1,178 @@
+"""
+Inverted token index over CDFG node labels.
+
+    index = Node_Index.load_or_build(dot_file, node_attrs)
+    index.nodes_referencing("kreg")          # key-node discovery
+    index.nodes_under_module("AES_TBL_ENC")  # every node of a module
+    index.search(var="Kin", op="^")          # AND of exact tokens
+
+    python Node_Index.py AES_TBL --register Kin --module AES_TBL_ENC --op "^"
+
+Every label is tokenized once into variables (maximal [A-Za-z0-9_$] runs, so
+bit ranges and constants index as well), operators and the module path parts of
+the node name ("AES_TBL_ENC.249:AS" -> AES_TBL_ENC). The index is pickled to
+../data/<design>/<design>_node_index.pkl together with the size/mtime and digest
+of the .dot file it was built from, and rebuilt only when that file changes.
+"""
+import argparse
+import hashlib
+import os
+import pickle
+import re
+
+_VAR = re.compile(r"[A-Za-z0-9_$]+")
+_OP = re.compile(r"<<<|>>>|<<|>>|&&|\|\||===|!==|==|!=|<=|>=|~\^|\^~|~&|~\||[&|^~+\-*/%?:<>=!]")
+_IDENT = re.compile(r"[A-Za-z0-9_$]+\Z")
+
+KINDS = ("var", "op", "module")
+
+
+def _split_label(label):
+    # Labels are "<node name>\n<statement>"; the operators of the name line
+    # (".", ":") are not part of the statement.
+    name, _, statement = label.partition("\n")
+    return name, statement
+
+
+def module_path(node):
+    """
+    Module path parts of a node name: "AES_TBL_ENC.sub.249:AS" -> ["AES_TBL_ENC", "sub"].
+    """
+    parts = node.split(":", 1)[0].split(".")
+    return parts[:-1]
+
+
+def index_path_for(dot_file):
+    return re.sub(r"\.dot$", "", dot_file) + "_node_index.pkl"
+
+
+def _dot_stamp(dot_file):
+    st = os.stat(dot_file)
+    h = hashlib.sha256()
+    with open(dot_file, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return st.st_size, st.st_mtime_ns, h.hexdigest()
+
+
+class NodeIndex:
+    def __init__(self, node_attrs):
+        self.nodes = list(node_attrs)
+        self.labels = [attrs.get("label", "") for attrs in node_attrs.values()]
+        self.postings = {kind: {} for kind in KINDS}
+        self.stamp = None
+        self.rebuilt = True
+        for i, (node, label) in enumerate(zip(self.nodes, self.labels)):
+            for token in set(_VAR.findall(label)):
+                self.postings["var"].setdefault(token, []).append(i)
+            for token in set(_OP.findall(_split_label(label)[1])):
+                self.postings["op"].setdefault(token, []).append(i)
+            for depth in range(1, len(module_path(node)) + 1):
+                path = ".".join(module_path(node)[:depth])
+                self.postings["module"].setdefault(path, []).append(i)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def _names(self, ids):
+        return {self.nodes[i] for i in ids}
+
+    def vocabulary(self, kind="var"):
+        return sorted(self.postings[kind])
+
+    def nodes_with_token(self, token, kind="var"):
+        return self._names(self.postings[kind].get(token, ()))
+
+    def nodes_referencing(self, name):
+        """
+        Nodes whose label contains `name` (same result as `name in label`).
+        An identifier can only occur inside one variable token, so only the
+        vocabulary is scanned; other strings fall back to scanning the labels.
+        """
+        if not name:
+            return {node for node, label in zip(self.nodes, self.labels) if label}
+        if not _IDENT.match(name):
+            return {node for node, label in zip(self.nodes, self.labels) if name in label}
+        ids = set()
+        for token, postings in self.postings["var"].items():
+            if name in token:
+                ids.update(postings)
+        return self._names(ids)
+
+    def nodes_under_module(self, path):
+        """
+        Nodes whose module path starts with `path` ("A" or "A.B").
+        """
+        return self._names(self.postings["module"].get(path, ()))
+
+    def search(self, var=None, op=None, module=None):
+        """
+        Nodes matching every given exact token.
+        """
+        result = None
+        for kind, token in (("var", var), ("op", op), ("module", module)):
+            if token is None:
+                continue
+            ids = set(self.postings[kind].get(token, ()))
+            result = ids if result is None else result & ids
+        return self._names(result if result is not None else range(len(self.nodes)))
+
+    def save(self, path):
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+
+def load_or_build(dot_file, node_attrs=None, index_file=None):
+    """
+    The persisted index of `dot_file`, rebuilt from `node_attrs` (or by parsing
+    the .dot file) when missing or stale.
+    """
+    index_file = index_file or index_path_for(dot_file)
+    st = os.stat(dot_file)
+    if os.path.exists(index_file):
+        with open(index_file, "rb") as f:
+            index = pickle.load(f)
+        index.rebuilt = False
+        if index.stamp and index.stamp[:2] == (st.st_size, st.st_mtime_ns):
+            return index
+        stamp = _dot_stamp(dot_file)
+        if index.stamp and index.stamp[2] == stamp[2]:
+            index.stamp = stamp
+            index.save(index_file)
+            return index
+    else:
+        stamp = _dot_stamp(dot_file)
+
+    if node_attrs is None:
+        import Dot_Preprocess
+        node_attrs = Dot_Preprocess.read_node_attrs(dot_file)
+    index = NodeIndex(node_attrs)
+    index.stamp = stamp
+    index.save(index_file)
+    index.rebuilt = True
+    return index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query the node label index of a design.")
+    parser.add_argument("design")
+    parser.add_argument("--register", help="nodes whose label references this register")
+    parser.add_argument("--var", help="nodes with this exact variable token")
+    parser.add_argument("--op", help="nodes whose statement uses this operator")
+    parser.add_argument("--module", help="nodes under this module path")
+    parser.add_argument("--vocabulary", choices=KINDS, help="list the tokens of one kind")
+    args = parser.parse_args()
+
+    index = load_or_build(f"../data/{args.design}/{args.design}.dot")
+    if args.vocabulary:
+        for token in index.vocabulary(args.vocabulary):
+            print(token)
+    else:
+        result = index.search(args.var, args.op, args.module)
+        if args.register is not None:
+            result &= index.nodes_referencing(args.register)
+        for node in sorted(result):
+            print(node)
+        print(f"[INFO] {len(result)} of {len(index)} nodes")
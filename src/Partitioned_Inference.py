@@ -0,0 +1,279 @@
+"""
+Partitioned, out-of-core GNN inference for graphs that do not fit in memory.
+
+    python Partitioned_Inference.py ../test/SABER_features.csv ../test/SABER_edges.csv --max-nodes 200
+    python Partitioned_Inference.py big_features.csv big_edges.csv --strategy range --keras
+
+1. `prepare_partitions` streams the CSVs in chunks into memory-mapped arrays,
+   groups nodes into partitions of at most `max_nodes` core nodes and writes each
+   partition to disk with its 2-hop halo: the nodes that send messages to the core
+   (first conv) and to those (second conv), plus the edges received by the core
+   and the first hop.
+2. `run_partitions` loads one partition at a time, runs the model on it and keeps
+   the predictions of its core nodes, which see exactly the same 2-hop
+   neighbourhood as in the full graph, so the stitched output equals full-graph
+   inference. Edge weights keep their full-graph scaling (1 / total edges).
+
+Partitioning follows the module hierarchy in the node names ("AES_TBL_ENC.EC.MX3.151:AS"
+-> AES_TBL_ENC.EC.MX3): modules are packed whole into partitions in path order,
+so siblings share a partition and halos stay small; modules larger than
+`max_nodes` are split. The "range" strategy cuts contiguous node_number ranges.
+Model activations are bounded by the partition size (core + halo). Features,
+edges, per-node module codes and both sort orders (nodes by module, edges by
+receiver) are memory-mapped from disk and built chunk by chunk with a counting
+sort, so apart from the partition being processed, memory holds one chunk and
+one entry per distinct module.
+"""
+import argparse
+import glob
+import json
+import os
+import shutil
+import time
+import numpy as np
+
+import String_Table
+from GraphInformation import default_feature_names
+from Project_Paths import OUT_DIR
+
+
+def module_key(node, depth=None):
+    """
+    Module path of a node name, optionally cut to `depth` parts ("" at top level).
+    """
+    parts = str(node).split(":", 1)[0].split(".")[:-1]
+    return ".".join(parts if depth is None else parts[:depth])
+
+
+def _load_arrays(node_file, edge_file, work_dir, chunksize):
+    # Features, edges and integer module codes (ranked by module path) as memmaps.
+    import pandas as pd
+    header = pd.read_csv(node_file, nrows=0).columns
+    # Node names live in the string table unless the CSV predates it.
+    name_column = next((c for c in ("node", "Node") if c in header), None)
+    table = String_Table.for_node_file(node_file) if name_column is None else None
+    # Row i is node_number i; numbers retired by Dot_Preprocess.assign_node_ids are
+    # all-zero, edgeless rows in the top-level module.
+    n = max(int(c["node_number"].max()) for c in pd.read_csv(node_file, usecols=["node_number"],
+                                                               chunksize=chunksize)) + 1
+    features = np.lib.format.open_memmap(os.path.join(work_dir, "features.npy"), mode="w+", dtype=np.float32,
+                                         shape=(n, len(default_feature_names)))
+    modules = np.lib.format.open_memmap(os.path.join(work_dir, "modules.npy"), mode="w+", dtype=np.int64,
+                                        shape=(n,))
+    codes = {"": 0}
+    for chunk in pd.read_csv(node_file, usecols=["node_number"] + ([name_column] if name_column else [])
+                             + default_feature_names, chunksize=chunksize):
+        ids = chunk["node_number"].to_numpy()
+        features[ids] = chunk[default_feature_names].to_numpy(dtype=np.float32)
+        names = chunk[name_column] if name_column else table.names(ids)
+        modules[ids] = [codes.setdefault(module_key(name), len(codes)) for name in names]
+    features.flush()
+    # Renumber the codes in module path order, so sorting by code sorts by path.
+    rank = np.empty(len(codes), dtype=np.int64)
+    rank[[codes[m] for m in sorted(codes)]] = np.arange(len(codes))
+    for start in range(0, n, chunksize):
+        modules[start:start + chunksize] = rank[modules[start:start + chunksize]]
+    modules.flush()
+
+    num_edges = sum(len(c) for c in pd.read_csv(edge_file, usecols=["source"], chunksize=chunksize))
+    edges = np.lib.format.open_memmap(os.path.join(work_dir, "edges.npy"), mode="w+", dtype=np.int64,
+                                      shape=(2, num_edges))
+    pos = 0
+    for chunk in pd.read_csv(edge_file, usecols=["source", "target"], chunksize=chunksize):
+        edges[:, pos:pos + len(chunk)] = chunk[["source", "target"]].to_numpy().T
+        pos += len(chunk)
+    edges.flush()
+    return features, edges, modules, len(codes)
+
+
+def _counting_sort(keys, num_keys, work_dir, name, chunksize=1 << 18):
+    """
+    Stable sort of the indices of `keys` (integers in [0, num_keys)) by key,
+    chunk by chunk into memmaps: returns (order, indptr) where
+    order[indptr[k]:indptr[k + 1]] are the indices with key k, ascending.
+    """
+    m = len(keys)
+    indptr = np.lib.format.open_memmap(os.path.join(work_dir, f"{name}_indptr.npy"), mode="w+", dtype=np.int64,
+                                       shape=(num_keys + 1,))
+    indptr[:] = 0
+    for start in range(0, m, chunksize):
+        values, counts = np.unique(keys[start:start + chunksize], return_counts=True)
+        indptr[values + 1] += counts
+    np.cumsum(indptr, out=indptr)
+    order = np.lib.format.open_memmap(os.path.join(work_dir, f"{name}_order.npy"), mode="w+", dtype=np.int64,
+                                      shape=(m,))
+    fill = np.lib.format.open_memmap(os.path.join(work_dir, f"{name}_fill.npy"), mode="w+", dtype=np.int64,
+                                     shape=(num_keys,))
+    fill[:] = indptr[:-1]
+    for start in range(0, m, chunksize):
+        chunk = np.asarray(keys[start:start + chunksize])
+        by_key = np.argsort(chunk, kind="stable")
+        sorted_keys = chunk[by_key]
+        values, first, counts = np.unique(sorted_keys, return_index=True, return_counts=True)
+        within = np.arange(len(chunk)) - np.repeat(first, counts)
+        order[fill[sorted_keys] + within] = start + by_key
+        fill[values] += counts
+    del fill
+    os.remove(os.path.join(work_dir, f"{name}_fill.npy"))
+    order.flush()
+    indptr.flush()
+    return order, indptr
+
+
+def assign_partitions(modules, num_modules, max_nodes, strategy="module", work_dir=None, chunksize=1 << 18):
+    """
+    (order, bounds): partition k is order[bounds[k]:bounds[k + 1]], at most
+    max_nodes node ids. `modules` holds module codes ranked by module path.
+    """
+    n = len(modules)
+    if strategy == "range":
+        return np.arange(n), list(range(0, n, max_nodes)) + [n]
+    order, indptr = _counting_sort(modules, num_modules, work_dir, "module", chunksize)
+    bounds, filled = [0], 0
+    for size in np.diff(indptr).tolist():
+        if not size:
+            continue
+        if filled and filled + size > max_nodes:
+            bounds.append(bounds[-1] + filled)
+            filled = 0
+        while size:
+            if filled == max_nodes:
+                bounds.append(bounds[-1] + filled)
+                filled = 0
+            take = min(size, max_nodes - filled)
+            filled += take
+            size -= take
+    if filled:
+        bounds.append(bounds[-1] + filled)
+    return order, bounds
+
+
+def _received(nodes, order, indptr):
+    # Indices of the edges received by `nodes`.
+    nodes = nodes[nodes < len(indptr) - 1]
+    starts, ends = indptr[nodes], indptr[nodes + 1]
+    counts = ends - starts
+    if not counts.sum():
+        return np.empty(0, dtype=np.int64)
+    offsets = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+    return np.asarray(order[offsets])
+
+
+def prepare_partitions(node_file, edge_file, part_dir, max_nodes=100000, strategy="module", chunksize=1 << 18):
+    """
+    Write part_dir/part_<k>.npz for every partition plus part_dir/meta.json.
+    """
+    os.makedirs(part_dir, exist_ok=True)
+    features, edges, modules, num_modules = _load_arrays(node_file, edge_file, part_dir, chunksize)
+    # Edges grouped by receiver (edges[0]).
+    order, indptr = _counting_sort(edges[0], len(features), part_dir, "receiver", chunksize)
+    weight = 1.0 / max(edges.shape[1], 1)
+    node_order, bounds = assign_partitions(modules, num_modules, max_nodes, strategy, part_dir, chunksize)
+
+    sizes = []
+    for k in range(len(bounds) - 1):
+        core = np.sort(node_order[bounds[k]:bounds[k + 1]])
+        e1 = _received(core, order, indptr)
+        hop1 = np.setdiff1d(edges[1][e1], core)
+        e2 = _received(hop1, order, indptr)
+        hop2 = np.setdiff1d(edges[1][e2], np.union1d(core, hop1))
+        nodes = np.concatenate([core, hop1, hop2])
+        part_edges = np.concatenate([e1, e2])
+        by_id = np.argsort(nodes)
+        local = by_id[np.searchsorted(nodes, edges[:, part_edges], sorter=by_id)]
+        np.savez(os.path.join(part_dir, f"part_{k}.npz"), nodes=nodes, num_core=len(core),
+                 features=features[nodes], edges=local,
+                 edge_weights=np.full(len(part_edges), weight, dtype=np.float32))
+        sizes.append(len(nodes))
+
+    meta = {"nodes": len(features), "edges": int(edges.shape[1]), "partitions": len(bounds) - 1,
+            "max_nodes": max_nodes, "strategy": strategy, "max_partition_nodes": max(sizes, default=0),
+            "halo_nodes": int(sum(sizes) - len(features))}
+    with open(os.path.join(part_dir, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    del features, edges, modules, order, indptr, node_order
+    for name in ("edges.npy", "features.npy", "modules.npy", "receiver_order.npy", "receiver_indptr.npy",
+                 "module_order.npy", "module_indptr.npy"):
+        path = os.path.join(part_dir, name)
+        if os.path.exists(path):
+            os.remove(path)
+    return meta
+
+
+def run_partitions(part_dir, predict):
+    """
+    Stream the partitions through `predict(features, edges, edge_weights)` (already
+    scaled weights) and stitch the core predictions into one array.
+    """
+    with open(os.path.join(part_dir, "meta.json")) as f:
+        meta = json.load(f)
+    probs = np.lib.format.open_memmap(os.path.join(part_dir, "probabilities.npy"), mode="w+",
+                                      dtype=np.float32, shape=(meta["nodes"],))
+    for path in sorted(glob.glob(os.path.join(part_dir, "part_*.npz")),
+                       key=lambda p: int(p.rsplit("_", 1)[1].split(".")[0])):
+        with np.load(path) as part:
+            num_core = int(part["num_core"])
+            p = predict(part["features"], part["edges"], part["edge_weights"])
+            probs[part["nodes"][:num_core]] = p[:num_core]
+    probs.flush()
+    return probs
+
+
+def numpy_predictor(export_file):
+    from Model_Export import NumpyGNN
+    model = NumpyGNN(export_file)
+    return lambda x, edges, weights: model.predict(x, edges, weights, normalize_weights=False)
+
+
+def keras_predictor(weights_file):
+    import contextlib
+    import tensorflow as tf
+    from Model_Export import load_keras_model
+    model = load_keras_model(weights_file)
+
+    def predict(x, edges, weights):
+        model.set_graph((tf.constant(x), edges, tf.constant(weights)), normalize_weights=False)
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            return model(tf.range(len(x)), training=False).numpy().squeeze(-1)
+    return predict
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Partitioned out-of-core GNN inference.")
+    parser.add_argument("node_file")
+    parser.add_argument("edge_file")
+    parser.add_argument("--max-nodes", type=int, default=100000, help="core nodes per partition")
+    parser.add_argument("--strategy", choices=["module", "range"], default="module")
+    parser.add_argument("--part-dir", default=None, help="default: out/partitions/<node file name>")
+    parser.add_argument("--keras", action="store_true", help="run the Keras model instead of the NumPy export")
+    parser.add_argument("--weights", default=os.path.join(OUT_DIR, "gnn_weights.weights.h5"))
+    parser.add_argument("--export", default=os.path.join(OUT_DIR, "gnn_export.npz"),
+                        help="NumPy export (Model_Export.py export)")
+    parser.add_argument("--output", default=None, help="default: <node file>_pred_partitioned.csv")
+    args = parser.parse_args()
+
+    name = os.path.splitext(os.path.basename(args.node_file))[0]
+    part_dir = args.part_dir or os.path.join(OUT_DIR, "partitions", name)
+    start = time.perf_counter()
+    meta = prepare_partitions(args.node_file, args.edge_file, part_dir, args.max_nodes, args.strategy)
+    print(f"[INFO] {meta['nodes']} nodes in {meta['partitions']} partitions (largest {meta['max_partition_nodes']} "
+          f"nodes with halo, {meta['halo_nodes']} halo nodes total) in {time.perf_counter() - start:.2f} s")
+
+    if args.keras:
+        predict = keras_predictor(args.weights)
+    else:
+        from Model_Export import ensure_export
+        predict = numpy_predictor(ensure_export(args.weights, args.export))
+    start = time.perf_counter()
+    probs = run_partitions(part_dir, predict)
+    print(f"[INFO] Scored in {time.perf_counter() - start:.2f} s")
+
+    output = args.output or os.path.splitext(args.node_file)[0] + "_pred_partitioned.csv"
+    import pandas as pd
+    with open(output, "w") as f:
+        f.write("node_number,probability,prediction\n")
+        for chunk in pd.read_csv(args.node_file, usecols=["node_number"], chunksize=1 << 18):
+            for i in chunk["node_number"].to_numpy():
+                f.write(f"{i},{probs[i]},{int(probs[i] >= 0.5)}\n")
+    print(f"[INFO] Predictions written to {output}")
+    shutil.rmtree(part_dir, ignore_errors=True)
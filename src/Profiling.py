@@ -0,0 +1,212 @@
+"""
+Lightweight per-stage instrumentation.
+
+    with Profiling.span("toggles") as sp:
+        ...
+        sp.count(signals=len(signals))
+
+    @Profiling.profiled("read_dot_file")
+    def read_dot_file(...):
+        ...
+        Profiling.current().count(nodes=len(nodes))
+
+Each span records wall time, CPU time, the process peak RSS at its end and any item
+counts (nodes, edges, signals, value changes, ...). Profiling is off unless the
+SCAR_PROFILE (JSON report path) or SCAR_TRACE (Chrome trace path) environment
+variable is set, or `enable()` is called; when off, `span` returns a shared no-op
+object and `profiled` calls straight through.
+"""
+import atexit
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+_report_path = os.environ.get("SCAR_PROFILE")
+_trace_path = os.environ.get("SCAR_TRACE")
+_enabled = bool(_report_path or _trace_path)
+_records = []
+_local = threading.local()
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere.
+    return round(peak / (1 << 20) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def _stack():
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+class _NullSpan:
+    def count(self, **counts):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    def __init__(self, name, counts):
+        self.name = name
+        self.counts = dict(counts)
+
+    def count(self, **counts):
+        for k, v in counts.items():
+            self.counts[k] = self.counts.get(k, 0) + v
+
+    def __enter__(self):
+        stack = _stack()
+        self.parent = stack[-1].name if stack else None
+        self.depth = len(stack)
+        stack.append(self)
+        self._wall = time.perf_counter_ns()
+        self._cpu = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall_ns = time.perf_counter_ns() - self._wall
+        cpu = time.process_time() - self._cpu
+        _stack().pop()
+        _records.append({
+            "name": self.name,
+            "parent": self.parent,
+            "depth": self.depth,
+            "start_us": self._wall // 1000,
+            "wall_seconds": round(wall_ns / 1e9, 6),
+            "cpu_seconds": round(cpu, 6),
+            "peak_rss_mb": _peak_rss_mb(),
+            "counts": self.counts,
+            "error": exc_type.__name__ if exc_type else None,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+        })
+        return False
+
+
+def span(name, **counts):
+    if not _enabled:
+        return _NULL_SPAN
+    return Span(name, counts)
+
+
+def current():
+    """
+    Innermost open span, or a no-op span, so callees can add counts.
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    stack = _stack()
+    return stack[-1] if stack else _NULL_SPAN
+
+
+def profiled(name=None):
+    def decorator(fn):
+        label = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with Span(label, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def records():
+    return list(_records)
+
+
+def extend(more_records):
+    """
+    Merge records collected in another process (e.g. a pool worker).
+    """
+    _records.extend(more_records)
+
+
+def reset():
+    _records.clear()
+
+
+def summarize(recs=None):
+    """
+    Totals per span name: calls, wall/CPU seconds, max peak RSS and summed counts.
+    """
+    totals = {}
+    for r in recs if recs is not None else _records:
+        t = totals.setdefault(r["name"], {"calls": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0,
+                                          "peak_rss_mb": None, "counts": {}})
+        t["calls"] += 1
+        t["wall_seconds"] = round(t["wall_seconds"] + r["wall_seconds"], 6)
+        t["cpu_seconds"] = round(t["cpu_seconds"] + r["cpu_seconds"], 6)
+        if r["peak_rss_mb"] is not None:
+            t["peak_rss_mb"] = max(t["peak_rss_mb"] or 0, r["peak_rss_mb"])
+        for k, v in r["counts"].items():
+            t["counts"][k] = t["counts"].get(k, 0) + v
+    return totals
+
+
+def write_report(path):
+    with open(path, "w") as f:
+        json.dump({"summary": summarize(), "spans": _records}, f, indent=2)
+    print(f"[INFO] Profile written to {path}")
+
+
+def write_chrome_trace(path):
+    """
+    Write spans in the Chrome trace-event format (chrome://tracing, Perfetto).
+    """
+    events = [{
+        "name": r["name"],
+        "ph": "X",
+        "ts": r["start_us"],
+        "dur": int(r["wall_seconds"] * 1e6),
+        "pid": r["pid"],
+        "tid": r["tid"],
+        "args": {"cpu_seconds": r["cpu_seconds"], "peak_rss_mb": r["peak_rss_mb"], **r["counts"]},
+    } for r in _records]
+    with open(path, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+    print(f"[INFO] Chrome trace written to {path}")
+
+
+@atexit.register
+def _write_on_exit():
+    if _records and _report_path:
+        write_report(_report_path)
+    if _records and _trace_path:
+        write_chrome_trace(_trace_path)
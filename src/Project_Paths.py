@@ -0,0 +1,11 @@
+"""
+Absolute locations of the repository directories, for scripts that may be run
+from anywhere.
+"""
+import os
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(SRC_DIR)
+DATA_DIR = os.path.join(ROOT_DIR, "data")
+OUT_DIR = os.path.join(ROOT_DIR, "out")
+TEST_DIR = os.path.join(ROOT_DIR, "test")
@@ -0,0 +1,75 @@
+"""
+Single command line for the SCAR pipeline.
+
+    python SCAR.py --help
+    python SCAR.py extract PRESENT kreg PRESENT
+    python SCAR.py build PRESENT AES_TBL -j 2
+    python SCAR.py train
+    python SCAR.py bench --stages import
+
+Each subcommand runs the `__main__` block of one module with the remaining
+arguments, and that module is only imported once its subcommand is chosen, so
+`--help` loads nothing but this file. The preprocessing commands never import
+TensorFlow, matplotlib, pyverilog or requests; `Benchmark.py --stages import`
+times every entry point in a fresh interpreter and fails when one of them pulls
+in a heavy module or exceeds its import-time budget.
+"""
+import runpy
+import sys
+
+# name -> (module, summary)
+commands = {
+    "extract": ("Feature_Extract", "features and edges CSVs of one design"),
+    "build": ("Build_Datasets", "datasets of many designs in parallel"),
+    "synth": ("Synthetic_Design", "generate a synthetic design for scale testing"),
+    "node-index": ("Node_Index", "query the node label index of a design"),
+    "leakage": ("Leakage_Analysis", "TVLA/CPA statistics over many VCD traces"),
+    "train": ("SCAR_GNN", "train the GNN on ../out and evaluate it on ../test"),
+    "test": ("test", "evaluate the trained GNN on every ../test design"),
+    "lodo": ("Evaluate_LODO", "leave-one-design-out evaluation"),
+    "sweep": ("Hyperparameter_Sweep", "parallel hyperparameter sweep"),
+    "serve": ("Scoring_Service", "warm local scoring service"),
+    "export": ("Model_Export", "export the GNN for TensorFlow-free inference"),
+    "partition": ("Partitioned_Inference", "partitioned out-of-core inference"),
+    "bench": ("Benchmark", "stage throughput and import-time benchmarks"),
+}
+preprocessing_commands = ["extract", "build", "synth", "node-index", "leakage"]
+# Usage of the commands whose module has no argument parser: their --help is
+# answered here, since running the module would start the work itself.
+script_usage = {
+    "extract": "usage: SCAR.py extract <design> <key_register_name> [<test_design>] [--traces=<dir or glob>] "
+               "[--trace-meta=<csv>] [--no-cache] [--incremental]",
+    "train": "usage: SCAR.py train\n\nTrains the GNN on ../out/features.csv and ../out/edges.csv, writes "
+             "../out/gnn_weights.weights.h5 and evaluates it on ../test. Takes no options.",
+    "test": "usage: SCAR.py test\n\nEvaluates ../out/gnn_weights.weights.h5 on every ../test design and writes "
+            "<design>_features.csv_pred.csv next to each. Takes no options.",
+}
+heavy_modules = ["tensorflow", "matplotlib", "pyverilog", "requests", "sklearn"]
+
+
+def usage():
+    lines = ["usage: SCAR.py <command> [args...]", "", "commands:"]
+    lines += [f"  {name:<12} {summary}" for name, (_, summary) in commands.items()]
+    lines += ["", "SCAR.py <command> --help shows the options of a command."]
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ("-h", "--help"):
+        print(usage())
+        return 0
+    if argv[0] not in commands:
+        print(f"Unknown command {argv[0]!r}\n\n{usage()}", file=sys.stderr)
+        return 2
+    if argv[0] in script_usage and any(arg in ("-h", "--help") for arg in argv[1:]):
+        print(script_usage[argv[0]])
+        return 0
+    module = commands[argv[0]][0]
+    sys.argv = [f"{module}.py"] + argv[1:]
+    runpy.run_module(module, run_name="__main__", alter_sys=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
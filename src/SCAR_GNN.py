@@ -2,14 +2,18 @@ from sklearn.model_selection import train_test_split
 
 from GNN import *
 from GraphInformation import *
+import Label_Preprocessing
+import Profiling
+import String_Table
 
 feature_file = "../out/features.csv"
 edge_file = "../out/edges.csv"
 
 nodeset = pd.read_csv(feature_file)
 if not "label" in nodeset.columns:
-    nodeset["label"] = nodeset["node"].str.contains(r"(sbox|mixcolumn)",case=False, na=False).astype(int)
-nodeset.to_csv(feature_file, index=False)
+    text = String_Table.for_node_file(feature_file).names(nodeset["node_number"])
+    nodeset["label"], _ = Label_Preprocessing.engine_for("default").match(text)
+    nodeset.to_csv(feature_file, index=False)
 
 graph_info, feature_names, num_features, num_classes, nodeset = graph_information(feature_file, edge_file)
 
@@ -18,6 +22,12 @@ with open("../out/train_graph_info.pkl", "wb") as f:
     pickle.dump(graph_info, f)
 
 mode_pick_train = 3
+# Set to also train the precomputed-propagation (SGC) model and compare it with the GNN.
+train_sgc = False
+# Designs under ../test packed with the training graph into one block-diagonal
+# graph and trained on together (e.g. ["PRESENT", "AES_TBL"]); empty trains on
+# ../out only.
+extra_train_designs = []
 if mode_pick_train == 1:
     majority = nodeset[nodeset["label"] == 0]
     minority = nodeset[nodeset["label"] == 1]
@@ -73,7 +83,28 @@ y_train1 = y_train.to_numpy().astype("float32")
 y_test1  = y_test.to_numpy().astype("float32")
 
 x_train = train_data.node_number.to_numpy()
-history = run_experiment(gnn_model, x_train, y_train1)
+if extra_train_designs:
+    pairs = [("train", feature_file, edge_file)] + [
+        (d, f"../test/{d}_features.csv", f"../test/{d}_edges.csv") for d in extra_train_designs
+    ]
+    packed_info, _, _, _, packed_nodeset, blocks = pack_designs(pairs, feature_names)
+    train_blocks = [("train", graph_info, x_train, y_train1)]
+    for design in extra_train_designs:
+        rows = packed_nodeset[packed_nodeset["design"] == design]
+        train_blocks.append((design, design_block(packed_info, blocks, design),
+                             rows["local_node_number"].to_numpy(), rows["label"].to_numpy().astype("float32")))
+    history = train_multi_design(gnn_model, train_blocks)
+    for design, block_info, idx, labels in train_blocks:
+        gnn_model.set_graph(block_info)
+        block_acc = np.mean((gnn_model.predict(idx, verbose=0).squeeze(-1) >= 0.5) == labels)
+        print(f"Train accuracy on {design}: {round(block_acc * 100, 2)}%")
+    gnn_model.set_graph(graph_info)
+    gnn_model.compile(
+        loss=keras.losses.BinaryCrossentropy(from_logits=False),
+        metrics=[keras.metrics.BinaryAccuracy(name="acc"), keras.metrics.Precision(), keras.metrics.Recall()],
+    )
+else:
+    history = run_experiment(gnn_model, x_train, y_train1)
 
 x_test = test_data.node_number.to_numpy()
 _, test_accuracy, precision, recall = gnn_model.evaluate(x=x_test, y=y_test1, verbose=0)
@@ -84,6 +115,18 @@ print(f"Test recall: {(recall * 100)}%")
 gnn_model.save_weights("../out/gnn_weights.weights.h5")
 print("Saved:", gnn_model.count_params(), "params")
 
+if train_sgc:
+    # Same split on precomputed [X, AX, A^2X] columns with a plain MLP.
+    propagated = load_propagated_features(feature_file, edge_file, graph_info, feature_names, sgc_hops)
+    sgc_model = create_sgc_model(hidden_units, num_features, sgc_hops, dropout_rate)
+    with Profiling.span("train_sgc"):
+        run_experiment(sgc_model, propagated[x_train], y_train1)
+    _, sgc_accuracy, sgc_precision, sgc_recall = sgc_model.evaluate(x=propagated[x_test], y=y_test1, verbose=0)
+    print(f"SGC test accuracy: {round(sgc_accuracy * 100, 2)}% (GNN: {round(test_accuracy * 100, 2)}%)")
+    print(f"SGC test precision: {(sgc_precision * 100)}%")
+    print(f"SGC test recall: {(sgc_recall * 100)}%")
+    sgc_model.save_weights("../out/sgc_weights.weights.h5")
+
 print("Test model loaded from weights")
 from sklearn.metrics import accuracy_score, f1_score, roc_auc_score
 model = GNNNodeClassifier(
@@ -97,7 +140,8 @@ _ = model.predict(tf.convert_to_tensor([0], dtype=tf.int32))
 model.load_weights("../out/gnn_weights.weights.h5")
 Y = nodeset["label"]
 all_idx = nodeset.node_number
-probs = model.predict(all_idx.to_numpy(dtype="int32"), verbose=0)  # (N,1)
+with Profiling.span("inference", nodes=len(all_idx), edges=graph_info[1].shape[1]):
+    probs = model.predict(all_idx.to_numpy(dtype="int32"), verbose=0)  # (N,1)
 y_pred = (probs.squeeze(-1) >= 0.5).astype(int)
 score_for_pos = probs.squeeze(-1)
 y_true = Y if Y.ndim == 1 else Y.argmax(1)  # 0/1
@@ -0,0 +1,336 @@
+"""
+Warm local scoring service for GNN inference.
+
+    python Scoring_Service.py serve [--port 8765] [--weights ../out/gnn_weights.weights.h5]
+    python Scoring_Service.py score PRESENT AES_TBL   # client: score test/<design> bundles
+    python Scoring_Service.py metrics
+
+The server imports TensorFlow, builds GNNNodeClassifier and loads the weights once,
+then answers on localhost:
+    POST /score    {"node_file": ..., "edge_file": ...}            CSVs readable by the server
+                   {"node_features": [[...], ...], "edges": [[src...], [dst...]]}
+                   optional "node_numbers" or "node_indices" (default: every node)
+                -> {"probabilities": [...], "node_numbers": [...], "node_indices": [...], "latency_ms": ...}
+    GET  /metrics  request/batch counts, latency percentiles, nodes/s
+    GET  /health
+
+Node numbers may have gaps (the ID map is append-only), so the rows of a graph are
+its nodes in node_number order and edges are renumbered to those rows. "node_numbers"
+selects nodes by node_number; "node_indices" selects rows, i.e. ranks by node_number.
+For inline graphs the row is the node_number. Replies carry both for every score.
+
+Concurrent requests are batched: the scorer thread takes every request queued
+within `batch_window` seconds (up to `max_batch_nodes` nodes), packs their graphs
+block-diagonally and runs one forward pass. Each graph keeps its own edge-weight
+scaling, so a batched score equals scoring the graph alone.
+"""
+import argparse
+import json
+import queue
+import sys
+import threading
+import time
+import urllib.request
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from GraphInformation import compact_edges, default_feature_names
+from Project_Paths import OUT_DIR, TEST_DIR
+
+DEFAULT_PORT = 8765
+WEIGHTS_FILE = f"{OUT_DIR}/gnn_weights.weights.h5"
+
+
+def read_bundle(node_file, edge_file):
+    """
+    (node_features, edges, node_numbers) of a feature/edge CSV pair: rows ordered by
+    node_number, edges referring to rows and node_numbers the sorted number of each row.
+    """
+    import pandas as pd
+    nodeset = pd.read_csv(node_file).sort_values("node_number")
+    edges = pd.read_csv(edge_file)[["source", "target"]].to_numpy().T
+    node_numbers = nodeset["node_number"].to_numpy()
+    edges = compact_edges(node_numbers, edges)
+    return nodeset[default_feature_names].to_numpy(dtype="float32"), edges, node_numbers
+
+
+def rows_of_node_numbers(node_numbers, wanted):
+    """
+    Row positions of the `wanted` node_numbers in a graph whose rows are sorted by
+    node_number, or ValueError for numbers the graph does not have.
+    """
+    node_numbers = np.asarray(node_numbers, dtype=np.int64)
+    wanted = np.asarray(wanted, dtype=np.int64)
+    if wanted.ndim != 1:
+        raise ValueError("node_numbers must be a flat list")
+    rows = np.searchsorted(node_numbers, wanted)
+    found = rows < len(node_numbers)
+    found[found] = node_numbers[rows[found]] == wanted[found]
+    if not found.all():
+        raise ValueError(f"unknown node_numbers: {wanted[~found][:10].tolist()}")
+    return rows
+
+
+def validate_job(node_features, edges, node_indices=None):
+    """
+    (node_features, edges, node_indices) as arrays, or ValueError when the graph
+    is malformed: it must have len(default_feature_names) finite features per
+    node, edges as [[src...], [dst...]] and indices inside [0, number of nodes).
+    node_indices are row positions, not node_numbers (see rows_of_node_numbers).
+    Checked before a job is queued, so a bad request never reaches a packed batch.
+    """
+    num_features = len(default_feature_names)
+    node_features = np.asarray(node_features, dtype="float32")
+    if node_features.ndim != 2 or node_features.shape[1] != num_features or not len(node_features):
+        raise ValueError(f"node_features must be a non-empty list of rows of {num_features} features, "
+                         f"got shape {list(node_features.shape)}")
+    if not np.isfinite(node_features).all():
+        raise ValueError("node_features contains NaN or infinite values")
+    n = len(node_features)
+    edges = np.asarray(edges, dtype=np.int64)
+    if edges.size == 0:
+        edges = edges.reshape(2, 0)
+    if edges.ndim != 2 or edges.shape[0] != 2:
+        raise ValueError(f"edges must be [[source...], [target...]], got shape {list(edges.shape)}")
+    if edges.size and (edges.min() < 0 or edges.max() >= n):
+        raise ValueError(f"edge endpoints must be in [0, {n})")
+    node_indices = np.arange(n) if node_indices is None else np.asarray(node_indices, dtype=np.int64)
+    if node_indices.ndim != 1:
+        raise ValueError("node_indices must be a flat list")
+    if node_indices.size and (node_indices.min() < 0 or node_indices.max() >= n):
+        raise ValueError(f"node_indices are row positions (ranks by node_number) and must be in [0, {n}); "
+                         "select by node_number with node_numbers instead")
+    return node_features, edges, node_indices
+
+
+class _Job:
+    def __init__(self, node_features, edges, node_indices):
+        self.node_features = node_features
+        self.edges = edges
+        self.node_indices = node_indices
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class Scorer:
+    def __init__(self, weights_file=WEIGHTS_FILE, batch_window=0.005, max_batch_nodes=1 << 20):
+        import tensorflow as tf
+        import GNN
+        self.tf = tf
+        self.batch_window = batch_window
+        self.max_batch_nodes = max_batch_nodes
+        start = time.perf_counter()
+        dummy = (tf.zeros((1, len(default_feature_names))), np.zeros((2, 1), dtype=np.int64), tf.ones(1))
+        self.model = GNN.GNNNodeClassifier(graph_info=dummy, num_classes=2, hidden_units=GNN.hidden_units,
+                                           dropout_rate=GNN.dropout_rate, name="gnn_model")
+        _ = self.model(tf.convert_to_tensor([0], dtype=tf.int32))
+        self.model.load_weights(weights_file)
+        self.warmup_seconds = time.perf_counter() - start
+
+        self.jobs = queue.Queue()
+        self.started = time.time()
+        self.lock = threading.Lock()
+        self.latencies = deque(maxlen=10000)
+        self.stats = {"requests": 0, "batches": 0, "nodes": 0, "busy_seconds": 0.0, "errors": 0}
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def score(self, node_features, edges, node_indices=None):
+        """
+        Per-node probabilities for one graph; blocks until its batch has run.
+        Raises ValueError (see validate_job) without queuing a malformed graph.
+        """
+        job = _Job(*validate_job(node_features, edges, node_indices))
+        start = time.perf_counter()
+        self.jobs.put(job)
+        job.done.wait()
+        with self.lock:
+            self.latencies.append(time.perf_counter() - start)
+        if job.error is not None:
+            raise job.error
+        return job.result
+
+    def _take_batch(self):
+        batch = [self.jobs.get()]
+        nodes = len(batch[0].node_features)
+        deadline = time.perf_counter() + self.batch_window
+        while nodes < self.max_batch_nodes:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                job = self.jobs.get(timeout=timeout)
+            except queue.Empty:
+                break
+            batch.append(job)
+            nodes += len(job.node_features)
+        return batch
+
+    def _run(self):
+        tf = self.tf
+        while True:
+            batch = self._take_batch()
+            start = time.perf_counter()
+            try:
+                features, edges, weights, indices = [], [], [], []
+                offset = 0
+                for job in batch:
+                    features.append(job.node_features)
+                    edges.append(job.edges + offset)
+                    # Pre-scaled per graph, as set_graph would for the graph alone.
+                    weights.append(np.full(job.edges.shape[1], 1.0 / max(job.edges.shape[1], 1), dtype="float32"))
+                    indices.append(job.node_indices + offset)
+                    offset += len(job.node_features)
+                self.model.set_graph((tf.constant(np.concatenate(features)), np.concatenate(edges, axis=1),
+                                      tf.constant(np.concatenate(weights))), normalize_weights=False)
+                probs = self.model(tf.constant(np.concatenate(indices), dtype=tf.int32), training=False)
+                probs = probs.numpy().squeeze(-1)
+                pos = 0
+                for job in batch:
+                    job.result = probs[pos:pos + len(job.node_indices)]
+                    pos += len(job.node_indices)
+            except Exception as e:
+                for job in batch:
+                    job.error = e
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.stats["batches"] += 1
+                self.stats["requests"] += len(batch)
+                self.stats["nodes"] += sum(len(job.node_indices) for job in batch)
+                self.stats["busy_seconds"] += elapsed
+                self.stats["errors"] += sum(job.error is not None for job in batch)
+            for job in batch:
+                job.done.set()
+
+    def metrics(self):
+        with self.lock:
+            stats = dict(self.stats)
+            latencies = np.array(self.latencies) * 1000
+        busy = stats.pop("busy_seconds")
+        stats.update({
+            "uptime_seconds": round(time.time() - self.started, 3),
+            "warmup_seconds": round(self.warmup_seconds, 3),
+            "mean_batch_requests": round(stats["requests"] / stats["batches"], 2) if stats["batches"] else None,
+            "nodes_per_second": round(stats["nodes"] / busy, 1) if busy else None,
+        })
+        for p in (50, 95, 99):
+            stats[f"latency_p{p}_ms"] = round(float(np.percentile(latencies, p)), 3) if len(latencies) else None
+        return stats
+
+
+def make_handler(scorer):
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, code, body):
+            data = json.dumps(body).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._reply(200, {"status": "ok"})
+            elif self.path == "/metrics":
+                self._reply(200, scorer.metrics())
+            else:
+                self._reply(404, {"error": f"unknown path {self.path}"})
+
+        def do_POST(self):
+            if self.path != "/score":
+                self._reply(404, {"error": f"unknown path {self.path}"})
+                return
+            start = time.perf_counter()
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                if "node_file" in request:
+                    node_features, edges, node_numbers = read_bundle(request["node_file"], request["edge_file"])
+                else:
+                    node_features, edges = request["node_features"], request["edges"]
+                    node_numbers = np.arange(len(node_features))
+                node_indices = request.get("node_indices")
+                if request.get("node_numbers") is not None:
+                    if node_indices is not None:
+                        raise ValueError("give node_numbers or node_indices, not both")
+                    node_indices = rows_of_node_numbers(node_numbers, request["node_numbers"])
+                probs = scorer.score(node_features, edges, node_indices)
+            except (KeyError, TypeError, ValueError, OSError) as e:
+                self._reply(400, {"error": f"{type(e).__name__}: {e}"})
+                return
+            except Exception as e:
+                self._reply(500, {"error": f"{type(e).__name__}: {e}"})
+                return
+            rows = np.arange(len(probs)) if node_indices is None else np.asarray(node_indices, dtype=np.int64)
+            self._reply(200, {
+                "probabilities": probs.tolist(),
+                "node_numbers": np.asarray(node_numbers)[rows].tolist(),
+                "node_indices": rows.tolist(),
+                "latency_ms": round((time.perf_counter() - start) * 1000, 3),
+            })
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(port=DEFAULT_PORT, weights_file=WEIGHTS_FILE, batch_window=0.005):
+    scorer = Scorer(weights_file, batch_window)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(scorer))
+    print(f"[INFO] Model loaded in {scorer.warmup_seconds:.2f} s; serving on http://127.0.0.1:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def _request(url, body=None):
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req) as resp:
+        return json.loads(resp.read())
+
+
+def score_remote(node_file, edge_file, port=DEFAULT_PORT, node_numbers=None):
+    """
+    Client side: ask a running service to score a feature/edge CSV pair, or only its
+    `node_numbers`. The reply lists the node_number of every probability.
+    """
+    import os
+    body = {"node_file": os.path.abspath(node_file), "edge_file": os.path.abspath(edge_file)}
+    if node_numbers is not None:
+        body["node_numbers"] = [int(n) for n in node_numbers]
+    return _request(f"http://127.0.0.1:{port}/score", body)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Warm GNN scoring service.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("serve")
+    p.add_argument("--port", type=int, default=DEFAULT_PORT)
+    p.add_argument("--weights", default=WEIGHTS_FILE)
+    p.add_argument("--batch-window", type=float, default=0.005, help="seconds to wait for more requests")
+    p = sub.add_parser("score")
+    p.add_argument("designs", nargs="+", help="designs with test/<design>_features.csv and _edges.csv")
+    p.add_argument("--port", type=int, default=DEFAULT_PORT)
+    p = sub.add_parser("metrics")
+    p.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        serve(args.port, args.weights, args.batch_window)
+    elif args.command == "score":
+        for design in args.designs:
+            start = time.perf_counter()
+            reply = score_remote(f"{TEST_DIR}/{design}_features.csv", f"{TEST_DIR}/{design}_edges.csv",
+                                 args.port)
+            probs = np.array(reply["probabilities"])
+            print(f"{design}: {len(probs)} nodes, {int((probs >= 0.5).sum())} predicted leaky, "
+                  f"server {reply['latency_ms']} ms, round trip {(time.perf_counter() - start) * 1000:.1f} ms")
+    else:
+        json.dump(_request(f"http://127.0.0.1:{args.port}/metrics"), sys.stdout, indent=2)
+        print()
@@ -0,0 +1,192 @@
+"""
+Interned string table for the text columns of a features CSV.
+
+The node name ("node"), its Verilog statement ("Node") and the rule that labeled
+it ("label_rule") are not model inputs, so feature files keep only numeric
+columns and the text goes to <features csv stem>_text.bin next to them:
+
+    table = String_Table.for_node_file("../test/AES_TBL_features.csv")
+    table.get("Node", 42)           # statement of node_number 42
+    table.values("node")            # every node name, in node_number order
+
+File layout (little endian):
+    b"SCARSTR1", uint32 header length, JSON header {"columns", "rows", "strings"}
+    int32  ids[columns][rows]      string id of every cell
+    int64  offsets[strings + 1]    byte offset of every string in the blob
+    uint8  blob                    UTF-8 strings, each distinct string stored once
+
+Nothing is read until a value is asked for; the arrays are memory-mapped, so
+looking up a few nodes does not load the whole table.
+
+CSVs written before the string table still carry their text columns. They are
+never rewritten on read: their table is built once into the build cache, keyed
+by the CSV's content, and for_node_file returns that one.
+"""
+import json
+import os
+import struct
+
+import numpy as np
+
+import Build_Cache
+from Project_Paths import OUT_DIR
+
+MAGIC = b"SCARSTR1"
+text_columns = ["node", "Node", "label_rule"]
+
+
+def text_path_for(node_file):
+    return os.path.splitext(node_file)[0] + "_text.bin"
+
+
+def write_table(path, columns):
+    """
+    columns: {name: sequence of strings}, all indexed by node_number and of equal
+    length (retired node_numbers get empty strings). Identical strings are
+    interned across rows and columns.
+    """
+    names = list(columns)
+    rows = len(columns[names[0]]) if names else 0
+    interned = {}
+    ids = np.empty((len(names), rows), dtype=np.int32)
+    for c, name in enumerate(names):
+        values = columns[name]
+        if len(values) != rows:
+            raise ValueError(f"Column {name} has {len(values)} rows, expected {rows}")
+        for r, value in enumerate(values):
+            ids[c, r] = interned.setdefault("" if value is None else str(value), len(interned))
+
+    encoded = [s.encode("utf-8") for s in interned]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    header = json.dumps({"columns": names, "rows": rows, "strings": len(encoded)}).encode()
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC + struct.pack("<I", len(header)) + header)
+        f.write(ids.astype("<i4").tobytes())
+        f.write(offsets.astype("<i8").tobytes())
+        f.write(b"".join(encoded))
+    os.replace(tmp, path)
+    return path
+
+
+class StringTable:
+    def __init__(self, path):
+        self.path = path
+        self._ids = None
+
+    def _open(self):
+        if self._ids is not None:
+            return
+        with open(self.path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{self.path} is not a string table")
+            (length,) = struct.unpack("<I", f.read(4))
+            header = json.loads(f.read(length))
+        start = len(MAGIC) + 4 + length
+        self.columns = header["columns"]
+        self.rows = header["rows"]
+        self.num_strings = header["strings"]
+        self._ids = np.memmap(self.path, dtype="<i4", mode="r", offset=start,
+                              shape=(len(self.columns), self.rows)) if self.rows and self.columns else \
+            np.zeros((len(self.columns), self.rows), dtype=np.int32)
+        start += 4 * len(self.columns) * self.rows
+        self._offsets = np.memmap(self.path, dtype="<i8", mode="r", offset=start, shape=(self.num_strings + 1,))
+        start += 8 * (self.num_strings + 1)
+        blob_size = int(self._offsets[-1])
+        self._blob = np.memmap(self.path, dtype=np.uint8, mode="r", offset=start, shape=(blob_size,)) \
+            if blob_size else np.zeros(0, dtype=np.uint8)
+
+    def __len__(self):
+        self._open()
+        return self.rows
+
+    def __contains__(self, column):
+        self._open()
+        return column in self.columns
+
+    def string(self, string_id):
+        self._open()
+        lo, hi = self._offsets[string_id], self._offsets[string_id + 1]
+        return bytes(self._blob[lo:hi]).decode("utf-8")
+
+    def get(self, column, node_number):
+        self._open()
+        return self.string(int(self._ids[self.columns.index(column), node_number]))
+
+    def values(self, column, node_numbers=None):
+        """
+        Strings of `column` for node_numbers (default: every row), decoding each
+        distinct string once.
+        """
+        self._open()
+        ids = np.asarray(self._ids[self.columns.index(column)])
+        if node_numbers is not None:
+            ids = ids[np.asarray(node_numbers, dtype=np.int64)]
+        unique, inverse = np.unique(ids, return_inverse=True)
+        decoded = [self.string(int(i)) for i in unique]
+        return [decoded[i] for i in inverse]
+
+    def names(self, node_numbers=None):
+        """
+        Node names; tables split from older CSVs only have the "Node" statement,
+        which starts with the name.
+        """
+        return self.values("node" if "node" in self else "Node", node_numbers)
+
+
+def _cached_table(node_file, nodeset=None):
+    """
+    Path of the cached table of a CSV that still has its text columns (None if
+    it has none). `nodeset` is the already loaded CSV, if the caller has it.
+    """
+    import pandas as pd
+    header = nodeset.columns if nodeset is not None else pd.read_csv(node_file, nrows=0).columns
+    present = [c for c in text_columns if c in header]
+    if not present:
+        return None
+
+    def build(path):
+        rows = nodeset if nodeset is not None else pd.read_csv(node_file, usecols=["node_number"] + present)
+        numbers = rows["node_number"].to_numpy()
+        columns = {}
+        for c in present:
+            column = np.full(numbers.max() + 1 if len(numbers) else 0, "", dtype=object)
+            column[numbers] = rows[c].fillna("").astype(str).to_numpy()
+            columns[c] = column.tolist()
+        write_table(path, columns)
+
+    cache = Build_Cache.BuildCache(os.path.join(OUT_DIR, "cache"))
+    return cache.cached_file("text_table", cache.key(cache.file_digest(node_file), present), ".bin", build)
+
+
+def for_node_file(node_file):
+    path = text_path_for(node_file)
+    if not os.path.exists(path) and os.path.exists(node_file):
+        path = _cached_table(node_file) or path
+    return StringTable(path)
+
+
+def split_text_columns(nodeset, node_file):
+    """
+    Numeric remainder of `nodeset` (node_file read as a DataFrame). Its text
+    columns stay reachable through for_node_file; node_file is not modified.
+    A nodeset without text columns is returned unchanged.
+    """
+    present = [c for c in text_columns if c in nodeset.columns]
+    if not present:
+        return nodeset
+    if not os.path.exists(text_path_for(node_file)):
+        _cached_table(node_file, nodeset)
+    return nodeset.drop(columns=present)
+
+
+def attach_text(nodeset, node_file, columns=("node", "Node")):
+    """
+    Copy of `nodeset` with the requested text columns looked up by node_number,
+    e.g. for a human-readable prediction report.
+    """
+    table = for_node_file(node_file)
+    numbers = nodeset["node_number"].to_numpy()
+    return nodeset.assign(**{c: table.values(c, numbers) for c in columns if c in table})
@@ -0,0 +1,204 @@
+"""
+Synthetic CDFG + VCD generator for scale testing.
+
+    python Synthetic_Design.py SYN_1M --nodes 1000000 --fanout 2 --cycle-density 0.01
+    python Feature_Extract.py SYN_1M key SYN_1M
+    python Build_Datasets.py SYN_1M --key-register key
+
+Writes data/<name>/<name>.dot (pyverilog dataflow-graph style: "<module>.<n>:AS"
+nodes whose label is the node name plus one Verilog assignment), a matching
+<name>.vcd and <name>_node_matches.csv, so every stage can run on it unchanged.
+
+Shape parameters:
+    nodes          number of CDFG nodes
+    fanout         mean number of forward edges per node (Poisson), drawn
+                   within a local window so paths stay long
+    cycle_density  probability that a node also gets a back edge to an earlier
+                   node, closing a cycle
+    bus_widths     widths the signals are drawn from
+    signals        number of distinct VCD signals the node variables map onto
+    timesteps      length of the trace
+    activity       probability that a signal changes value in a timestep; a
+                   change flips each of its bits with probability 1/2
+All files are written as streams, so memory stays flat up to 10^7 nodes.
+"""
+import argparse
+import csv
+import os
+
+import numpy as np
+
+from Project_Paths import DATA_DIR
+
+_OPS = ["&", "|", "^", "+"]
+_CHUNK = 1 << 16
+
+
+def _vcd_id(i):
+    """Printable VCD identifier code for signal `i` (base 94, chars 33..126)."""
+    code = ""
+    while True:
+        code += chr(33 + i % 94)
+        i //= 94
+        if i == 0:
+            return code
+
+
+def _signal_ref(top, var, width):
+    return f"{top}.{var}[{width - 1}:0]" if width > 1 else f"{top}.{var}"
+
+
+def _operand(var, width, rng_hi, rng_lo):
+    if width == 1:
+        return var, 0, 0
+    hi = max(rng_hi, rng_lo)
+    lo = min(rng_hi, rng_lo)
+    return f"{var}[{hi}:{lo}]", hi, lo
+
+
+def write_dot_and_matches(name, out_dir, nodes, fanout, cycle_density, widths, key_register,
+                          key_width, module_size, top, rng):
+    num_signals = len(widths)
+    window = max(4, int(4 * fanout) + 1)
+    dot_path = os.path.join(out_dir, f"{name}.dot")
+    match_path = os.path.join(out_dir, f"{name}_node_matches.csv")
+    key_ref = _signal_ref(top, key_register, key_width)
+    num_key_nodes = max(1, nodes // 1000)
+    num_edges = 0
+
+    def node_name(i):
+        return f"M{i // module_size}.{i}:AS"
+
+    with open(dot_path, "w") as dot, open(match_path, "w", newline="") as match_file:
+        matches = csv.writer(match_file, quoting=csv.QUOTE_ALL)
+        matches.writerow(["Node", "Matches"])
+        dot.write('strict digraph "" {\n\tnode [label="\\N"];\n')
+        for start in range(0, nodes, _CHUNK):
+            n = min(_CHUNK, nodes - start)
+            ops = rng.integers(0, len(_OPS), n)
+            def_vars = rng.integers(0, num_signals, n)
+            use_vars = rng.integers(0, num_signals, (n, 2))
+            bits = rng.random((n, 6))
+            children = rng.poisson(fanout, n)
+            back = rng.random(n) < cycle_density
+            for j in range(n):
+                i = start + j
+                d, a, b = int(def_vars[j]), int(use_vars[j, 0]), int(use_vars[j, 1])
+                wd, wa, wb = widths[d], widths[a], widths[b]
+                lhs, dhi, dlo = _operand(f"v{d}", wd, int(bits[j, 0] * wd), int(bits[j, 1] * wd))
+                op_a, ahi, alo = _operand(f"v{a}", wa, int(bits[j, 2] * wa), int(bits[j, 3] * wa))
+                mapping = [(_signal_ref(top, f"v{d}", wd), dhi, dlo), (_signal_ref(top, f"v{a}", wa), ahi, alo)]
+                if i < num_key_nodes:
+                    op_b, bhi, blo = _operand(key_register, key_width, int(bits[j, 4] * key_width),
+                                              int(bits[j, 5] * key_width))
+                    mapping.append((key_ref, bhi, blo))
+                    use = [f"v{a}", key_register]
+                else:
+                    op_b, bhi, blo = _operand(f"v{b}", wb, int(bits[j, 4] * wb), int(bits[j, 5] * wb))
+                    mapping.append((_signal_ref(top, f"v{b}", wb), bhi, blo))
+                    use = [f"v{a}", f"v{b}"]
+                label = f"{node_name(i)}\n{lhs} = {op_a} {_OPS[ops[j]]} {op_b};"
+                dot.write(f'\t"{node_name(i)}"\t[def_var="[\'v{d}\']",\n\t\tlabel="{label}",\n'
+                          f'\t\ttyp=Assign,\n\t\tuse_var="{use!r}"];\n')
+                matches.writerow([label, repr(mapping)])
+
+                targets = set()
+                for _ in range(int(children[j])):
+                    t = i + 1 + int(rng.integers(0, window))
+                    if t < nodes:
+                        targets.add(t)
+                if back[j] and i > 0:
+                    targets.add(int(rng.integers(0, i)))
+                for t in sorted(targets):
+                    dot.write(f'\t"{node_name(i)}" -> "{node_name(t)}";\n')
+                num_edges += len(targets)
+        dot.write("}\n")
+    return dot_path, match_path, num_edges
+
+
+def write_vcd(name, out_dir, widths, key_register, key_width, timesteps, activity, top, rng):
+    vcd_path = os.path.join(out_dir, f"{name}.vcd")
+    num_signals = len(widths)
+    key_id = _vcd_id(num_signals)
+    ids = [_vcd_id(i) for i in range(num_signals)]
+    values = [0] * num_signals
+
+    def fmt(value, width, code):
+        if width == 1:
+            return f"{value}{code}\n"
+        return f"b{value:b} {code}\n"
+
+    with open(vcd_path, "w") as f:
+        f.write("$timescale\n\t1ps\n$end\n")
+        f.write(f"$scope module {top} $end\n")
+        for i, w in enumerate(widths):
+            rng_suffix = f" [{w - 1}:0]" if w > 1 else ""
+            f.write(f"$var wire {w} {ids[i]} v{i}{rng_suffix} $end\n")
+        f.write(f"$var reg {key_width} {key_id} {key_register} [{key_width - 1}:0] $end\n")
+        f.write("$upscope $end\n$enddefinitions $end\n#0\n$dumpvars\n")
+        for i, w in enumerate(widths):
+            f.write(fmt(0, w, ids[i]))
+        key = int.from_bytes(rng.bytes((key_width + 7) // 8), "little") & ((1 << key_width) - 1)
+        f.write(fmt(key, key_width, key_id))
+        f.write("$end\n")
+        masks = [(1 << w) - 1 for w in widths]
+        for t in range(1, timesteps + 1):
+            changed = np.flatnonzero(rng.random(num_signals) < activity)
+            if not len(changed):
+                continue
+            f.write(f"#{t * 10}\n")
+            flips = rng.integers(0, 1 << 62, len(changed), dtype=np.int64)
+            for s, flip in zip(changed.tolist(), flips.tolist()):
+                flip &= masks[s]
+                if not flip:
+                    flip = 1
+                values[s] ^= flip
+                f.write(fmt(values[s], widths[s], ids[s]))
+    return vcd_path
+
+
+def generate_design(name, nodes=10000, fanout=2.0, cycle_density=0.01, bus_widths=(1, 8, 32),
+                    signals=None, timesteps=1000, activity=0.1, key_register="key", key_width=128,
+                    module_size=256, out_dir=None, seed=0):
+    """
+    Generate data/<name>/{<name>.dot, <name>.vcd, <name>_node_matches.csv}.
+    Returns the paths written and the number of edges.
+    """
+    out_dir = out_dir or os.path.join(DATA_DIR, name)
+    os.makedirs(out_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    top = f"{name}_TB"
+    signals = signals or min(nodes, 4096)
+    # Signal widths above 62 bits are capped so flips fit one int64 draw.
+    widths = [min(int(w), 62) for w in rng.choice(bus_widths, signals)]
+
+    dot_path, match_path, num_edges = write_dot_and_matches(
+        name, out_dir, nodes, fanout, cycle_density, widths, key_register, key_width, module_size, top, rng
+    )
+    vcd_path = write_vcd(name, out_dir, widths, key_register, key_width, timesteps, activity, top, rng)
+    return {"dot": dot_path, "vcd": vcd_path, "node_matches": match_path, "nodes": nodes, "edges": num_edges}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic CDFG + VCD design for scale testing.")
+    parser.add_argument("name", help="design name; files go to data/<name>/")
+    parser.add_argument("--nodes", type=int, default=10000)
+    parser.add_argument("--fanout", type=float, default=2.0)
+    parser.add_argument("--cycle-density", type=float, default=0.01)
+    parser.add_argument("--bus-widths", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--signals", type=int, default=None, help="distinct VCD signals (default: min(nodes, 4096))")
+    parser.add_argument("--timesteps", type=int, default=1000)
+    parser.add_argument("--activity", type=float, default=0.1)
+    parser.add_argument("--key-register", default="key")
+    parser.add_argument("--module-size", type=int, default=256, help="nodes per module M<k>")
+    parser.add_argument("--out-dir", default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    info = generate_design(args.name, args.nodes, args.fanout, args.cycle_density, args.bus_widths,
+                           args.signals, args.timesteps, args.activity, args.key_register,
+                           module_size=args.module_size, out_dir=args.out_dir, seed=args.seed)
+    print(f"[INFO] {info['nodes']} nodes, {info['edges']} edges")
+    for kind in ("dot", "vcd", "node_matches"):
+        print(f"[INFO] {kind} written to {info[kind]}")
+    print(f"Run: python Feature_Extract.py {args.name} {args.key_register} {args.name}")
@@ -1,14 +1,15 @@
+from __future__ import annotations
+
 import json
 import sys
 from typing import List, Tuple, Dict, Optional, Any
 import os, re
 import csv
-import pickle
-import requests
 
-from pyverilog.vparser.parser import parse
-from pyverilog.vparser import ast as vast
-from vcdvcd import VCDVCD
+import Vcd_Index
+
+# pyverilog (and requests, for the LLM scorer) are imported where they are used:
+# loading pyverilog's parser dominates the import time of this module.
 
 ollama_url = "http://98.225.176.62:11434/api/chat"
 model_name = "gemma3:12b"  # As specified
@@ -19,7 +20,8 @@ class ManualASTVisitor:
     A manual AST visitor that tracks module scope to produce 'module.variable' names.
     """
 
-    def __init__(self):
+    def __init__(self, vast):
+        self.vast = vast  # pyverilog.vparser.ast, imported by the caller that starts the walk
         self.signals: Dict[str, Optional[int]] = {}
         self.current_module: Optional[str] = None  # State to track the current module
 
@@ -29,6 +31,7 @@ class ManualASTVisitor:
         """
         if node is None:
             return
+        vast = self.vast
 
         # --- Dispatcher: Act on specific node types ---
         node_type = type(node)
@@ -77,9 +80,11 @@ class ManualASTVisitor:
 
 # ---------- Build HDL name->width from Verilog (PyVerilog) ----------
 def _hdl_name_widths(verilog_files: List[str]) -> List[Tuple[str, Optional[int]]]:
+    from pyverilog.vparser import ast as vast
+    from pyverilog.vparser.parser import parse
     try:
         ast, _ = parse(verilog_files, debug=False)
-        visitor = ManualASTVisitor()
+        visitor = ManualASTVisitor(vast)
         visitor.visit(ast)
         results = sorted(list(visitor.signals.items()))
         return results
@@ -89,18 +94,8 @@ def _hdl_name_widths(verilog_files: List[str]) -> List[Tuple[str, Optional[int]]
 
 # ---------- Build VCD index ----------
 def _load_vcd_index(vcd_path: str):
-    vcd = VCDVCD(vcd_path, store_tvs=True)
-    widths: Dict[str, Optional[int]] = {}
-    for full in vcd.signals:
-        sig = vcd[full]
-        w = getattr(sig, "size", None)
-        if w is None:
-            try:
-                ref = sig.references[0]
-                w = vcd.data[ref]["nets"][0].get("size", None)
-            except Exception:
-                w = None
-        widths[full] = int(w) if w is not None else None
+    vcd = Vcd_Index.open_vcd_index(vcd_path)
+    widths: Dict[str, Optional[int]] = vcd.widths()
     return vcd, list(vcd.signals), widths
 
 # --- HELPER FUNCTIONS FOR MATCHING ---
@@ -195,13 +190,13 @@ def _prepare_data(
 
     This function handles:
     1. Parsing Verilog to get HDL signals.
-    2. Caching the VCD parsing results to avoid reprocessing large files.
+    2. Reading VCD signal names and widths from the VCD index, building it on first use.
     3. Pre-processing the VCD data into an efficient lookup map.
 
     Args:
         verilog_files: List of paths to Verilog source files.
         vcd_path: Path to the VCD trace file.
-        design_name: A unique name for the design, used for caching.
+        design_name: A unique name for the design.
 
     Returns:
         A tuple containing (hdl_kws, vcd_candidates_map), or (None, None) on failure.
@@ -214,38 +209,12 @@ def _prepare_data(
         print(f"FATAL: Error parsing Verilog files. Aborting. Error: {e}")
         return None, None
 
-    # 2. Load or parse VCD signals, using a cache
-    output_dir = '../out'
-    signals_cache_path = os.path.join(output_dir, f'{design_name}_vcd_signals.pkl')
-    widths_cache_path = os.path.join(output_dir, f'{design_name}_vcd_widths.pkl')
-
-    vcd_signals, vcd_widths = None, None
+    # 2. Load VCD signals and widths from the on-disk index (header only)
     try:
-        if os.path.exists(signals_cache_path) and os.path.exists(widths_cache_path):
-            print(f"Loading VCD index from cache: {signals_cache_path}")
-            with open(signals_cache_path, 'rb') as f:
-                vcd_signals = pickle.load(f)
-            with open(widths_cache_path, 'rb') as f:
-                vcd_widths = pickle.load(f)
+        _, vcd_signals, vcd_widths = _load_vcd_index(vcd_path)
     except Exception as e:
-        print(f"Warning: Could not load VCD data from cache, will re-parse. Error: {e}")
-        vcd_signals, vcd_widths = None, None
-
-    if vcd_signals is None or vcd_widths is None:
-        print(f"Parsing VCD file (cache not found or failed to load): {vcd_path}")
-        try:
-            _, vcd_signals, vcd_widths = _load_vcd_index(vcd_path)
-
-            os.makedirs(output_dir, exist_ok=True)
-            print(f"Saving VCD index to cache for future runs...")
-            with open(signals_cache_path, 'wb') as f:
-                pickle.dump(vcd_signals, f)
-            with open(widths_cache_path, 'wb') as f:
-                pickle.dump(vcd_widths, f)
-            print("Cache saved successfully.")
-        except Exception as e:
-            print(f"FATAL: Error loading VCD file {vcd_path}. Aborting. Error: {e}")
-            return None, None
+        print(f"FATAL: Error loading VCD file {vcd_path}. Aborting. Error: {e}")
+        return None, None
 
     print(f"Loaded {len(vcd_signals)} signals from VCD index.")
 
@@ -286,7 +255,7 @@ def extract_signals_with_pyverilog(
     triples: List[Tuple[str, Optional[int], Optional[str]]] = []
 
     if not os.path.exists(tuple_file_path):
-        input(f"For {design_name}, vcd data preparation is done. Please make the tuple file.")
+        print(f"For {design_name}, vcd data preparation is done. Please make the tuple file.")
         print(f"Error: Mapping file not found at '{tuple_file_path}'.")
         # Return the original HDL keys with no matches
         return [(key, width, None) for key, width in hdl_kws]
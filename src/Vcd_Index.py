@@ -0,0 +1,439 @@
+"""
+Indexed, lazily-loaded store for VCD value changes.
+
+An index file has the layout
+
+    magic (8 bytes) | header length (u64) | JSON header | data region
+
+The JSON header holds the source stamp of the trace (name, size, mtime), the
+timescale, the signal list in definition order, the reference -> identifier code
+table and, per identifier code, its width and the offsets of its value-change
+arrays inside the data region. `open_vcd_index` rebuilds an index whose stamp no
+longer matches its trace, e.g. after X.vcd was regenerated or replaced by
+X.vcd.gz (both share X_vcd.idx). Opening an index only
+reads the header; the data region is mmap'ed on first access so that reading a
+handful of signals never touches the rest of the trace.
+
+Per identifier code the data region stores
+    times   uint32/int64[n]     time of every value change (uint32 whenever the
+                                trace ends before 2**32)
+    offsets uint32/uint64[n+1]  offsets of every value inside `values` (omitted
+                                when every value is a single character)
+    values  bytes               concatenated value strings as they appear in
+                                the VCD ("0", "x", "10110", ...)
+
+Traces may be plain `.vcd` files or `.vcd.gz` / `.vcd.xz` / `.vcd.zst`; compressed
+traces are decoded as a stream with bounded buffers while the index is built and
+are never written to disk decompressed.
+
+`VcdIndex` mimics the parts of `vcdvcd.VCDVCD` that the pipeline uses
+(`signals`, `vcd[ref].size`, `vcd[ref].tv`, `references_to_ids`), so it can be
+passed anywhere a VCDVCD object was passed before.
+"""
+import gzip
+import io
+import json
+import lzma
+import mmap
+import os
+import struct
+from array import array
+from typing import Dict, List, Optional
+
+import numpy as np
+
+import Profiling
+
+_MAGIC = b"SCARVCD1"
+_PREAMBLE = struct.Struct("<8sQ")
+_VALUE = set("01xXzZ")
+_VECTOR_VALUE_CHANGE = set("bBrR")
+_COMPRESSED_SUFFIXES = (".gz", ".xz", ".zst")
+_STREAM_BUFFER = 1 << 20
+
+
+def index_path_for(vcd_path: str) -> str:
+    """
+    Default index location next to a trace, e.g. ../data/X/X.vcd(.gz) -> ../data/X/X_vcd.idx
+    """
+    base = vcd_path
+    for suffix in _COMPRESSED_SUFFIXES:
+        if base.endswith(suffix):
+            base = base[:-len(suffix)]
+            break
+    if base.endswith(".vcd"):
+        base = base[:-len(".vcd")]
+    return base + "_vcd.idx"
+
+
+def resolve_vcd_path(vcd_path: str) -> str:
+    """
+    Return `vcd_path` if it exists, otherwise the first existing compressed variant
+    (`.gz`, `.xz`, `.zst`). Falls back to `vcd_path` so callers report the usual error.
+    """
+    if os.path.exists(vcd_path):
+        return vcd_path
+    for suffix in _COMPRESSED_SUFFIXES:
+        if os.path.exists(vcd_path + suffix):
+            return vcd_path + suffix
+    return vcd_path
+
+
+def source_stamp(vcd_path: str) -> Dict:
+    """
+    File name, size and modification time of a trace, stored in its index so a
+    regenerated or recompressed trace is noticed.
+    """
+    st = os.stat(vcd_path)
+    return {"name": os.path.basename(vcd_path), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def open_vcd_text(vcd_path: str, buffer_size: int = _STREAM_BUFFER):
+    """
+    Open a plain or compressed trace as a text stream.
+
+    Compressed traces are decoded incrementally, holding at most `buffer_size`
+    bytes of compressed and decoded data at a time.
+    """
+    if vcd_path.endswith(".gz"):
+        raw = gzip.open(vcd_path, "rb")
+    elif vcd_path.endswith(".xz"):
+        raw = lzma.open(vcd_path, "rb")
+    elif vcd_path.endswith(".zst"):
+        try:
+            import zstandard
+        except ImportError as e:
+            raise ImportError("Reading .vcd.zst traces requires the 'zstandard' package.") from e
+        raw = zstandard.ZstdDecompressor().stream_reader(
+            open(vcd_path, "rb"), read_size=buffer_size, closefd=True
+        )
+    else:
+        return open(vcd_path, "r", buffering=buffer_size)
+    return io.TextIOWrapper(io.BufferedReader(raw, buffer_size), encoding="utf-8")
+
+
+class _SignalBuffer:
+    """Value changes of one identifier code, accumulated while parsing."""
+
+    def __init__(self, size, var_type):
+        self.size = size
+        self.var_type = var_type
+        self.times = array("q")
+        self.ends = array("Q")
+        self.values = bytearray()
+        self.single_char = True
+
+    def append(self, time, value):
+        self.times.append(time)
+        self.values += value.encode("ascii")
+        self.ends.append(len(self.values))
+        if len(value) != 1:
+            self.single_char = False
+
+
+def parse_vcd_stream(vcd_file, only_sigs=False):
+    """
+    Parse a VCD text stream line by line, keeping only compact per-signal arrays.
+    With `only_sigs`, stop after the definitions section.
+
+    Follows the conventions of vcdvcd.VCDVCD: references are the dot-joined scope
+    path plus the variable name (including its bit range), vector values are stored
+    without their leading 'b', and scalar changes may share a line with '#time'.
+
+    Returns:
+        A dict with the header fields and {identifier code: _SignalBuffer}.
+    """
+    hier = []
+    signals: List[str] = []
+    refs: Dict[str, str] = {}
+    data: Dict[str, _SignalBuffer] = {}
+    timescale = ""
+    time = 0
+    begintime = None
+    endtime = 0
+
+    def add_change(value, identifier_code):
+        buf = data.get(identifier_code)
+        if buf is not None:
+            buf.append(time, value)
+
+    while True:
+        line = vcd_file.readline()
+        if line == "":
+            break
+        line0 = line[0]
+        line = line.strip()
+        if line == "":
+            continue
+        if line0 == "#":
+            parts = line.split()
+            time = int(parts[0][1:])
+            if begintime is None:
+                begintime = time
+            endtime = time
+            for change in parts[1:]:
+                if change[0] in _VALUE:
+                    add_change(change[0], change[1:])
+                elif change[0] in _VECTOR_VALUE_CHANGE:
+                    raise ValueError("Vector value changes have to be on a separate line!")
+        elif line0 in _VECTOR_VALUE_CHANGE:
+            value, identifier_code = line[1:].split()
+            add_change(value, identifier_code)
+        elif line0 in _VALUE:
+            add_change(line[0], line[1:])
+        elif "$enddefinitions" in line:
+            if only_sigs:
+                break
+        elif "$scope" in line:
+            hier.append(line.split()[2])
+        elif "$upscope" in line:
+            hier.pop()
+        elif "$var" in line:
+            ls = line.split()
+            var_type, size, identifier_code = ls[1], int(ls[2]), ls[3]
+            name = "".join(ls[4:-1])
+            reference = ".".join(hier + [name])
+            signals.append(reference)
+            refs[reference] = identifier_code
+            if identifier_code not in data:
+                data[identifier_code] = _SignalBuffer(size, var_type)
+        elif "$timescale" in line:
+            while "$end" not in line:
+                line += " " + vcd_file.readline().strip()
+            timescale = " ".join(line.split()[1:-1])
+        elif "$comment" in line:
+            while "$end" not in line:
+                line = vcd_file.readline()
+                if line == "":
+                    break
+
+    return {
+        "timescale": timescale,
+        "begintime": begintime or 0,
+        "endtime": endtime,
+        "signals": signals,
+        "references_to_ids": refs,
+        "data": data,
+    }
+
+
+def write_vcd_index(parsed, index_path: str, source: Optional[Dict] = None):
+    """
+    Serialize the output of `parse_vcd_stream` into an index file. `source` is
+    the source_stamp of the trace it was parsed from.
+    """
+    ids = {}
+    chunks = []
+    t_dtype = "<u4" if 0 <= parsed["endtime"] < 2 ** 32 else "<i8"
+    offset = 0
+
+    def push(raw):
+        nonlocal offset
+        start = offset
+        chunks.append(raw)
+        offset += len(raw)
+        pad = (-offset) % 8
+        if pad:
+            chunks.append(b"\0" * pad)
+            offset += pad
+        return start
+
+    for identifier_code, buf in parsed["data"].items():
+        n = len(buf.times)
+        t_off = push(np.frombuffer(buf.times, dtype="<i8").astype(t_dtype).tobytes()) if n else 0
+        if buf.single_char or not n:
+            o_off, o_dtype = -1, ""
+        else:
+            o_dtype = "<u4" if len(buf.values) < 2 ** 32 else "<u8"
+            ends = np.frombuffer(buf.ends, dtype="<u8")
+            o_off = push(np.concatenate(([0], ends)).astype(o_dtype).tobytes())
+        v_off = push(bytes(buf.values)) if n else 0
+        ids[identifier_code] = [buf.size, buf.var_type, n, t_off, o_off, o_dtype, v_off, len(buf.values)]
+
+    header = json.dumps({
+        "version": 1,
+        "source": source,
+        "timescale": parsed["timescale"],
+        "begintime": parsed["begintime"],
+        "endtime": parsed["endtime"],
+        "time_dtype": t_dtype,
+        "signals": parsed["signals"],
+        "references_to_ids": parsed["references_to_ids"],
+        "ids": ids,
+    }).encode("utf-8")
+    header += b" " * ((-len(header)) % 8)
+
+    tmp_path = index_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_PREAMBLE.pack(_MAGIC, len(header)))
+        f.write(header)
+        for raw in chunks:
+            f.write(raw)
+    os.replace(tmp_path, index_path)
+
+
+@Profiling.profiled("build_vcd_index")
+def build_vcd_index(vcd_path: str, index_path: Optional[str] = None) -> str:
+    """
+    Parse a (possibly compressed) VCD trace once and write its index. Returns the index path.
+    """
+    index_path = index_path or index_path_for(vcd_path)
+    with open_vcd_text(vcd_path) as f:
+        parsed = parse_vcd_stream(f)
+    Profiling.current().count(
+        signals=len(parsed["signals"]),
+        value_changes=sum(len(buf.times) for buf in parsed["data"].values()),
+    )
+    write_vcd_index(parsed, index_path, source_stamp(vcd_path))
+    return index_path
+
+
+class IndexedSignal:
+    """
+    Value changes of one identifier code, read on demand from the mmap'ed store.
+    """
+
+    def __init__(self, index, identifier_code, entry):
+        size, var_type, n, t_off, o_off, o_dtype, v_off, v_len = entry
+        self._index = index
+        self.size = size
+        self.var_type = var_type
+        self.references = index._references_by_id().get(identifier_code, [])
+        self.endtime = index.endtime
+        self._n = n
+        self._t_off = t_off
+        self._o_off = o_off
+        self._o_dtype = o_dtype
+        self._v_off = v_off
+        self._v_len = v_len
+
+    def __len__(self):
+        return self._n
+
+    @property
+    def times(self) -> np.ndarray:
+        """Times of every value change, as a read-only view into the store."""
+        if not self._n:
+            return np.empty(0, dtype=self._index.time_dtype)
+        return self._index._array(self._index.time_dtype, self._t_off, self._n)
+
+    @property
+    def raw_values(self) -> memoryview:
+        """Concatenated value bytes, as a read-only view into the store."""
+        return self._index._bytes(self._v_off, self._v_len)
+
+    @property
+    def values(self) -> List[str]:
+        raw = bytes(self.raw_values)
+        if self._o_off < 0:
+            return list(raw.decode("ascii"))
+        offsets = self._index._array(self._o_dtype, self._o_off, self._n + 1).tolist()
+        return [raw[offsets[i]:offsets[i + 1]].decode("ascii") for i in range(self._n)]
+
+    @property
+    def tv(self):
+        """(time, value) pairs, in the same form as vcdvcd.Signal.tv."""
+        return list(zip(self.times.tolist(), self.values))
+
+
+class VcdIndex:
+    """
+    Read-only view of an index file written by `write_vcd_index`.
+    """
+
+    def __init__(self, index_path: str):
+        self.path = index_path
+        self._file = open(index_path, "rb")
+        magic, header_len = _PREAMBLE.unpack(self._file.read(_PREAMBLE.size))
+        if magic != _MAGIC:
+            self._file.close()
+            raise ValueError(f"{index_path} is not a VCD index file")
+        header = json.loads(self._file.read(header_len))
+        self._data_start = _PREAMBLE.size + header_len
+        self._mmap = None
+
+        self.source = header.get("source")
+        self.timescale = header["timescale"]
+        self.begintime = header["begintime"]
+        self.endtime = header["endtime"]
+        self.time_dtype = header["time_dtype"]
+        self.signals: List[str] = header["signals"]
+        self.references_to_ids: Dict[str, str] = header["references_to_ids"]
+        self._ids = header["ids"]
+        self._refs_by_id = None
+        self.data: Dict[str, IndexedSignal] = {}
+
+    def _buffer(self):
+        if self._mmap is None:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mmap
+
+    def _array(self, dtype, offset, count):
+        return np.frombuffer(self._buffer(), dtype=dtype, count=count, offset=self._data_start + offset)
+
+    def _bytes(self, offset, length):
+        start = self._data_start + offset
+        return memoryview(self._buffer())[start:start + length]
+
+    def _references_by_id(self):
+        if self._refs_by_id is None:
+            self._refs_by_id = {}
+            for ref in self.signals:
+                self._refs_by_id.setdefault(self.references_to_ids[ref], []).append(ref)
+        return self._refs_by_id
+
+    def signal_by_id(self, identifier_code: str) -> IndexedSignal:
+        sig = self.data.get(identifier_code)
+        if sig is None:
+            sig = IndexedSignal(self, identifier_code, self._ids[identifier_code])
+            self.data[identifier_code] = sig
+        return sig
+
+    def __getitem__(self, refname: str) -> IndexedSignal:
+        return self.signal_by_id(self.references_to_ids[refname])
+
+    def __contains__(self, refname):
+        return refname in self.references_to_ids
+
+    def widths(self) -> Dict[str, int]:
+        """Reference -> declared bit width, read from the header only."""
+        return {ref: self._ids[i][0] for ref, i in self.references_to_ids.items()}
+
+    def close(self):
+        self.data.clear()
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # Arrays handed out by `times` still view the map; it is
+                # released once they are garbage collected.
+                pass
+            self._mmap = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_vcd_index(vcd_path: str, index_path: Optional[str] = None) -> VcdIndex:
+    """
+    Open the index of a (possibly compressed) trace, building it first if it does
+    not exist yet or was built from another version of the trace (its source
+    stamp differs).
+    """
+    vcd_path = resolve_vcd_path(vcd_path)
+    index_path = index_path or index_path_for(vcd_path)
+    if os.path.exists(index_path):
+        vcd = VcdIndex(index_path)
+        if not os.path.exists(vcd_path) or vcd.source == source_stamp(vcd_path):
+            print(f"Loading VCD index from: {index_path}")
+            return vcd
+        vcd.close()
+        print(f"VCD index {index_path} is out of date for {vcd_path}")
+    print(f"Indexing VCD file: {vcd_path} (this may take a while)...")
+    build_vcd_index(vcd_path, index_path)
+    print(f"Saved VCD index to: {index_path}")
+    return VcdIndex(index_path)
@@ -1,15 +1,21 @@
 import ast
+import glob
 import re
+from concurrent.futures import ProcessPoolExecutor
 from typing import Dict, Any, List, Tuple, Optional
 from collections import defaultdict
 import os
-import pydot
 import csv
-import requests
 import json
 import re
-from vcdvcd import VCDVCD
+import sys
 
+import numpy as np
+
+import Build_Cache
+import Profiling
+import Vcd_Index
+from Project_Paths import OUT_DIR
 from V_Preprocessing import _normalize_module_path_part, _normalize_variable_name, _get_vcd_parts
 
 
@@ -33,24 +39,56 @@ def bit_toggles_per_signal(tv, width):
     """
     Calculate how many times each bit has been toggled.
     """
+    return signal_statistics([t for t, _ in tv], [v for _, v in tv], width, with_times=False)[0]
+
+
+signal_feature_names = ['Hamming weight', 'Duty cycle', 'X/Z time']
+_STATS_CHUNK = 1 << 16
+
+
+def signal_statistics(times, values, width, endtime=None, with_times=True):
+    """
+    Statistics of one signal from a single pass over its value changes:
+        toggles    per-bit toggle counts (a change to or from X/Z toggles nothing)
+        high_time  per-bit time spent at 1
+        xz_time    time spent at a value with X/Z bits
+        duration   time from the first change to `endtime` (default the last change)
+    Per-bit lists are most significant bit first. Changes are decoded in chunks
+    into a bit matrix, so memory stays bounded for long traces. Without
+    `with_times` only the toggles are computed and the rest is None.
+    """
+    toggles = np.zeros(width, dtype=np.int64)
+    high_time = np.zeros(width, dtype=np.int64)
+    if not len(values):
+        return (toggles.tolist(), high_time.tolist(), 0, 0) if with_times else (toggles.tolist(), None, None, None)
+    if with_times:
+        times = np.asarray(times, dtype=np.int64)
+        end = int(times[-1]) if endtime is None else max(int(endtime), int(times[-1]))
+        durations = np.diff(times, append=end)
+    xz_time = 0
     prev = None
-    toggles = [0] * width
-    for t, v in tv:
-        bs = norm_bits(v, width)
-        if bs is None:
+    for start in range(0, len(values), _STATS_CHUNK):
+        normalized = [norm_bits(v, width) for v in values[start:start + _STATS_CHUNK]]
+        valid = np.array([bs is not None for bs in normalized])
+        if with_times:
+            d = durations[start:start + len(normalized)]
+            xz_time += int(d[~valid].sum())
+        rows = np.flatnonzero(valid)
+        if not len(rows):
             prev = None
             continue
-        if prev is not None:
-            m = max(len(prev), len(bs))
-            a = prev.zfill(m)
-            b = bs.zfill(m)
-            a = a[-width:]
-            b = b[-width:]
-            for i, (x, y) in enumerate(zip(a, b)):
-                if x != y:
-                    toggles[i] += 1
-        prev = bs
-    return toggles
+        bits = np.frombuffer("".join(normalized[i][-width:] for i in rows).encode("ascii"),
+                             dtype=np.uint8).reshape(-1, width) == ord("1")
+        if with_times:
+            high_time += d[rows] @ bits
+        flips = bits[1:] != bits[:-1]
+        toggles += flips[np.diff(rows) == 1].sum(axis=0)
+        if prev is not None and valid[0]:
+            toggles += prev != bits[0]
+        prev = bits[-1] if valid[-1] else None
+    if not with_times:
+        return toggles.tolist(), None, None, None
+    return toggles.tolist(), high_time.tolist(), xz_time, end - int(times[0])
 
 
 def _parse_node_string_for_llm(node_str: str) -> tuple[str, str]:
@@ -128,6 +166,7 @@ def get_mapping_for_node_with_llm(node_line: str, all_vcd_signals_str: str) -> T
     }
 
     # --- 2. Call the API and Parse the Response ---
+    import requests
     try:
         response = requests.post(ollama_url, json=payload, timeout=120)  # Generous 2-minute timeout
         response.raise_for_status()
@@ -158,56 +197,227 @@ def get_mapping_for_node_with_llm(node_line: str, all_vcd_signals_str: str) -> T
         print(f"Error parsing LLM JSON response for node '{node_line}'. Error: {e}")
         return (node_line, [])
 
-def extract_vcd_features(Feature, node_attrs, vcd, design_name, mode="test"):
+@Profiling.profiled("compute_bit_toggles")
+def compute_bit_toggles(vcd):
+    """
+    Per-bit toggle counts and widths for every signal of a VCD object; the
+    time-based statistics are skipped.
+    """
+    per_bit_toggles, widths, _ = compute_signal_stats(vcd, with_times=False)
+    return per_bit_toggles, widths
+
+
+@Profiling.profiled("compute_signal_stats")
+def compute_signal_stats(vcd, with_times=True):
+    """
+    Per-bit toggle counts, widths and signal_statistics of every signal of a VCD
+    object, in one pass over each signal's value changes.
+
+    Returns:
+        (per_bit_toggles, widths, signal_stats); signal_stats maps a signal to
+        (high_time per bit, xz_time, duration), or is None without `with_times`.
+    """
     per_bit_toggles = {}
     widths = {}
+    signal_stats = {} if with_times else None
+    endtime = getattr(vcd, "endtime", None)
+    for sig_key in vcd.signals:
+        sig = vcd[sig_key]
+        width = getattr(sig, "size", None)
+        if width is None:
+            try:
+                ref = sig.references[0]
+                width = vcd.data[ref]["nets"][0].get("size", 1)
+            except Exception:
+                width = 1
+        width = int(width) if width else 1
+        widths[sig_key] = width
+        if hasattr(sig, "times"):
+            times, values = sig.times, sig.values
+        else:
+            tv = sig.tv
+            times, values = [t for t, _ in tv], [v for _, v in tv]
+        toggles, high_time, xz_time, duration = signal_statistics(times, values, width, endtime, with_times)
+        per_bit_toggles[sig_key] = toggles
+        if with_times:
+            signal_stats[sig_key] = (high_time, xz_time, duration)
+        Profiling.current().count(value_changes=len(values))
+        # print(f"HD Total for {sig_key}: {toggles}")
+    Profiling.current().count(signals=len(per_bit_toggles))
+    return per_bit_toggles, widths, signal_stats
+
+
+def trace_toggle_keys(trace_paths):
+    """
+    Build-cache keys of the per-trace bit toggles, by trace content. Computed in
+    the parent so worker processes never hash the traces themselves.
+    """
+    cache = Build_Cache.BuildCache(os.path.join(OUT_DIR, "cache"))
+    module = cache.module_digest(sys.modules[__name__])
+    return [cache.key("trace_toggles", cache.file_digest(p), module) for p in trace_paths]
+
+
+def _trace_bit_toggles(vcd_path, cache_key=None):
+    # Per-bit toggles of one trace. With a key (trace_toggle_keys) the result is
+    # kept in the build cache, so the toggle and leakage stages of a multi-trace
+    # run parse each trace once between them.
+    def compute():
+        with Vcd_Index.open_vcd_index(vcd_path) as vcd:
+            return compute_bit_toggles(vcd)
+    if cache_key is None:
+        return compute()
+    return Build_Cache.BuildCache(os.path.join(OUT_DIR, "cache")).get_or_compute("trace_toggles", cache_key, compute)
+
+
+def expand_traces(traces):
+    """
+    Resolve a directory, a glob pattern, or a list of either into a sorted list of trace files.
+    """
+    if isinstance(traces, str):
+        traces = [traces]
+    paths = set()
+    for pattern in traces:
+        if os.path.isdir(pattern):
+            for suffix in (".vcd", ".vcd.gz", ".vcd.xz", ".vcd.zst"):
+                paths.update(glob.glob(os.path.join(pattern, "*" + suffix)))
+        else:
+            paths.update(glob.glob(pattern))
+    return sorted(paths)
+
+
+@Profiling.profiled("aggregate_trace_toggles")
+def aggregate_trace_toggles(trace_paths, max_workers=None):
+    """
+    Compute per-bit toggles of every trace in parallel worker processes and reduce
+    them to per-bit sum, mean and (population) variance across traces.
+    A signal missing from a trace counts as zero toggles for that trace; a signal
+    whose width differs between traces is a ValueError.
+
+    Returns:
+        (sums, means, variances, widths), each keyed by signal.
+    """
+    n = len(trace_paths)
+    Profiling.current().count(traces=n)
+    sums, sumsq, widths, width_source = {}, {}, {}, {}
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        per_trace = pool.map(_trace_bit_toggles, trace_paths, trace_toggle_keys(trace_paths))
+        for path, (per_bit_toggles, trace_widths) in zip(trace_paths, per_trace):
+            for sig_key, toggles in per_bit_toggles.items():
+                t = np.asarray(toggles, dtype=np.int64)
+                if sig_key not in sums:
+                    sums[sig_key] = np.zeros_like(t)
+                    sumsq[sig_key] = np.zeros_like(t)
+                    widths[sig_key] = trace_widths[sig_key]
+                    width_source[sig_key] = path
+                elif trace_widths[sig_key] != widths[sig_key] or len(t) != len(sums[sig_key]):
+                    raise ValueError(f"Signal {sig_key} is {trace_widths[sig_key]} bits wide in {path} but "
+                                     f"{widths[sig_key]} bits in {width_source[sig_key]}; traces of one design "
+                                     f"must come from the same netlist")
+                sums[sig_key] += t
+                sumsq[sig_key] += t * t
+
+    means, variances = {}, {}
+    for sig_key in sums:
+        mean = sums[sig_key] / n
+        means[sig_key] = mean.tolist()
+        variances[sig_key] = np.maximum(sumsq[sig_key] / n - mean * mean, 0.0).tolist()
+        sums[sig_key] = sums[sig_key].tolist()
+    return sums, means, variances, widths
+
+
+def _sum_mapped_bits(per_bit, widths, mappings):
+    total = 0
+    for sig_key, hi, lo in mappings:
+        width = widths.get(sig_key, 1)
+        toggles = per_bit[sig_key]
+        # print(f"    sigkey = {sig_key}, hi = {hi}, lo = {lo}, width: {width}, toggles: {toggles}")
+        for bit in range(lo, hi + 1):
+            idx = width - 1 - bit
+            if 0 <= idx < len(toggles):
+                total += toggles[idx]
+    return total
+
+
+def _multi_trace_toggles(traces, max_workers=None):
+    # Kept in the build cache by trace content (like Feature_Extract's
+    # leakage_key), never next to the design data.
+    trace_paths = expand_traces(traces)
+    if not trace_paths:
+        raise FileNotFoundError(f"No VCD traces found for {traces}")
+    cache = Build_Cache.BuildCache(os.path.join(OUT_DIR, "cache"))
+    stats_key = cache.key("toggle_stats", [cache.file_digest(p) for p in trace_paths],
+                          cache.module_digest(sys.modules[__name__]))
+
+    def compute():
+        print(f"Aggregating toggle counts over {len(trace_paths)} traces...")
+        return aggregate_trace_toggles(trace_paths, max_workers)
+    _, means, variances, widths = cache.get_or_compute("toggle_stats", stats_key, compute)
+    return means, variances, widths
+
+
+def toggle_cache_path_for(design_name, mode="test"):
     if mode == "test":
-        toggle_cache_path = os.path.join(f"../data/{design_name}/{design_name}_toggle.txt")
-    else:
-        toggle_cache_path = os.path.join(f"../data/aes128_table_ecb/aes128_table_ecb_toggle.txt")
-    if os.path.exists(toggle_cache_path):
+        return os.path.join(f"../data/{design_name}/{design_name}_toggle.txt")
+    return os.path.join(f"../data/aes128_table_ecb/aes128_table_ecb_toggle.txt")
+
+
+def load_bit_toggles(vcd, design_name, mode="test", traces=None, max_workers=None, refresh=False):
+    """
+    Per-bit toggle counts of the design, read from its committed toggle file if
+    present (unless `refresh`) or computed from `vcd` / `traces`. The files under
+    ../data are read-only fallbacks for designs without a trace on disk: computed
+    counts are never written back (Feature_Extract keeps them in the build cache,
+    keyed by the trace digest). Newer toggle files also hold the other
+    signal_statistics of each signal; older ones only give the toggles.
+
+    Returns:
+        (per_bit_toggles, widths, toggle_variances, signal_stats); toggle_variances
+        is None unless `traces` is given, signal_stats (see compute_signal_stats)
+        is None with `traces` or a toggles-only cache file.
+    """
+    per_bit_toggles = {}
+    widths = {}
+    toggle_variances = None
+    signal_stats = None
+    toggle_cache_path = toggle_cache_path_for(design_name, mode)
+    if traces is not None:
+        per_bit_toggles, toggle_variances, widths = _multi_trace_toggles(traces, max_workers)
+    elif os.path.exists(toggle_cache_path) and not refresh:
         print(f"Loading toggle counts from cache: {toggle_cache_path}")
         with open(toggle_cache_path, 'r', newline='') as f_cache:
             reader = csv.reader(f_cache)
-            next(reader, None)
+            header = next(reader, None) or []
+            if len(header) > 3:
+                signal_stats = {}
             for row in reader:
-                sig_key, width_str, toggles_str = row
+                sig_key, width_str, toggles_str = row[:3]
                 width = int(width_str)
                 toggles = [int(t) for t in toggles_str.split(' ')]
                 widths[sig_key] = width
                 per_bit_toggles[sig_key] = toggles
+                if signal_stats is not None:
+                    high_str, xz_str, duration_str = row[3:6]
+                    signal_stats[sig_key] = ([int(t) for t in high_str.split(' ')], int(xz_str), int(duration_str))
         print("Successfully loaded toggle counts from cache.")
     else:
         print("Calculating toggle counts (this may take a while)...")
-        for sig_key in vcd.signals:
-            sig = vcd[sig_key]
-            width = getattr(sig, "size", None)
-            if width is None:
-                try:
-                    ref = sig.references[0]
-                    width = vcd.data[ref]["nets"][0].get("size", 1)
-                except Exception:
-                    width = 1
-            width = int(width) if width else 1
-            widths[sig_key] = width
-            toggles = bit_toggles_per_signal(sig.tv, width)
-            per_bit_toggles[sig_key] = toggles
-            # print(f"HD Total for {sig_key}: {toggles}")
-        print(f"Saving toggle counts to cache: {toggle_cache_path}")
-        with open(toggle_cache_path, 'w', newline='') as f_cache:
-            writer = csv.writer(f_cache)
-            writer.writerow(['sig_key', 'width', 'toggles'])
-            for sig_key, toggles_list in per_bit_toggles.items():
-                width = widths[sig_key]
-                toggles_str = ' '.join(map(str, toggles_list))
-                writer.writerow([sig_key, width, toggles_str])
-        print("Cache saved successfully.")
-
-    node_match_path = os.path.join('../data', design_name, f'{design_name}_node_matches.csv')
+        per_bit_toggles, widths, signal_stats = compute_signal_stats(vcd)
+    return per_bit_toggles, widths, toggle_variances, signal_stats
+
+
+def node_match_path_for(design_name):
+    return os.path.join('../data', design_name, f'{design_name}_node_matches.csv')
+
+
+@Profiling.profiled("load_node_matches")
+def load_node_matches(design_name):
+    """
+    Node label -> [(vcd_signal, hi, lo), ...] from the design's node-match file.
+    """
+    node_match_path = node_match_path_for(design_name)
     matches_dict = {}
     if not os.path.exists(node_match_path):
-        print(f"Mapping file not found. Please ensure it exists at: {os.path.abspath(node_match_path)}. Press enter to continue.")
-        input()
+        raise FileNotFoundError(f"Mapping file not found. Please ensure it exists at: {os.path.abspath(node_match_path)}.")
     with open(node_match_path, 'r', newline='') as f:
         reader = csv.reader(f)
         next(reader, None)
@@ -221,26 +431,90 @@ def extract_vcd_features(Feature, node_attrs, vcd, design_name, mode="test"):
                 print(f"Warning: Could not parse mappings for node: {node_str} with value: {mappings_str} because of {e}")
                 mappings_list = []
             matches_dict[node_str] = mappings_list
+    Profiling.current().count(matches=len(matches_dict))
+    return matches_dict
 
+
+@Profiling.profiled("assign_hamming_distance")
+def assign_hamming_distance(Feature, node_attrs, per_bit_toggles, widths, matches_dict, toggle_variances=None):
     for node in Feature.keys():
         label = node_attrs.get(node, {}).get("label", "") or ""
         # print(f"Node '{node}' has label '{label}'")
         if label == "" or label.__contains__("virtual"):
             Feature[node]["Hamming distance"] = 0
+            if toggle_variances is not None:
+                Feature[node]["Hamming distance variance"] = 0
             continue
         # print(f"dict: {matches_dict[label]}")
-        total = 0
-        for sig_key, hi, lo in matches_dict[label]:
-            width = widths.get(sig_key, 1)
-            toggles = per_bit_toggles[sig_key]
-            # print(f"    sigkey = {sig_key}, hi = {hi}, lo = {lo}, width: {width}, toggles: {toggles}")
-            for bit in range(lo, hi + 1):
-                idx = width - 1 - bit
-                if 0 <= idx < len(toggles):
-                    total += toggles[idx]
-
-        Feature[node]["Hamming distance"] = total
+        Feature[node]["Hamming distance"] = _sum_mapped_bits(per_bit_toggles, widths, matches_dict[label])
+        if toggle_variances is not None:
+            Feature[node]["Hamming distance variance"] = _sum_mapped_bits(toggle_variances, widths, matches_dict[label])
+    Profiling.current().count(nodes=len(Feature))
+
+
+def _signal_fractions(signal_stats):
+    # Per-bit duty cycle, X/Z time fraction and bit count (1) of every signal.
+    duty, xz, ones = {}, {}, {}
+    for sig_key, (high_time, xz_time, duration) in signal_stats.items():
+        scale = 1.0 / duration if duration else 0.0
+        duty[sig_key] = [h * scale for h in high_time]
+        xz[sig_key] = [xz_time * scale] * len(high_time)
+        ones[sig_key] = [1] * len(high_time)
+    return duty, xz, ones
+
+
+@Profiling.profiled("assign_signal_features")
+def assign_signal_features(Feature, node_attrs, signal_stats, widths, matches_dict):
+    """
+    Set the signal_feature_names features of every node from the bits its node
+    matches cover:
+        Hamming weight   time-weighted mean Hamming weight of those bits
+        Duty cycle       mean fraction of time they are at 1
+        X/Z time         mean fraction of time their signal is at X/Z
+
+    Without signal_stats (e.g. toggle counts from a legacy 3-column _toggle.txt) the
+    columns are still emitted, as 0, so every design has the same feature names.
+    """
+    if signal_stats is None:
+        print("[WARNING] No signal statistics for this design: "
+              f"{', '.join(signal_feature_names)} set to 0")
+        for node in Feature.keys():
+            Feature[node].update(dict.fromkeys(signal_feature_names, 0))
+        return
+    duty, xz, ones = _signal_fractions(signal_stats)
+    for node in Feature.keys():
+        label = node_attrs.get(node, {}).get("label", "") or ""
+        if label == "" or label.__contains__("virtual"):
+            Feature[node].update(dict.fromkeys(signal_feature_names, 0))
+            continue
+        mappings = matches_dict[label]
+        bits = _sum_mapped_bits(ones, widths, mappings)
+        weight = _sum_mapped_bits(duty, widths, mappings)
+        Feature[node]["Hamming weight"] = weight
+        Feature[node]["Duty cycle"] = weight / bits if bits else 0
+        Feature[node]["X/Z time"] = _sum_mapped_bits(xz, widths, mappings) / bits if bits else 0
+    Profiling.current().count(nodes=len(Feature))
+
+
+@Profiling.profiled("extract_vcd_features")
+def extract_vcd_features(Feature, node_attrs, vcd, design_name, mode="test", traces=None, max_workers=None):
+    """
+    Set the "Hamming distance" feature of every node from VCD toggle counts.
+
+    With `traces` (a directory, glob or list of traces) toggles are aggregated over
+    all traces instead of the single `vcd` object: "Hamming distance" becomes the mean
+    per-trace toggle count of the node's bits and "Hamming distance variance" the
+    sum of their per-bit variances across traces.
+
+    The nodes also get the signal_feature_names features, from the statistics stored
+    with single-trace toggle counts (0 when there are none).
+    """
+    per_bit_toggles, widths, toggle_variances, signal_stats = load_bit_toggles(vcd, design_name, mode, traces,
+                                                                               max_workers)
+    matches_dict = load_node_matches(design_name)
+    assign_hamming_distance(Feature, node_attrs, per_bit_toggles, widths, matches_dict, toggle_variances)
+    assign_signal_features(Feature, node_attrs, signal_stats, widths, matches_dict)
     #
     # print(f"vcd.signals: {vcd.signals}")
 
-    return per_bit_toggles, widths
\ No newline at end of file
+    return per_bit_toggles, widths
@@ -1,9 +1,10 @@
-from vcdvcd import VCDVCD
+import Vcd_Index
 
 def parse_vcd(filename):
-    vcd = VCDVCD(filename)
+    with Vcd_Index.open_vcd_text(Vcd_Index.resolve_vcd_path(filename)) as vcd_file:
+        signals = Vcd_Index.parse_vcd_stream(vcd_file, only_sigs=True)["signals"]
     with open("../out/rsa_vcd_signals.txt", "w") as f:
-        for sig_key in vcd.signals:
+        for sig_key in signals:
             f.write(f"{sig_key}\n")
             # sig = vcd[sig_key]
             # for t, v in sig.tv:
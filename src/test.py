@@ -4,6 +4,7 @@ from sklearn.metrics import accuracy_score, f1_score, roc_auc_score
 
 from GNN import *
 from GraphInformation import *
+import Profiling
 
 TEST_DIR = "../test"
 
@@ -43,7 +44,8 @@ for base, ffeat, fedge in paired:
     model.load_weights("../out/gnn_weights.weights.h5")
 
     all_idx = test_nodeset.node_number
-    probs = model.predict(all_idx.to_numpy(dtype="int32"), verbose=0)  # (N,1)
+    with Profiling.span("inference", nodes=len(all_idx), edges=edges.shape[1]):
+        probs = model.predict(all_idx.to_numpy(dtype="int32"), verbose=0)  # (N,1)
     y_pred = (probs.squeeze(-1) >= 0.5).astype(int)
     score_for_pos = probs.squeeze(-1)
     y_true = Y if Y.ndim == 1 else Y.argmax(1)  # 0/1
@@ -0,0 +1,17 @@
+"""
+The modules under src/ are flat scripts that import each other by name and read
+data through ../data-relative paths, so tests import them from src/ and run there.
+"""
+import os
+import sys
+
+import pytest
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+sys.path.insert(0, SRC_DIR)
+os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+
+
+@pytest.fixture(autouse=True)
+def _run_in_src(monkeypatch):
+    monkeypatch.chdir(SRC_DIR)
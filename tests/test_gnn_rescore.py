@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+tf = pytest.importorskip("tensorflow")
+import GNN
+
+
+def _graph(num_nodes=40, num_edges=120, seed=0):
+    rng = np.random.default_rng(seed)
+    features = rng.normal(size=(num_nodes, 7)).astype(np.float32)
+    edges = rng.integers(0, num_nodes, size=(2, num_edges))
+    return features, edges
+
+
+def _model(features, edges):
+    tf.keras.utils.set_random_seed(0)
+    model = GNN.GNNNodeClassifier(graph_info=(tf.constant(features), edges, None), num_classes=2,
+                                  hidden_units=GNN.hidden_units, dropout_rate=GNN.dropout_rate, name="gnn_model")
+    model.cache_embeddings()
+    return model
+
+
+def test_feature_edit_is_incremental():
+    features, edges = _graph()
+    model = _model(features, edges)
+    features = features.copy()
+    features[3] += 1.0
+    _, stats = model.rescore((tf.constant(features), edges, None), verify=True)
+    assert not stats["full"]
+    assert stats["recomputed"] < stats["nodes"]
+    assert stats["max_abs_error"] <= 1e-5
+
+
+def test_edge_removal_matches_full_recomputation():
+    features, edges = _graph()
+    model = _model(features, edges)
+    probs, stats = model.rescore((tf.constant(features), edges[:, 1:], None), verify=True)
+    assert stats["full"]
+    np.testing.assert_allclose(probs, _model(features, edges[:, 1:]).cache_embeddings(), atol=1e-5)
+
+
+def test_node_addition_matches_full_recomputation():
+    features, edges = _graph()
+    model = _model(features, edges)
+    new_features = np.vstack([features, np.ones((1, 7), dtype=np.float32)])
+    new_edges = np.hstack([edges, [[0], [len(features)]]])
+    probs, stats = model.rescore((tf.constant(new_features), new_edges, None), verify=True)
+    assert stats["nodes"] == len(new_features)
+    np.testing.assert_allclose(probs, _model(new_features, new_edges).cache_embeddings(), atol=1e-5)
+
+
+def test_node_addition_without_edges_is_incremental():
+    features, edges = _graph()
+    model = _model(features, edges)
+    new_features = np.vstack([features, np.ones((1, 7), dtype=np.float32)])
+    _, stats = model.rescore((tf.constant(new_features), edges, None), verify=True)
+    assert not stats["full"]
+    assert stats["recomputed"] == 1
@@ -0,0 +1,32 @@
+import String_Table
+
+COLUMNS = {
+    "node": ["n0", "", "mix_columns_0", "n0", "späť"],
+    "Node": [
+        "n0 = a & b;",
+        "",
+        "always @(posedge clk) begin\n  state <= next_state;\n  // key mix\r\n  out = state ^ key;\nend",
+        "n0 = a & b;",
+        "assign y = \"quoted\\tvalue\";\n",
+    ],
+    "label_rule": ["sa", "", "", "EC&ki", ""],
+}
+
+
+def test_write_then_read_is_identity(tmp_path):
+    path = String_Table.write_table(str(tmp_path / "design_text.bin"), COLUMNS)
+    table = String_Table.StringTable(path)
+    assert len(table) == len(COLUMNS["node"])
+    assert table.columns == list(COLUMNS)
+    for column, values in COLUMNS.items():
+        assert table.values(column) == values
+        assert [table.get(column, r) for r in range(len(values))] == values
+    assert table.values("Node", [4, 2]) == [COLUMNS["Node"][4], COLUMNS["Node"][2]]
+    # Every distinct string is stored once across rows and columns.
+    assert table.num_strings == len({v for values in COLUMNS.values() for v in values})
+
+
+def test_empty_table(tmp_path):
+    table = String_Table.StringTable(String_Table.write_table(str(tmp_path / "empty_text.bin"), {"node": []}))
+    assert len(table) == 0
+    assert table.values("node") == []
@@ -0,0 +1,47 @@
+import gzip
+import lzma
+import shutil
+
+import pytest
+
+vcdvcd = pytest.importorskip("vcdvcd")
+import Vcd_Index
+from Project_Paths import DATA_DIR
+
+VCD_FILE = f"{DATA_DIR}/PRESENT/PRESENT.vcd"
+
+
+@pytest.fixture(scope="module")
+def reference():
+    return vcdvcd.VCDVCD(VCD_FILE)
+
+
+def _compressed_copy(tmp_path, suffix):
+    path = tmp_path / ("PRESENT.vcd" + suffix)
+    opener = {"": open, ".gz": gzip.open, ".xz": lzma.open}[suffix]
+    with open(VCD_FILE, "rb") as src, opener(path, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    return str(path)
+
+
+def test_parse_vcd_stream_matches_vcdvcd(reference):
+    with Vcd_Index.open_vcd_text(VCD_FILE) as f:
+        parsed = Vcd_Index.parse_vcd_stream(f)
+    assert parsed["signals"] == reference.signals
+    assert parsed["references_to_ids"] == reference.references_to_ids
+    for ref in reference.signals:
+        buf = parsed["data"][reference.references_to_ids[ref]]
+        assert list(buf.times) == [t for t, _ in reference[ref].tv], ref
+
+
+@pytest.mark.parametrize("suffix", ["", ".gz", ".xz"])
+def test_index_round_trip_matches_vcdvcd(reference, tmp_path, suffix):
+    vcd_path = _compressed_copy(tmp_path, suffix)
+    index_path = Vcd_Index.build_vcd_index(vcd_path, str(tmp_path / "PRESENT_vcd.idx"))
+    with Vcd_Index.VcdIndex(index_path) as vcd:
+        assert vcd.signals == reference.signals
+        assert vcd.references_to_ids == reference.references_to_ids
+        assert vcd.endtime == reference.endtime
+        for ref in reference.signals:
+            assert int(vcd[ref].size) == int(reference[ref].size), ref
+            assert vcd[ref].tv == reference[ref].tv, ref